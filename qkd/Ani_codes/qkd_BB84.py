@@ -260,4 +260,3 @@ def QKD(graph, msg, key_size):
             t.join()
 
     network.stop(True)
-    exit()
@@ -25,7 +25,8 @@
 """
 
 from qkd.qkd_protocol import QKD
-# from qkd_B92 import QKD
+from qkd.qkd_topology import TOPOLOGIES
+# from qkd.qkd_B92 import QKD
 
 # nodes = ['Alice', 'Bob', 'Eve']
 # edges = [('Alice', 'Bob'), ('Bob', 'Alice'), ('Bob', 'Eve'), ('Eve', 'Bob')]
@@ -40,21 +41,11 @@ from qkd.qkd_protocol import QKD
 #          'Darren': [['truster'], ['Xiufan']],
 #          'Nayan': [['truster'], ['Arya', 'Xiufan']],
 #          'Xiufan': [['receiver'], ['Nayan']]}
-CQT_pos = [103.7800945, 1.2970694]
-Horizon_pos = [103.8266290740217, 1.262059000000001]
-NTU_pos = [103.68293320728537, 1.3484104000000001]
-SMU_pos = [103.92004365998248, 1.29616795]
-SUTD_pos = [103.96434326603818, 1.341603]
-
-graph = {'Ani': [['sender'], NTU_pos, ['Arya',]],
-         'Arya': [['truster'], CQT_pos, ['Ani', 'Darren', 'Nayan']],
-         'Darren': [['spier'], Horizon_pos, ['Xiufan']],
-         'Nayan': [['truster'], SMU_pos, ['Arya', 'Xiufan']],
-         'Xiufan': [['receiver'], SUTD_pos, ['Nayan']]}
+graph = TOPOLOGIES['nqsn']
 
 message = "Hey, are you nervous for the presentation??"
-key_size = 180  # the size of the key in bit for BB84_main
-# key_size = 180 # the size of the key in bit for B92
+key_size = 500  # the size of the key in bit for BB84_main
+# key_size = 2000 # the size of the key in bit for B92
 
 if __name__ == '__main__':
-    QKD(graph, message, key_size)
+    QKD(graph, message, key_size, plot=True)
@@ -0,0 +1,70 @@
+########################################################################################################################
+# Copyright (c) Xiufan Li. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Author: Xiufan Li
+# Supervisor: Patrick Rebentrost
+# Institution: Centre for Quantum Technologies, National University of Singapore
+# For feedback, please contact Xiufan at: shenlongtianwu8@gmail.com.
+########################################################################################################################
+
+# !/usr/bin/env python3
+
+"""
+    QKD networks simulation. The public names below are imported lazily, on first access, so that
+    'import qkd' and the vectorized engines load neither QuNetSim nor networkx nor matplotlib.
+"""
+
+import importlib
+
+_EXPORTS = {
+    'Key': 'qkd.qkd_key',
+    'bb84_exchange': 'qkd.qkd_BB84',
+    'b92_exchange': 'qkd.qkd_B92',
+    'OneTimePad': 'qkd.qkd_crypto',
+    'encrypt_msg': 'qkd.qkd_crypto',
+    'decrypt_msg': 'qkd.qkd_crypto',
+    'shortest_paths': 'qkd.qkd_routing',
+    'get_opt_path': 'qkd.qkd_network',
+    'run_path': 'qkd.qkd_network',
+    'NetworkSession': 'qkd.qkd_network',
+    'KeyPool': 'qkd.qkd_pool',
+    'sweep': 'qkd.qkd_sweep',
+    'draw_topology': 'qkd.qkd_plot',
+    'analyze': 'qkd.qkd_analytic',
+    'QKD': 'qkd.qkd_protocol',
+    'QKDSession': 'qkd.qkd_session',
+    'send_file': 'qkd.qkd_transfer',
+    'AsyncNetwork': 'qkd.qkd_async',
+    'SimNetwork': 'qkd.qkd_des',
+    'FiberChannel': 'qkd.qkd_channel',
+    'BitFlip': 'qkd.qkd_attack',
+    'InterceptResend': 'qkd.qkd_attack',
+    'PhotonNumberSplitting': 'qkd.qkd_attack',
+    'PathResult': 'qkd.qkd_report',
+    'summarize': 'qkd.qkd_report',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError("module 'qkd' has no attribute " + repr(name))
+    value = getattr(importlib.import_module(_EXPORTS[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -26,14 +26,22 @@
 
 
 # from random import random
-from numpy import int32
-from qunetsim.components.host import Host
-from qunetsim.components.network import Network
-from qunetsim.objects import Qubit
-from qunetsim.objects import Logger
-import random
-
-Logger.DISABLED = True
+import time
+
+import numpy as np
+from qkd.qkd_key import Key
+from qkd.qkd_wire import BASIS_FRAME
+from qkd.qkd_wire import encode_bits, decode_bits, encode_states, decode_states, encode_text
+from qkd.qkd_wire import encode_sample, decode_sample, encode_rate, decode_rate
+from qkd.qkd_metrics import span, count, count_message
+from qkd.qkd_estimate import SAMPLE_FRACTION, estimate, sample_seed, sample_mask, sample_error_rate
+from qkd.qkd_cascade import reconcile_host, answer_host
+from qkd.qkd_privacy import amplify_send, amplify_receive
+from qkd.qkd_attack import attack_states
+from qkd.qkd_report import LinkResult, PathResult
+from qkd.qkd_crypto import encode_msg, decode_msg
+from qkd.qkd_BB84 import MIN_SECRET_BITS, report_mismatch, report_short_key
+
 qkd_key_length = 10
 WAIT_TIME = 10
 CRED = '\033[91m'
@@ -44,11 +52,18 @@ CBLUE = '\33[34m'
 # Basis Declaration
 BASIS = ['Z', 'X']  # |0>|1> = Z-Basis; |+>|-> = X-Basis
 
+# Engines to run the quantum part of the protocol:
+# 'qunetsim' entangles and measures one pair of Qubit objects per basis character,
+# 'numpy' computes the correlated outcomes of all pairs in one vectorized pass.
+ENGINES = ['qunetsim', 'numpy']
+
 
 ##########################################################################
 
 
 def entangle(host):  # 00 + 11
+    from qunetsim.objects import Qubit
+
     q1 = Qubit(host)
     q2 = Qubit(host)
     q1.H()
@@ -57,60 +72,123 @@ def entangle(host):  # 00 + 11
 
 
 def preparation(key_size):
-    alice_basis = ""
-    bob_basis = ""
-    for kl in range(key_size):
-        alice_basis += random.choice(BASIS)
-        bob_basis += random.choice(BASIS)
+    letters = np.frombuffer(''.join(BASIS).encode(), dtype=np.uint8)
+    alice_basis = letters[np.random.randint(2, size=key_size)].tobytes().decode()
+    bob_basis = letters[np.random.randint(2, size=key_size)].tobytes().decode()
     return alice_basis, bob_basis
 
 
-def alice_key_string(alice_bits, alice_basis, bob_basis, key_size):
+# Basis string to array, 0 = Z basis, 1 = X basis
+def basis_array(basis):
+    if isinstance(basis, str):
+        return (np.frombuffer(basis.encode(), dtype=np.uint8) == ord(BASIS[1])).astype(np.uint8)
+    return np.asarray(basis, dtype=np.uint8)
+
+
+# Bit string to array
+def bits_array(bits):
+    if isinstance(bits, str):
+        return np.frombuffer(bits.encode(), dtype=np.uint8) - ord('0')
+    return np.asarray(bits, dtype=np.uint8)
+
+
+# Keep the bits of the sample measured in the same basis by both sides
+def sift_bits(bits, basis, other_basis, key_size):
     sample_size = int(key_size / 4)
-    alice_key = ""
-    for i in range(sample_size):
-        if alice_basis[i] == bob_basis[i]:
-            alice_key += str(alice_bits[i])
+    bits = bits_array(bits)[:sample_size]
+    mask = basis_array(basis)[:sample_size] == basis_array(other_basis)[:sample_size]
+    return bits[mask]
+
+
+def alice_key_string(alice_bits, alice_basis, bob_basis, key_size):
+    alice_key = sift_bits(alice_bits, alice_basis, bob_basis, key_size)
     # print("Alice Key: {}".format(alice_key))
-    return alice_key
+    return (alice_key + ord('0')).tobytes().decode()
 
 
 def bob_key_string(bob_bits, bob_basis, alice_basis, key_size):
-    sample_size = int(key_size / 4)
-    bob_key = ""
-    for i in range(sample_size):
-        if bob_basis[i] == alice_basis[i]:
-            bob_key += str(bob_bits[i])
+    bob_key = sift_bits(bob_bits, bob_basis, alice_basis, key_size)
     # print("Bob Key: {}".format(bob_key))
-    return bob_key
-
-
-def send_qkd(host, receiver, alice_basis, key_size):
-    alice_measured_bits = ""
-    # For Qubit and Basis
-    for basis in alice_basis:
-        q1, q2 = entangle(host)
-        ack_arrived = host.send_qubit(receiver, q2, await_ack=False)
-        if ack_arrived:
-            if basis == 'Z':
-                alice_measured_bits += str(q1.measure())
-            if basis == 'X':
-                q1.H()
-                alice_measured_bits += str(q1.measure())
+    return (bob_key + ord('0')).tobytes().decode()
+
+
+# Entangle all pairs at once and measure Alice's halves in her basis.
+# Alice's measurement leaves Bob's halves in the states (bit, base) for H^base X^bit |0>.
+def entangle_batch(alice_basis):
+    basis = basis_array(alice_basis)
+    alice_bits = np.random.randint(2, size=len(basis)).astype(np.uint8)
+    return alice_bits, (alice_bits.copy(), basis)
+
+
+# Measure Bob's halves in his basis, a measurement in the other basis gives a random bit
+def measure_batch(state_bits, state_basis, bob_basis):
+    basis = basis_array(bob_basis)[:len(state_bits)]
+    random_bits = np.random.randint(2, size=len(basis)).astype(np.uint8)
+    return np.where(basis == state_basis[:len(basis)], state_bits[:len(basis)], random_bits)
+
+
+# Run the whole exchange without hosts, return the keys of both sides left after the estimation and the error rate
+# of the sample in percent, see qkd_estimate. Bob's halves pass the attacks of qkd_attack on the way.
+def b92_exchange(key_size, sample_fraction=SAMPLE_FRACTION, attacks=()):
+    alice_basis, bob_basis = preparation(key_size)
+    alice_bits, (state_bits, state_basis) = entangle_batch(alice_basis)
+    state_bits, state_basis, pulses = attack_states(state_bits, state_basis, attacks)
+    if pulses is not None:
+        # Only the pairs whose half reaches Bob are kept
+        alice_basis, bob_basis = basis_array(alice_basis)[pulses], basis_array(bob_basis)[pulses]
+        alice_bits, state_bits, state_basis = alice_bits[pulses], state_bits[pulses], state_basis[pulses]
+        key_size = len(alice_bits)
+    bob_bits = measure_batch(state_bits, state_basis, bob_basis)
+    alice_key = Key(sift_bits(alice_bits, alice_basis, bob_basis, key_size))
+    bob_key = Key(sift_bits(bob_bits, bob_basis, alice_basis, key_size))
+    alice_key, bob_key, error_rate, bound = estimate(alice_key, bob_key, sample_fraction)
+    return alice_key, bob_key, error_rate
+
+
+# Return the LinkResult of Alice, see qkd_report. Alice reveals a sample of the sifted key and learns its error
+# rate from Bob, see qkd_estimate.
+def send_qkd(host, receiver, alice_basis, key_size, engine='qunetsim'):
+    if engine not in ENGINES:
+        raise ValueError("Unknown engine '" + str(engine) + "', choose from " + str(ENGINES) + ".")
+    start = time.perf_counter()
+    with span('b92.transmit', host, receiver):
+        if engine == 'numpy':
+            # Bob's halves travel as one batch of states
+            alice_measured_bits, (state_bits, state_basis) = entangle_batch(alice_basis)
+            frame = encode_states(state_bits, state_basis)
+            host.send_classical(receiver, frame, await_ack=False)
+            count_message(host, receiver, frame)
+        else:
+            alice_measured_bits = ""
+            # For Qubit and Basis
+            for basis in alice_basis:
+                q1, q2 = entangle(host)
+                ack_arrived = host.send_qubit(receiver, q2, await_ack=False)
+                if ack_arrived:
+                    if basis == 'Z':
+                        alice_measured_bits += str(q1.measure())
+                    if basis == 'X':
+                        q1.H()
+                        alice_measured_bits += str(q1.measure())
+    count('qubits_sent', len(alice_basis), host, receiver)
     # print("Alice's measured bits: {}".format(alice_measured_bits))
 
-    # Get message from receiver
-    message = host.get_next_classical(receiver, WAIT_TIME)
+    with span('b92.basis', host, receiver):
+        # Get message from receiver
+        message = host.get_next_classical(receiver, WAIT_TIME)
 
-    # Sending Basis to Bob
-    ack_basis_alice = host.send_classical(receiver, alice_basis, await_ack=True)
+        # Sending Basis to Bob
+        frame = encode_bits(BASIS_FRAME, basis_array(alice_basis))
+        ack_basis_alice = host.send_classical(receiver, frame, await_ack=True)
+        count_message(host, receiver, frame)
     if ack_basis_alice is not None:
         print(CRED + "{}".format(host.host_id) + CEND +
               " sent basis string successfully to " +
               CGREEN + "{}.".format(receiver) + CEND +
               ".")
     # Receiving Basis from Bob
-    basis_from_bob = host.get_next_classical(receiver, wait=WAIT_TIME)
+    with span('b92.basis', host, receiver):
+        basis_from_bob = host.get_next_classical(receiver, wait=WAIT_TIME)
     if basis_from_bob is not None:
         print(CGREEN + "{}".format(receiver) + CEND +
               " got basis string successfully from " +
@@ -118,15 +196,48 @@ def send_qkd(host, receiver, alice_basis, key_size):
               ".")
 
     # For Key
-    alice_key = alice_key_string(alice_measured_bits, alice_basis, basis_from_bob.content, key_size)
-    alice_key = [int32(k) for k in alice_key][:qkd_key_length]
+    with span('b92.sift', host, receiver):
+        alice_key = Key(sift_bits(alice_measured_bits, alice_basis, decode_bits(BASIS_FRAME, basis_from_bob.content),
+                                  key_size))
+    sifted_bits = len(alice_key)
+
+    with span('b92.estimate', host, receiver):
+        # Reveal a random sample of the key, Bob answers with its error rate
+        seed = sample_seed()
+        mask = sample_mask(len(alice_key), seed)
+        frame = encode_sample(seed, alice_key.sift(mask))
+        host.send_classical(receiver, frame, await_ack=False)
+        count_message(host, receiver, frame)
+        count('sample_bits', int(mask.sum()), host, receiver)
+        error_rate = decode_rate(host.get_next_classical(receiver, WAIT_TIME).content)
+    alice_key = alice_key.sift(~mask)
+
+    # Answer the parities Bob asks to correct his key, see qkd_cascade, then compress the key, see qkd_privacy.
+    # Bob sends the error rate he corrected, the key is compressed for the larger of both rates.
+    eves = 0
+    secret_bits = 0
+    with span('b92.reconcile', host, receiver):
+        leaked, confirmed = answer_host(host, receiver, alice_key, WAIT_TIME)
+    if confirmed:
+        with span('b92.amplify', host, receiver):
+            corrected_rate = decode_rate(host.get_next_classical(receiver, WAIT_TIME).content)
+            alice_key = amplify_send(host, receiver, alice_key, max(error_rate, corrected_rate) / 100, leaked)
+        if len(alice_key) < MIN_SECRET_BITS:
+            # Never fall back to the reconciled key, its parities were revealed
+            eves += report_short_key(host, receiver, len(alice_key))
+            alice_key = alice_key[:0]
+        secret_bits = len(alice_key)
+    else:
+        eves += report_mismatch(host, receiver)
+    alice_key = Key(alice_key[:qkd_key_length])
     print(CRED + str(host.host_id) + CEND +
           " sent key to " +
           CGREEN + str(receiver) + CEND +
           " with " +
           CBLUE + "%d" % len(alice_key) + CEND +
           " key bits")
-    return alice_key
+    return LinkResult(host.host_id, receiver, 'b92', alice_key, len(alice_basis), sifted_bits, error_rate,
+                      secret_bits, time.perf_counter() - start, eves)
 
     # # For Sending Key
     # alice_brd_ack = host.send_classical(receiver, alice_key, await_ack=True)
@@ -139,33 +250,50 @@ def send_qkd(host, receiver, alice_basis, key_size):
     #         print("Same key from {}'s side".format(host.host_id))
 
 
-def receive_qkd(host, receiver, bob_basis, key_size):
+# Return the LinkResult of Bob, with the error rate of the sample of Alice as QBER
+def receive_qkd(host, receiver, bob_basis, key_size, engine='qunetsim'):
+    if engine not in ENGINES:
+        raise ValueError("Unknown engine '" + str(engine) + "', choose from " + str(ENGINES) + ".")
+    start = time.perf_counter()
     bob_key = ""
-    bob_measured_bits = ""
-    # For Qubit and Basis
-    for basis in bob_basis:
-        q2 = host.get_qubit(receiver, wait=WAIT_TIME)
-        if q2 is not None:
-            # Measuring Alice's qubit based on Bob's basis
-            if basis == 'Z':  # Z-basis
-                bob_measured_bits += str(q2.measure())
-            if basis == 'X':  # X-basis
-                q2.H()
-                bob_measured_bits += str(q2.measure())
+    with span('b92.transmit', host, receiver):
+        if engine == 'numpy':
+            # Measuring the batch of Alice's qubits based on Bob's basis
+            state_bits, state_basis = decode_states(host.get_next_classical(receiver, wait=WAIT_TIME).content)
+            bob_measured_bits = measure_batch(state_bits, state_basis, bob_basis)
+        else:
+            bob_measured_bits = ""
+            # For Qubit and Basis
+            for basis in bob_basis:
+                q2 = host.get_qubit(receiver, wait=WAIT_TIME)
+                if q2 is not None:
+                    # Measuring Alice's qubit based on Bob's basis
+                    if basis == 'Z':  # Z-basis
+                        bob_measured_bits += str(q2.measure())
+                    if basis == 'X':  # X-basis
+                        q2.H()
+                        bob_measured_bits += str(q2.measure())
+    count('qubits_received', len(bob_measured_bits), host, receiver)
     # print("Bob's measured bits: {}".format(bob_measured_bits))
 
-    # Send Alice the basis in which Bob has measured
-    host.send_classical(receiver, "Bob gets the message.", await_ack=True)
+    with span('b92.basis', host, receiver):
+        # Send Alice the basis in which Bob has measured
+        frame = encode_text("Bob gets the message.")
+        host.send_classical(receiver, frame, await_ack=True)
+        count_message(host, receiver, frame)
 
-    # Receiving Basis from Alice
-    basis_from_alice = host.get_next_classical(receiver, wait=WAIT_TIME)
+        # Receiving Basis from Alice
+        basis_from_alice = host.get_next_classical(receiver, wait=WAIT_TIME)
     # if basis_from_alice is not None:
     #     print(CGREEN + "{}".format(receiver) + CEND +
     #           " got basis string successfully from " +
     #           CRED + "{}".format(host.host_id) + CEND +
     #           ".")
     # Sending Basis to Alice
-    ack_basis_bob = host.send_classical(receiver, bob_basis, await_ack=True)
+    with span('b92.basis', host, receiver):
+        frame = encode_bits(BASIS_FRAME, basis_array(bob_basis))
+        ack_basis_bob = host.send_classical(receiver, frame, await_ack=True)
+        count_message(host, receiver, frame)
     # if ack_basis_bob is not None:
     #     print(CRED + "{}".format(host.host_id) + CEND +
     #           " sent basis string successfully to " +
@@ -173,15 +301,49 @@ def receive_qkd(host, receiver, bob_basis, key_size):
     #           ".")
 
     # For sample key indices
-    bob_key = bob_key_string(bob_measured_bits, bob_basis, basis_from_alice.content, key_size)
-    bob_key = [int32(k) for k in bob_key][:qkd_key_length]
+    with span('b92.sift', host, receiver):
+        bob_key = Key(sift_bits(bob_measured_bits, bob_basis, decode_bits(BASIS_FRAME, basis_from_alice.content),
+                                key_size))
+    sifted_bits = len(bob_key)
+
+    with span('b92.estimate', host, receiver):
+        # Compare the sample of Alice, keep the bits that were not revealed and send the error rate back
+        seed, alice_sample = decode_sample(host.get_next_classical(receiver, WAIT_TIME).content)
+        mask = sample_mask(len(bob_key), seed)
+        error_rate = sample_error_rate(alice_sample, bob_key.sift(mask))
+        bob_key = bob_key.sift(~mask)
+        frame = encode_rate(error_rate)
+        host.send_classical(receiver, frame, await_ack=False)
+        count_message(host, receiver, frame)
+
+    # Correct the key with the parities of Alice, with Cascade blocks sized for the estimated QBER.
+    # A confirmed key is compressed after Alice learns the error rate that was corrected.
+    eves = 0
+    secret_bits = 0
+    with span('b92.reconcile', host, receiver):
+        corrected, leaked, rounds, confirmed = reconcile_host(host, receiver, bob_key, error_rate / 100, WAIT_TIME)
+    if confirmed:
+        with span('b92.amplify', host, receiver):
+            frame = encode_rate(sample_error_rate(bob_key, corrected))
+            host.send_classical(receiver, frame, await_ack=False)
+            count_message(host, receiver, frame)
+            bob_key = amplify_receive(host, receiver, corrected, WAIT_TIME)
+        if len(bob_key) < MIN_SECRET_BITS:
+            eves += 1
+            bob_key = bob_key[:0]
+        secret_bits = len(bob_key)
+    else:
+        eves += 1
+        bob_key = corrected
+    bob_key = Key(bob_key[:qkd_key_length])
     print(CGREEN + str(host.host_id) + CEND +
           " received key from " +
           CRED + str(receiver) + CEND +
           " with " +
           CBLUE + "%d" % len(bob_key) + CEND +
           " key bits")
-    return bob_key
+    return LinkResult(host.host_id, receiver, 'b92', bob_key, len(bob_basis), sifted_bits, error_rate,
+                      secret_bits, time.perf_counter() - start, eves)
 
     # # For Broadcast Key
     # alice_key = host.get_classical(receiver, wait=WAIT_TIME)
@@ -206,9 +368,12 @@ def decrypt(key, encrypted_text):
     return encrypt(key, encrypted_text)
 
 
+# The character of the first byte of the key, a key shorter than a byte cannot encrypt anything
 def key_array_to_key_string(key_array):
-    key_string_binary = ''.join([str(x) for x in key_array])
-    return ''.join(chr(int(''.join(x), 2)) for x in zip(*[iter(key_string_binary)] * 8))
+    key = Key(key_array)
+    if len(key) < 8:
+        raise ValueError("Key of " + str(len(key)) + " bits is shorter than the byte needed to encrypt a message.")
+    return key[:8].to_bytes().decode('latin-1')
 
 
 def encry_msg(key, msg):
@@ -223,151 +388,91 @@ def decry_msg(key, msg):
     return decrypted_msg
 
 
+# A message of None was dropped on a link without secret key, see encode_msg in qkd_crypto
 def send_msg(sender, encrypted_msg_to_eve, receiver):
     print(CRED + str(sender.host_id) + CEND +
-          " sends encrypted message to " +
+          (" sends encrypted message to " if encrypted_msg_to_eve is not None else " drops the message to ") +
           CGREEN + str(receiver) + CEND)
-    sender.send_classical(receiver, "-1:" + encrypted_msg_to_eve, await_ack=True)
+    frame = encode_msg(encrypted_msg_to_eve)
+    sender.send_classical(receiver, frame, await_ack=True)
+    count_message(sender, receiver, frame)
 
 
 def recv_msg(receiver, sender):
-    encrypted_msg = receiver.get_next_classical(sender, -1).content
-    encrypted_msg = encrypted_msg.split(':')[1]
+    encrypted_msg = decode_msg(receiver.get_next_classical(sender, -1).content)
     print(CGREEN + str(receiver.host_id) + CEND +
-          " receives encrypted message from " +
+          (" receives encrypted message from " if encrypted_msg is not None else " receives no message from ") +
           CRED + str(sender) + CEND)
     print()
     return encrypted_msg
 
 
-def eve_sniffing_quantum(sender, receiver, qubit):
-    qubit.measure(non_destructive=True)
-
-
-# Initialize Networks, create hosts and make connections
-def connect(graph):
-    # graph = {'Ani': [['sender'], ['Arya']],
-    #          'Arya': [['trusted_node'], ['Ani', 'Darren']],
-    #          'Darren': [['trusted_node'], ['Arya', 'Nayan']],
-    #          'Nayan': [['trusted_node'], ['Darren', 'Xiufan']],
-    #          'Xiufan': [['receiver'], ['Nayan']]}
-
-    nodes = graph.keys()
-    # Initialize a network
-    network = Network.get_instance()
-    network.delay = 0.0             # Set delay to 0
-    network.start(nodes)            # Start the network with the defined hosts
-
-    # Declare the hosts
-    host_name_dic = {}
-    for n in nodes:
-        host_name_dic[n] = Host(n)
-    # Add connections
-    for n in nodes:
-        for recv in graph[n][1]:
-            host_name_dic[n].add_connection(recv)
-    # Start
-    for n in nodes:
-        host_name_dic[n].start()
-        network.add_host(host_name_dic[n])
-
-    return host_name_dic, network
-
+# The graph is a topology of qkd_protocol, see qkd_topology. The message is relayed over the optimal path by its
+# trusted nodes, the spiers of the path are excluded. The engine is 'qunetsim' (one entangled pair of Qubit objects
+# per bit) or 'numpy' (vectorized), see ENGINES. Return the PathResult of qkd_report with the decrypted message.
+def QKD(graph, msg, key_size, engine='qunetsim'):
+    from qkd.qkd_network import connect, get_opt_path
 
-def QKD(graph, msg, key_size):
-    nodes, edges = graph
+    path = get_opt_path(graph)[1][0]
+    nodes = [n for n in path if graph[n][0][0] != 'spier']
     host_name_dic, network = connect(graph)
-
-    sender = host_name_dic[nodes[0]]
-    receiver = host_name_dic[nodes[-1]]
-    trusted_nodes = nodes[1:len(nodes) - 1]
-
-    if not trusted_nodes:
+    # Results of the links and the decrypted message, filled by the receiving end of every link
+    results = {}
+    start = time.perf_counter()
+
+    # One pair of basis per link
+    Alices_basis = []
+    Bob_basis = []
+    for i in range(len(nodes) - 1):
         alice_basis, bob_basis = preparation(key_size)
-
-        # print("Sender bases: {}".format(alice_basis))
-        # print("Receiver bases: {}".format(bob_basis))
-        def send_func(sender):
-            print(str(sender.host_id) + " encrypts the message: " + msg)
-            send_key = send_qkd(sender, receiver.host_id, alice_basis, key_size)
-            encrypted_msg = encry_msg(send_key, msg)
-            send_msg(sender, encrypted_msg, receiver.host_id)
-
-        def recv_func(receiver):
-            recv_key = receive_qkd(receiver, sender.host_id, bob_basis, key_size)
-            encrypted_msg = recv_msg(receiver, sender.host_id)
-            decrypted_msg = decry_msg(recv_key, encrypted_msg)
-            print(str(receiver.host_id) + " decrypts the message: " + decrypted_msg)
-
-        # Run
-        t1 = sender.run_protocol(send_func, ())
-        t2 = receiver.run_protocol(recv_func, ())
-        t1.join()
-        t2.join()
-
-    else:
-        Alices_basis = []
-        Bob_basis = []
-        for i in range(len(nodes) - 1):
-            alice_basis, bob_basis = preparation(key_size)
-            Alices_basis.append(alice_basis)
-            Bob_basis.append(bob_basis)
-        # print("Sender bases: {}".format(Alices_basis))
-        # print("Receiver bases: {}".format(Bob_basis))
-
-        tn_1 = host_name_dic[trusted_nodes[0]]
-        tn_n = host_name_dic[trusted_nodes[-1]]
-
-        def send_func(sender):
-            print(str(sender.host_id) + " encrypts the message: " + msg)
-            send_key = send_qkd(sender, tn_1.host_id, Alices_basis[0], key_size)
-            print(send_key)
-            encrypted_msg = encry_msg(send_key, msg)
-            send_msg(sender, encrypted_msg, tn_1.host_id)
-
-        # Run
-        Th_lst = [_ for _ in range(len(nodes))]
-        Th_lst[0] = sender.run_protocol(send_func, ())
-
-        def trus_func(trusted_node, prev_node, next_node, prev_basis, next_basis):
-            # Build the QKD protocol with the previous node and obtain the private key
-            prev_key = receive_qkd(trusted_node, prev_node.host_id, prev_basis, key_size)
-            # Receive the encrypted message from the previous node
-            msg = recv_msg(trusted_node, prev_node.host_id)
-            # Build the QKD protocol with the next node and obtain the private key
-            next_key = send_qkd(trusted_node, next_node.host_id, next_basis, key_size)
-
-            print(prev_key)
-            print(next_key)
-
-
-            # Use the previous QKD key and the next QKD key to construct the new key by:
-            # ord(K12) = ord(K2) ^ ord(K1)
-            new_key = [(prev_key[j] + next_key[j]) % 2 for j in range(min([len(prev_key), len(next_key)]))]
-            # Encrypt the message with the new key
-            msg = encry_msg(new_key, msg)
-            # Send the message to the next node
-            send_msg(trusted_node, msg, next_node.host_id)
-
-        for i in range(1, len(nodes) - 1):
-            trusted_node = host_name_dic[nodes[i]]
-            Th_lst[i] = trusted_node.run_protocol(trus_func, (host_name_dic[nodes[i - 1]],
-                                                              host_name_dic[nodes[i + 1]],
-                                                              Bob_basis[i - 1],
-                                                              Alices_basis[i]))
-
-        def recv_func(receiver):
-            recv_key = receive_qkd(receiver, tn_n.host_id, Bob_basis[-1], key_size)
-            print(recv_key)
-
-            encrypted_msg = recv_msg(receiver, tn_n.host_id)
-            decrypted_msg = decry_msg(recv_key, encrypted_msg)
-            print(str(receiver.host_id) + " decrypts the message: " + decrypted_msg)
-
-        Th_lst[-1] = receiver.run_protocol(recv_func, ())
-
-        for t in Th_lst:
-            t.join()
-
+        Alices_basis.append(alice_basis)
+        Bob_basis.append(bob_basis)
+
+    def send_func(sender, next_node):
+        print(str(sender.host_id) + " encrypts the message: " + msg)
+        send_key = send_qkd(sender, next_node.host_id, Alices_basis[0], key_size, engine).key
+        # The message is dropped on a link without secret key
+        encrypted_msg = encry_msg(send_key, msg) if len(send_key) >= MIN_SECRET_BITS else None
+        send_msg(sender, encrypted_msg, next_node.host_id)
+
+    def trus_func(trusted_node, prev_node, next_node, prev_basis, next_basis):
+        # Build the QKD protocol with the previous node and obtain the private key
+        result = receive_qkd(trusted_node, prev_node.host_id, prev_basis, key_size, engine)
+        results[(prev_node.host_id, trusted_node.host_id)] = result
+        prev_key = result.key
+        # Receive the encrypted message from the previous node
+        msg = recv_msg(trusted_node, prev_node.host_id)
+        # Build the QKD protocol with the next node and obtain the private key
+        next_key = send_qkd(trusted_node, next_node.host_id, next_basis, key_size, engine).key
+
+        # Use the previous QKD key and the next QKD key to construct the new key by:
+        # ord(K12) = ord(K2) ^ ord(K1)
+        new_length = min([len(prev_key), len(next_key)])
+        new_key = prev_key[:new_length] ^ next_key[:new_length]
+        # Encrypt the message with the new key, a dropped message or a link without secret key drops it
+        msg = encry_msg(new_key, msg) if msg is not None and new_length >= MIN_SECRET_BITS else None
+        # Send the message to the next node
+        send_msg(trusted_node, msg, next_node.host_id)
+
+    def recv_func(receiver, prev_node):
+        result = receive_qkd(receiver, prev_node.host_id, Bob_basis[-1], key_size, engine)
+        results[(prev_node.host_id, receiver.host_id)] = result
+        encrypted_msg = recv_msg(receiver, prev_node.host_id)
+        if encrypted_msg is not None:
+            results['message'] = decry_msg(result.key, encrypted_msg)
+            print(str(receiver.host_id) + " decrypts the message: " + results['message'])
+
+    # Run
+    hosts = [host_name_dic[n] for n in nodes]
+    Th_lst = [hosts[0].run_protocol(send_func, (hosts[1],))]
+    for i in range(1, len(hosts) - 1):
+        Th_lst.append(hosts[i].run_protocol(trus_func, (hosts[i - 1], hosts[i + 1], Bob_basis[i - 1],
+                                                        Alices_basis[i])))
+    Th_lst.append(hosts[-1].run_protocol(recv_func, (hosts[-2],)))
+    for t in Th_lst:
+        t.join()
+    wall_time = time.perf_counter() - start
     network.stop(True)
-    exit()
+
+    links = [results[link] for link in zip(nodes, nodes[1:])]
+    return PathResult(path, links, results.get('message'), wall_time)
@@ -24,14 +24,32 @@
     BB84 protocol for quantum key distribution between Alice and Bob.
 """
 
-from qunetsim.objects import Qubit
-from qunetsim.objects import Logger
+import numpy as np
 import random
-Logger.DISABLED = True
+import time
+from qkd.qkd_key import Key
+from qkd.qkd_wire import BASIS_FRAME, SIFT_FRAME, DETECT_FRAME
+from qkd.qkd_wire import encode_bits, decode_bits, encode_sample, decode_sample, encode_states, decode_states
+from qkd.qkd_wire import encode_slots, decode_slots, frame_kind, SLOTS_FRAME
+from qkd.qkd_wire import encode_rate, decode_rate, encode_text, decode_text, run_steps
+from qkd.qkd_metrics import span, count, count_message
+from qkd.qkd_estimate import SAMPLE_FRACTION, sample_seed, sample_mask, sample_error_rate, qber_bound, estimate
+from qkd.qkd_cascade import reconcile_host_steps, answer_host_steps
+from qkd.qkd_privacy import amplify_send, amplify_receive_steps
+from qkd.qkd_attack import BitFlip, attack_states
+from qkd.qkd_report import LinkResult
+
+# Engines to run the quantum part of the protocol:
+# 'qunetsim' sends one Qubit object per key bit through the QuNetSim backend,
+# 'numpy' simulates the prepare-and-measure statistics of the whole key with NumPy arrays.
+ENGINES = ['qunetsim', 'numpy']
 
 wait_time = 10
 qkd_key_length = 13
 ERROR_RATE = 10
+# A secret key shorter than one byte cannot encrypt a character. The link is reported like one with an Eavesdropper
+# and keeps an empty key, the relay drops its message.
+MIN_SECRET_BITS = 8
 
 EAVESDROPPER_NUMBER = 1
 # Eve randomly choose a number from [0, 1, ..., 9].
@@ -47,10 +65,132 @@ CGREENBG = '\33[42m'
 CRED2 = '\33[91m'
 CGREEN2 = '\33[92m'
 
-# Send BB84_main Protocol
-def send_bb84(sender, key, receiver):
+
+# Probability that a spier applies the X gate to a qubit, see BitFlip in qkd_attack
+def sniff_probability(eavesdropper_number=EAVESDROPPER_NUMBER):
+    return min(max(9 - eavesdropper_number, 0), 10) / 10
+
+
+# Attacks of the spiers that sniff the qubits on the quantum route from sender to receiver, in order,
+# see 'connect' in qkd_network
+def route_attacks(sender_id, receiver_id):
+    from qunetsim.components import Network
+
+    network = Network.get_instance()
+    route = network.get_quantum_route(sender_id, receiver_id)
+    hosts = [network.get_host(n) for n in route[1:]]
+    return [getattr(host, 'qkd_attack', None) or BitFlip() for host in hosts if host.q_relay_sniffing]
+
+
+# Fiber channel of the QuNetSim network, None without one, see 'connect' in qkd_network
+def route_channel():
+    from qunetsim.components import Network
+
+    return getattr(Network.get_instance(), 'qkd_channel', None)
+
+
+# Prepare the states of the whole key in random bases, with the X gates of the spiers on the way applied.
+# A state is the pair (bit, base) for H^base X^bit |0>.
+def prepare_states(key, sniffers=0, flip_prob=None):
+    bits = np.array(key, dtype=np.uint8)
+    basis = np.random.randint(2, size=len(bits)).astype(np.uint8)
+    if sniffers:
+        if flip_prob is None:
+            flip_prob = sniff_probability()
+        flips = np.count_nonzero(np.random.random((sniffers, len(bits))) < flip_prob, axis=0) & 1
+        # X only flips the states in Z basis, |+> and |-> are unchanged up to a global phase
+        bits ^= (flips & (1 - basis)).astype(np.uint8)
+    return bits, basis
+
+
+# Pass the prepared states through the attacks of the spiers, see qkd_attack, and through the FiberLink of
+# qkd_channel, if any. Return the states as they reach the receiver and the time slots where its detector clicked,
+# None if every state arrives.
+def transmit_states(bits, basis, attacks=(), link=None):
+    bits, basis, pulses = attack_states(bits, basis, attacks)
+    if link is None:
+        return bits, basis, pulses
+    return link.transmit(bits, basis, pulses)
+
+
+# Measure the states in random bases, a measurement in the wrong basis gives a random bit
+def measure_states(bits, basis):
+    measured_basis = np.random.randint(2, size=len(bits)).astype(np.uint8)
+    random_bits = np.random.randint(2, size=len(bits)).astype(np.uint8)
+    key = np.where(measured_basis == basis, bits, random_bits)
+    return key, measured_basis
+
+
+# Error rate in percent between the sender and the receiver keys
+def key_error_rate(sender_key, key):
+    errors = Key(sender_key).hamming(Key(key))
+    return round((errors / len(key)) * 100, 2)
+
+
+# Run the whole exchange of a random key without hosts. Return the keys of both sides, that is the sifted bits
+# left after the estimation, and the error rate of the sample, see qkd_estimate.
+# The states pass the attacks, by default 'sniffers' bit flips of probability 'flip_prob', then the FiberLink of
+# qkd_channel, if any. Only the qubits that the receiver detects are kept.
+def bb84_exchange(key_size, sniffers=0, flip_prob=None, sample_fraction=SAMPLE_FRACTION, link=None, attacks=None):
+    if attacks is None:
+        attacks = [BitFlip(flip_prob) for _ in range(sniffers)]
+    key = Key.random(key_size)
+    bits, basis = prepare_states(key.bits())
+    states, states_basis, clicks = transmit_states(bits, basis, attacks, link)
+    if clicks is not None:
+        clicks = clicks.astype(bool)
+        key, basis, states, states_basis = key.sift(clicks), basis[clicks], states[clicks], states_basis[clicks]
+    measured_key, measured_basis = measure_states(states, states_basis)
+    sift_basis = basis == measured_basis
+    send_key, recv_key, error_rate, bound = estimate(key.sift(sift_basis), Key(measured_key).sift(sift_basis),
+                                                     sample_fraction)
+    return send_key, recv_key, error_rate
+
+
+# Print if the communication is safe according to the error rate, and return 1 if an Eavesdropper is detected.
+# The upper bound of the error rate, if given, is printed along.
+def report_error_rate(sender, receiver, error_rate, bound=None):
+    upper = '' if bound is None else ' (upper bound ' + str(round(bound, 2)) + ' %)'
+    if error_rate < ERROR_RATE:
+        msg = 'Communication between ' + \
+              CRED + str(sender.host_id) + CEND +\
+              ' and ' + \
+              CGREEN + str(receiver) + CEND +\
+              ' is ' + CGREEN2 + 'SAFE' + CEND + ' with error rate: ' + CGREEN2 + str(error_rate) + " %" + CEND + upper
+        print(msg)
+        return 0
+    msg = 'Communication between ' + \
+          CRED + str(sender.host_id) + CEND +\
+          ' and ' + \
+          CGREEN + str(receiver) + CEND +\
+          ' is ' + CRED2 + 'NOT SAFE' + CEND + ' with error rate: ' + CRED2 + str(error_rate) + " %" + CEND + upper
+    print(msg)
+    print(CRED2 + "Eavesdropper Detected between " + str(sender.host_id) + " and " + str(receiver) +  " !" + CEND)
+    print()
+    return 1
+
+
+# Print that the keys of a link still differ after the error correction, see qkd_cascade. The link is dropped
+# like one with an Eavesdropper, so return 1.
+def report_mismatch(sender, receiver):
+    print(CRED2 + "Key confirmation failed between " + str(sender.host_id) + " and " + str(receiver) + " !" + CEND)
+    print()
+    return 1
+
+
+# Print that privacy amplification left too few secret bits to encrypt with, and return 1 like 'report_mismatch'
+def report_short_key(sender, receiver, secret_bits):
+    print(CRED2 + "Secret key of " + str(secret_bits) + " bits between " + str(sender.host_id) + " and " +
+          str(receiver) + " is too short, the communication is NOT SAFE !" + CEND)
+    print()
+    return 1
+
+
+# Send the key as qubits in random basis, one Qubit object per key bit
+def send_qubits(sender, key, receiver):
+    from qunetsim.objects import Qubit
+
     basis = []          # List to store all values of the basis
-    eves = 0 # Detection of Eavesdropper
     # Convert key bits to qubits and send it to the receiver in a random basis
     for bit in key:
         base = random.randint(0, 1)     # choose a random basis 0 = Z basis, 1 = X basis
@@ -62,76 +202,28 @@ def send_bb84(sender, key, receiver):
         if base: q_bit.H()  # Apply basis change if necessary
 
         sender.send_qubit(receiver, q_bit, await_ack=False)  # Send Qubit to Bob
-
-    # Get measured basis of receiver
-    message = sender.get_next_classical(receiver, wait_time)
-    measured_basis = message.content
-    measured_basis = eval(measured_basis)
-
-    if len(basis) != len(measured_basis):
-        raise KeyError("Qubits lost in transmition, basis set don't match.")
-
-    # Compare to send basis, if same, answer with 0 and set ack True and go to next bit,
-    for i in range(len(basis)):
-        if basis[i] == measured_basis[i]:
-            measured_basis[i] = 1
-        else:
-            measured_basis[i] = 0
-
-    # log.log("Sender sifted basis is ", basis)  # Only for verification
-
-    # Send the sifted basis to the receiver for comparison
-    sender.send_classical(receiver, str(measured_basis), await_ack=False)
-    print(CRED + str(sender.host_id) + CEND +
-          " sent key to " +
-          CGREEN + str(receiver) + CEND +
-          " with " +
-          CBLUE + "%d" % len(key) + CEND +
-          " rough key bits.")
-
-    # Update the sender key based on the receiver measurement and sifted basis
-    key = [key[i] for i in range(len(measured_basis)) if measured_basis[i]][:qkd_key_length]
-
-
-    # log.log("Sender sifted key is ", str(key))     # Only for verification
-
-    # Wait for acknowledgement from receiver
-    receipt = sender.get_next_classical(receiver, wait_time)
-    print(receipt.content)
-    # log.log("Receiver confirmation: ", receipt.content)
-
-    # Send the key to receiver for verification and detection of Eavesdropper
-    sender.send_classical(receiver, key, await_ack=False)
-
-    # Get the error rate from the receiver
-    error_rate = sender.get_next_classical(receiver, wait_time).content
-
-    # Decide if this communication is safe or not according to the error rate
-    if error_rate < ERROR_RATE:
-        msg = 'Communication between ' + \
-              CRED + str(sender.host_id) + CEND +\
-              ' and ' + \
-              CGREEN + str(receiver) + CEND +\
-              ' is ' + CGREEN2 + 'SAFE' + CEND + ' with error rate: ' + CGREEN2 + str(error_rate) + " %" + CEND
-        print(msg)
+    return np.array(basis, dtype=np.uint8)
+
+
+# Send the prepared states of the whole key as one batch, through the attacks of the spiers on the route.
+# When pulses get lost, by an attack or through a fiber channel, the batch holds the states as they reach the
+# detector of the receiver and the time slots where it clicked. Return the basis and if the slots were sent.
+def send_states(sender, key, receiver, channel=None):
+    bits, basis = prepare_states(key)
+    link = None if channel is None else channel.link(sender.host_id, receiver)
+    states, states_basis, clicks = transmit_states(bits, basis, route_attacks(sender.host_id, receiver), link)
+    if clicks is None:
+        frame = encode_states(states, states_basis)
     else:
-        msg = 'Communication between ' + \
-              CRED + str(sender.host_id) + CEND +\
-              ' and ' + \
-              CGREEN + str(receiver) + CEND +\
-              ' is ' + CRED2 + 'NOT SAFE' + CEND + ' with error rate: ' + CRED2 + str(error_rate) + " %" + CEND
-        print(msg)
-        print(CRED2 + "Eavesdropper Detected between " + str(sender.host_id) + " and " + str(receiver) +  " !" + CEND)
-        print()
-        eves += 1
-    return key, eves
+        frame = encode_slots(states, states_basis, clicks)
+    sender.send_classical(receiver, frame, await_ack=False)
+    count_message(sender, receiver, frame)
+    return basis, clicks is not None
 
 
-
-# Receiver BB84_main Protocol
-def receive_bb84(receiver, key_size, sender):
+# Receive the qubits one by one and measure them in random basis
+def receive_qubits(receiver, key_size, sender):
     basis = []  # Measurement basis record
-    eves = 0 # Detection of Eavesdropper
     key = []  # Raw key
     count = 0  # Count of bits received
 
@@ -144,45 +236,211 @@ def receive_bb84(receiver, key_size, sender):
         bit = q_bit.measure()  # measure the qubit
         key.append(bit)  # save the full raw key
         count += 1
+    return np.array(key, dtype=np.uint8), np.array(basis, dtype=np.uint8)
+
+
+# Measure a batch of states in random basis. From a batch of time slots, only the states of the slots where the
+# detector clicked are measured, and the clicks are returned along as booleans (None otherwise).
+def detect_states(bits, states_basis, clicks, key_size):
+    if len(bits) != key_size:
+        raise KeyError("Qubits lost in transmition, received " + str(len(bits)) + " of " + str(key_size) + " qubits.")
+    if clicks is not None:
+        clicks = clicks.astype(bool)
+        bits, states_basis = bits[clicks], states_basis[clicks]
+    key, basis = measure_states(bits, states_basis)
+    return key, basis, clicks
+
+
+# Receive the batch of states or of time slots and measure them, see 'detect_states'
+def receive_states(receiver, key_size, sender):
+    frame = receiver.get_next_classical(sender, wait_time).content
+    if frame_kind(frame) != SLOTS_FRAME:
+        (bits, states_basis), clicks = decode_states(frame), None
+    else:
+        bits, states_basis, clicks = decode_slots(frame)
+    return detect_states(bits, states_basis, clicks, key_size)
 
-    # Send Alice the basis in which Bob has measured
-    receiver.send_classical(sender, str(basis), await_ack=False)
 
-    # Alice replies with the basis that is correct
-    message = receiver.get_next_classical(sender, wait_time)
-    sift_basis = message.content
-    sift_basis = eval(sift_basis)
+# Classical part of the sender protocol as steps, see 'run_steps' in qkd_wire, once the states of the key went out
+# in 'basis', as time slots if 'slots'. Both runtimes drive these steps: the thread hosts here and the coroutine
+# hosts of qkd_async. Return the LinkResult of the sender, timed on 'clock' from 'start', see qkd_report.
+def send_steps(sender, key, receiver, basis, slots=False, start=None, clock=time.perf_counter):
+    start = clock() if start is None else start
+    eves = 0 # Detection of Eavesdropper
+    qubits = len(key)
+    count('qubits_sent', len(key), sender, receiver)
 
-    key = [key[i] for i in range(len(sift_basis)) if sift_basis[i]][:qkd_key_length]
+    # Get measured basis of receiver
+    with span('bb84.basis', sender, receiver):
+        if slots:
+            # Keep the time slots where the receiver detected a qubit
+            clicks = decode_bits(DETECT_FRAME, (yield receiver)).astype(bool)
+            key, basis = key.sift(clicks), basis[clicks]
+        measured_basis = decode_bits(BASIS_FRAME, (yield receiver))
 
-    receiver.send_classical(sender, CGREEN + str(receiver.host_id) + CEND + " received key from " + CRED + str(sender) +
-                            CEND + " with " + CBLUE + "%d" % len(key) + CEND + " key bits.", await_ack=False)
+    if len(basis) != len(measured_basis):
+        raise KeyError("Qubits lost in transmition, basis set don't match.")
 
-    # Receive sender's key for verification and detection of Eavesdropper
-    sender_key = receiver.get_next_classical(sender, wait_time).content
+    with span('bb84.sift', sender, receiver):
+        # Compare to send basis, 1 if same and 0 otherwise
+        sift_basis = (basis == measured_basis).astype(np.uint8)
 
-    # Compare the sender and receiver's key and calculate the error rate
-    # error_rate = sum([sender_key[i] ^ key[i] for i in range(len(key))]) / len(key)
-    error_rate = round((sum([sender_key[i] ^ key[i] for i in range(len(key))]) / len(key)) * 100, 2)
-    # Send the error rate back to sender
-    receiver.send_classical(sender, error_rate, await_ack=False)
+        # Send the sifted basis to the receiver for comparison
+        frame = encode_bits(SIFT_FRAME, sift_basis)
+        sender.send_classical(receiver, frame, await_ack=False)
+        count_message(sender, receiver, frame)
+    print(CRED + str(sender.host_id) + CEND +
+          " sent key to " +
+          CGREEN + str(receiver) + CEND +
+          " with " +
+          CBLUE + "%d" % len(key) + CEND +
+          " rough key bits.")
 
-    if error_rate >= ERROR_RATE:
-        eves += 1
+    # Update the sender key based on the receiver measurement and sifted basis
+    detected = len(key)
+    key = key.sift(sift_basis)
+    sifted_bits = len(key)
+
+    with span('bb84.estimate', sender, receiver):
+        # Reveal a random sample of the key to the receiver for the detection of Eavesdropper
+        seed = sample_seed()
+        mask = sample_mask(len(key), seed)
+        frame = encode_sample(seed, key.sift(mask))
+        sender.send_classical(receiver, frame, await_ack=False)
+        count_message(sender, receiver, frame)
+        count('sample_bits', int(mask.sum()), sender, receiver)
+
+        # Wait for acknowledgement from receiver
+        print(decode_text((yield receiver)))
+
+        # Get the error rate of the sample from the receiver
+        error_rate = decode_rate((yield receiver))
+
+    # Keep the bits that were not revealed, and answer the parities the receiver asks to correct a safe key
+    key = key.sift(~mask)
+    secret_bits = 0
+    if error_rate < ERROR_RATE:
+        with span('bb84.reconcile', sender, receiver):
+            leaked, confirmed = yield from answer_host_steps(sender, receiver, key)
+        if confirmed:
+            # Compress the corrected key and send the seed of the hash to the receiver, see qkd_privacy
+            with span('bb84.amplify', sender, receiver):
+                key = amplify_send(sender, receiver, key, error_rate / 100, leaked)
+            if len(key) < MIN_SECRET_BITS:
+                # Never fall back to the reconciled key, its parities were revealed
+                eves += report_short_key(sender, receiver, len(key))
+                key = key[:0]
+            secret_bits = len(key)
+        else:
+            eves += report_mismatch(sender, receiver)
+    key = key[:qkd_key_length]
 
     # Decide if this communication is safe or not according to the error rate
-    # if error_rate < ERROR_RATE:
-    return key, eves
-
-
-
-
-
-
-
-
-
-
+    eves += report_error_rate(sender, receiver, error_rate, qber_bound(error_rate, int(mask.sum())))
+    return LinkResult(sender.host_id, receiver, 'bb84', key, qubits, sifted_bits, error_rate, secret_bits,
+                      clock() - start, eves, detected)
 
 
+# Classical part of the receiver protocol as steps, once the states are measured into 'key' in 'basis', with the
+# time slots where the detector clicked if pulses got lost. Return the LinkResult of the receiver.
+def receive_steps(receiver, key_size, sender, key, basis, clicks=None, start=None, clock=time.perf_counter):
+    start = clock() if start is None else start
+    eves = 0 # Detection of Eavesdropper
+    count('qubits_received', key_size, receiver, sender)
+
+    with span('bb84.basis', receiver, sender):
+        if clicks is not None:
+            # Announce the time slots where the detector clicked
+            frame = encode_bits(DETECT_FRAME, clicks)
+            receiver.send_classical(sender, frame, await_ack=False)
+            count_message(receiver, sender, frame)
+            count('qubits_detected', len(key), receiver, sender)
+
+        # Send Alice the basis in which Bob has measured
+        frame = encode_bits(BASIS_FRAME, basis)
+        receiver.send_classical(sender, frame, await_ack=False)
+        count_message(receiver, sender, frame)
+
+        # Alice replies with the basis that is correct
+        sift_basis = decode_bits(SIFT_FRAME, (yield sender))
+    with span('bb84.sift', receiver, sender):
+        detected = len(key)
+        key = Key(key).sift(sift_basis)
+        sifted_bits = len(key)
+
+    with span('bb84.estimate', receiver, sender):
+        # Receive the sample of sender's key for the detection of Eavesdropper
+        seed, sender_sample = decode_sample((yield sender))
+        mask = sample_mask(len(key), seed)
+
+        # Compare the sampled bits and calculate the error rate, keep the bits that were not revealed
+        error_rate = sample_error_rate(sender_sample, key.sift(mask))
+        key = key.sift(~mask)
+
+        frame = encode_text(CGREEN + str(receiver.host_id) + CEND + " received key from " + CRED + str(sender) +
+                            CEND + " with " + CBLUE + "%d" % min(len(key), qkd_key_length) + CEND + " key bits.")
+        receiver.send_classical(sender, frame, await_ack=False)
+        count_message(receiver, sender, frame)
+
+        # Send the error rate back to sender
+        frame = encode_rate(error_rate)
+        receiver.send_classical(sender, frame, await_ack=False)
+        count_message(receiver, sender, frame)
+
+    secret_bits = 0
+    if error_rate >= ERROR_RATE:
+        eves += 1
+    else:
+        # Correct the errors left in a safe key with the parities of the sender, see qkd_cascade
+        with span('bb84.reconcile', receiver, sender):
+            corrected, leaked, rounds, confirmed = yield from reconcile_host_steps(receiver, sender, key,
+                                                                                  error_rate / 100)
+        print(CGREEN + str(receiver.host_id) + CEND + " corrected " + CBLUE + "%d" % key.hamming(corrected) + CEND +
+              " key bits, leaking " + CBLUE + "%d" % leaked + CEND + " bits in " + "%d" % rounds + " round trips.")
+        if confirmed:
+            # Compress the corrected key with the hash chosen by the sender
+            with span('bb84.amplify', receiver, sender):
+                key = yield from amplify_receive_steps(receiver, sender, corrected)
+            if len(key) < MIN_SECRET_BITS:
+                eves += 1
+                key = key[:0]
+            secret_bits = len(key)
+        else:
+            eves += 1
+            key = corrected
 
+    # Decide if this communication is safe or not according to the error rate
+    # if error_rate < ERROR_RATE:
+    return LinkResult(receiver.host_id, sender, 'bb84', key[:qkd_key_length], key_size, sifted_bits, error_rate,
+                      secret_bits, clock() - start, eves, detected)
+
+
+# Send BB84_main Protocol, return the LinkResult of the sender that unpacks to (key, eves), see qkd_report
+def send_bb84(sender, key, receiver, engine='qunetsim'):
+    start = time.perf_counter()
+    key = Key(key)
+    # The fiber channel applies to batches of states only
+    channel = route_channel() if engine == 'numpy' else None
+    slots = False
+    with span('bb84.transmit', sender, receiver):
+        if engine == 'numpy':
+            basis, slots = send_states(sender, key.bits(), receiver, channel)
+        elif engine == 'qunetsim':
+            basis = send_qubits(sender, key.bits(), receiver)
+        else:
+            raise ValueError("Unknown engine '" + str(engine) + "', choose from " + str(ENGINES) + ".")
+    return run_steps(sender, send_steps(sender, key, receiver, basis, slots, start), wait_time)
+
+
+# Receiver BB84_main Protocol, return the LinkResult of the receiver that unpacks to (key, eves), see qkd_report
+def receive_bb84(receiver, key_size, sender, engine='qunetsim'):
+    start = time.perf_counter()
+    clicks = None
+    with span('bb84.transmit', receiver, sender):
+        if engine == 'numpy':
+            key, basis, clicks = receive_states(receiver, key_size, sender)
+        elif engine == 'qunetsim':
+            key, basis = receive_qubits(receiver, key_size, sender)
+        else:
+            raise ValueError("Unknown engine '" + str(engine) + "', choose from " + str(ENGINES) + ".")
+    return run_steps(receiver, receive_steps(receiver, key_size, sender, key, basis, clicks, start), wait_time)
@@ -0,0 +1,126 @@
+########################################################################################################################
+# Copyright (c) Xiufan Li. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Author: Xiufan Li
+# Supervisor: Patrick Rebentrost
+# Institution: Centre for Quantum Technologies, National University of Singapore
+# For feedback, please contact Xiufan at: shenlongtianwu8@gmail.com.
+########################################################################################################################
+
+# !/usr/bin/env python3
+
+"""
+    Closed-form key rates of BB84 over a topology, for planning without running the simulation.
+
+    A link joins two consecutive non-spier nodes of a path, with the spiers in between (see 'path_links' in
+    qkd_pool). Every spier applies X with probability p = sniff_probability(EAVESDROPPER_NUMBER), the model of
+    BitFlip in qkd_attack. The state flips for an odd number of X gates, with probability
+    (1 - (1 - 2p)^s) / 2 over s spiers, and X only disturbs the half of the sifted states prepared in Z basis, so
+
+        QBER = (1 - (1 - 2p)^s) / 4
+
+    Half of the qubits are sifted. SAMPLE_FRACTION of the sifted bits are revealed, and the exchange is detected
+    when their error rate reaches ERROR_RATE. Cascade leaks about EC_EFFICIENCY h(QBER) bits per kept bit, and
+    privacy amplification gives 'secret_length' of qkd_privacy. The secret bits are before the truncation of the
+    protocol modules to qkd_key_length. A path yields the secret key rate of its bottleneck link, and is detected
+    if any of its links is.
+"""
+
+import math
+
+from qkd.qkd_BB84 import ERROR_RATE, EAVESDROPPER_NUMBER, sniff_probability
+from qkd.qkd_estimate import SAMPLE_FRACTION, sample_size
+from qkd.qkd_privacy import EPSILON, entropy, secret_length
+from qkd.qkd_pool import path_links
+from qkd.qkd_routing import shortest_paths, endpoints
+
+SIFTING_RATIO = 0.5
+EC_EFFICIENCY = 1.2         # Leaked parities of Cascade over the Shannon limit h(QBER)
+EXACT_LIMIT = 200           # Largest sample of the exact binomial tail, a normal approximation beyond
+
+
+# QBER of a link with s spiers that flip with probability p
+def link_qber(sniffers, flip_prob=None):
+    flip_prob = sniff_probability(EAVESDROPPER_NUMBER) if flip_prob is None else flip_prob
+    return (1 - (1 - 2 * flip_prob) ** sniffers) / 4
+
+
+# P(X >= k) for X ~ Binomial(m, p)
+def binomial_tail(m, p, k):
+    if k <= 0:
+        return 1.0
+    if k > m or p <= 0:
+        return 0.0
+    if p >= 1:
+        return 1.0
+    if m <= EXACT_LIMIT:
+        log_p, log_q, log_m = math.log(p), math.log(1 - p), math.lgamma(m + 1)
+        return min(1.0, sum(math.exp(log_m - math.lgamma(i + 1) - math.lgamma(m - i + 1) + i * log_p +
+                                     (m - i) * log_q) for i in range(k, m + 1)))
+    mean, deviation = m * p, math.sqrt(m * p * (1 - p))
+    return 0.5 * math.erfc((k - 0.5 - mean) / (deviation * math.sqrt(2)))
+
+
+# Expected figures of one exchange of 'key_size' qubits over a link
+def link_rate(sniffers, key_size, flip_prob=None, error_rate=ERROR_RATE, sample_fraction=SAMPLE_FRACTION,
+              epsilon=EPSILON):
+    qber = link_qber(sniffers, flip_prob)
+    sifted = int(round(key_size * SIFTING_RATIO))
+    sample = sample_size(sifted, sample_fraction)
+    kept = sifted - sample
+    detection = binomial_tail(sample, qber, int(math.ceil(error_rate / 100 * sample - 1e-9)))
+    leaked = int(math.ceil(EC_EFFICIENCY * entropy(qber) * kept))
+    secret = secret_length(kept, qber, leaked, epsilon) if qber * 100 < error_rate else 0
+    return {'sniffers': sniffers,
+            'sifting_ratio': SIFTING_RATIO,
+            'qber': qber,
+            'detection_probability': detection,
+            'sifted_bits': sifted,
+            'sample_bits': sample,
+            'leaked_bits': leaked,
+            'secret_bits': secret,
+            'expected_secret_bits': secret * (1 - detection),
+            'secret_fraction': secret / key_size if key_size else 0.0}
+
+
+# Expected figures of a path, the secret key of the path is the one of its bottleneck link
+def path_rate(graph, path, key_size, flip_prob=None, error_rate=ERROR_RATE, sample_fraction=SAMPLE_FRACTION,
+              epsilon=EPSILON):
+    links = []
+    for a, b, sniffers in path_links(graph, path):
+        link = link_rate(sniffers, key_size, flip_prob, error_rate, sample_fraction, epsilon)
+        link['link'] = (a, b)
+        links.append(link)
+    undetected = 1.0
+    for link in links:
+        undetected *= 1 - link['detection_probability']
+    bottleneck = min(links, key=lambda link: link['secret_bits'])
+    return {'path': list(path),
+            'links': links,
+            'qber': max(link['qber'] for link in links),
+            'detection_probability': 1 - undetected,
+            'bottleneck': bottleneck['link'],
+            'secret_bits': bottleneck['secret_bits'],
+            'secret_fraction': bottleneck['secret_fraction']}
+
+
+# Figures of the optimal path QKD would take, or of the first k paths of the routing
+def analyze(graph, key_size, k=1, eavesdropper_number=EAVESDROPPER_NUMBER, error_rate=ERROR_RATE, weight='hop'):
+    flip_prob = sniff_probability(eavesdropper_number)
+    sender, receiver = endpoints(graph)
+    paths = shortest_paths(graph, sender, receiver, k=max(k, 1), weight=weight)
+    if k == 1:
+        # The optimal path of 'get_opt_path' in qkd_network
+        paths = [min(paths, key=len)]
+    return [path_rate(graph, path, key_size, flip_prob, error_rate) for path in paths]
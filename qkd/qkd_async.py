@@ -0,0 +1,284 @@
+########################################################################################################################
+# Copyright (c) Xiufan Li. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Author: Xiufan Li
+# Supervisor: Patrick Rebentrost
+# Institution: Centre for Quantum Technologies, National University of Singapore
+# For feedback, please contact Xiufan at: shenlongtianwu8@gmail.com.
+########################################################################################################################
+
+# !/usr/bin/env python3
+"""
+    asyncio runtime of QKD networks. The hosts are plain objects with awaitable classical and quantum inboxes,
+    and the nodes of qkd_node are coroutines scheduled on one event loop, so a network of thousands of hosts
+    needs neither one thread per host nor the QuNetSim backend. The coroutines drive the same protocol steps as
+    the thread hosts, see 'run_steps' in qkd_wire.
+    Example:
+
+        network = AsyncNetwork(graph)
+        msg = asyncio.run(network.run_path(path, "Hello", key_size)).message
+
+    The quantum channel of a link carries the states of the whole key as one batch, like the 'numpy' engine of
+    qkd_BB84, with the attacks of the spiers between the two ends of the link applied on the way (see qkd_attack),
+    and through the fiber of the link with a FiberChannel of qkd_channel.
+"""
+
+import asyncio
+
+from qkd.qkd_key import Key
+from qkd.qkd_metrics import span
+from qkd.qkd_BB84 import prepare_states, transmit_states, detect_states, send_steps, receive_steps
+from qkd.qkd_BB84 import wait_time, MIN_SECRET_BITS, CRED, CEND, CGREEN
+from qkd.qkd_crypto import encrypt_msg, decrypt_msg, send_msg, decode_msg
+from qkd.qkd_pool import path_spiers
+from qkd.qkd_attack import spier_attacks
+from qkd.qkd_report import PathResult
+
+
+class Message:
+    """
+        Classical message of the asyncio runtime, with the fields of a QuNetSim message that the protocols read.
+    """
+    __slots__ = ('sender', 'content')
+
+    def __init__(self, sender, content):
+        self.sender = sender
+        self.content = content
+
+
+# Next item of an inbox, waiting at most 'wait' seconds or forever if 'wait' is -1
+async def _get(inbox, wait):
+    if not inbox.empty():
+        return inbox.get_nowait()
+    if wait is None or wait < 0:
+        return await inbox.get()
+    try:
+        return await asyncio.wait_for(inbox.get(), wait)
+    except asyncio.TimeoutError:
+        raise TimeoutError("Nothing received after " + str(wait) + " s.") from None
+
+
+class AsyncHost:
+    """
+        Host of the asyncio runtime. Sending puts the message into the inbox of the receiver for this host at once,
+        receiving awaits the next message of the inbox. The inboxes are created on first use.
+    """
+
+    def __init__(self, host_id, network):
+        self.host_id = host_id
+        self.network = network
+        self._classical = {}        # peer -> queue of Message
+        self._quantum = {}          # peer -> queue of (bits, basis, clicks), clicks is None if no pulse is lost
+
+    @staticmethod
+    def _inbox(inboxes, peer):
+        inbox = inboxes.get(peer)
+        if inbox is None:
+            inbox = inboxes[peer] = asyncio.Queue()
+        return inbox
+
+    # Same call as for a QuNetSim host, the acknowledgement is not supported
+    def send_classical(self, receiver, content, await_ack=False):
+        self.network.deliver(self.host_id, receiver, 'classical', Message(self.host_id, content), len(content))
+
+    async def get_next_classical(self, sender, wait=-1):
+        return await _get(self._inbox(self._classical, sender), wait)
+
+    # Send the states (bit, base) of a batch of qubits through the attacks of the spiers of the link and the fiber
+    # channel, if any. When pulses get lost, the batch holds the time slots where the detector of the receiver
+    # clicks, and the return value is True.
+    def send_states(self, receiver, bits, basis):
+        network = self.network
+        link = None if network.channel is None else network.channel.link(self.host_id, receiver)
+        bits, basis, clicks = transmit_states(bits, basis, network.attacks(self.host_id, receiver), link)
+        network.deliver(self.host_id, receiver, 'quantum', (bits, basis, clicks), len(bits))
+        return clicks is not None
+
+    async def get_states(self, sender, wait=-1):
+        return await _get(self._inbox(self._quantum, sender), wait)
+
+
+class AsyncNetwork:
+    """
+        The hosts of a topology for the asyncio runtime, same graph as 'connect' in qkd_network.
+        The links of a path are registered with the attacks of the spiers between their two ends.
+        'channel' is a FiberChannel of qkd_channel, or None for lossless links.
+        'attacks' maps spiers to their attack of qkd_attack, the other spiers flip bits.
+    """
+
+    def __init__(self, graph, channel=None, attacks=None):
+        self.graph = graph
+        self.channel = channel
+        self.hosts = {n: AsyncHost(n, self) for n in graph}
+        spiers = [n for n in graph if graph[n][0][0] == 'spier']
+        self.spiers = dict(zip(spiers, spier_attacks(spiers, attacks)))
+        self._attacks = {}
+
+    def add_path(self, path):
+        for sender, receiver, spiers in path_spiers(self.graph, path):
+            self._attacks[frozenset((sender, receiver))] = [self.spiers[n] for n in spiers]
+
+    def attacks(self, sender, receiver):
+        return self._attacks.get(frozenset((sender, receiver)), [])
+
+    def sniffers(self, sender, receiver):
+        return len(self.attacks(sender, receiver))
+
+    # Put a classical message or a batch of states into the inbox of the receiver for the sender, at once.
+    # The size is in bytes for a classical message and in qubits for a batch of states.
+    def deliver(self, sender, receiver, channel, item, size):
+        host = self.hosts[receiver]
+        host._inbox(host._classical if channel == 'classical' else host._quantum, sender).put_nowait(item)
+
+    async def run_path(self, path, msg, key_size):
+        return await run_path(self, path, msg, key_size)
+
+
+# Drive the steps of a protocol on a coroutine host and return their result, see 'run_steps' in qkd_wire
+async def run_steps(host, steps, wait_time):
+    try:
+        peer = next(steps)
+        while True:
+            peer = steps.send((await host.get_next_classical(peer, wait_time)).content)
+    except StopIteration as stop:
+        return stop.value
+
+
+# Send BB84 protocol, the steps of 'send_bb84' in qkd_BB84. The time of the LinkResult is on the clock of the loop.
+async def send_bb84(sender, key, receiver):
+    clock = asyncio.get_running_loop().time
+    start = clock()
+    key = Key(key)
+    with span('bb84.transmit', sender, receiver):
+        bits, basis = prepare_states(key.bits())
+        slots = sender.send_states(receiver, bits, basis)
+    return await run_steps(sender, send_steps(sender, key, receiver, basis, slots, start, clock), wait_time)
+
+
+# Receiver BB84 protocol, the steps of 'receive_bb84' in qkd_BB84
+async def receive_bb84(receiver, key_size, sender):
+    clock = asyncio.get_running_loop().time
+    start = clock()
+    with span('bb84.transmit', receiver, sender):
+        bits, states_basis, clicks = await receiver.get_states(sender, wait_time)
+        key, basis, clicks = detect_states(bits, states_basis, clicks, key_size)
+    return await run_steps(receiver, receive_steps(receiver, key_size, sender, key, basis, clicks, start, clock),
+                           wait_time)
+
+
+# Wait for the encrypted message as long as it takes, like 'recv_msg' in qkd_crypto
+async def recv_msg(receiver, sender):
+    encrypted_msg = decode_msg((await receiver.get_next_classical(sender, -1)).content)
+    print(CGREEN + str(receiver.host_id) + CEND +
+          (" receives encrypted message from " if encrypted_msg is not None else " receives no message from ") +
+          CRED + str(sender) + CEND)
+    print()
+    return encrypted_msg
+
+
+# Sender node, see 'send_node' in qkd_node
+async def send_node(sender, msg, secret_key, receiver):
+    print(str(sender.host_id) + " encrypts the message: " + msg)
+    print()
+    with span('node.key', sender, receiver):
+        send_key = (await send_bb84(sender, secret_key, receiver)).key
+    with span('node.encrypt', sender, receiver):
+        encrypted_msg = encrypt_msg(send_key, msg) if len(send_key) >= MIN_SECRET_BITS else None
+    with span('node.relay', sender, receiver):
+        send_msg(sender, encrypted_msg, receiver)
+
+
+# Receiver node, returns the LinkResult of its link and the decrypted message, None if it was dropped
+async def recv_node(receiver, key_size, sender):
+    with span('node.key', receiver, sender):
+        result = await receive_bb84(receiver, key_size, sender)
+    with span('node.relay', receiver, sender):
+        encrypted_msg = await recv_msg(receiver, sender)
+    if encrypted_msg is None:
+        return result, None
+    with span('node.decrypt', receiver, sender):
+        decrypted_msg = decrypt_msg(result.key, encrypted_msg)
+    print(str(receiver.host_id) + " decrypts the message: " + decrypted_msg)
+    return result, decrypted_msg
+
+
+# Trusted node, both keys are established at once, see 'trusted_node' in qkd_node.
+# Returns the LinkResult of the link to the previous node.
+async def trusted_node(trusted_node, prev_node, next_node, key_size, secret_key):
+    async def prev_exchange():
+        with span('node.key', trusted_node, prev_node):
+            return await receive_bb84(trusted_node, key_size, prev_node)
+
+    async def next_exchange():
+        with span('node.key', trusted_node, next_node):
+            return await send_bb84(trusted_node, secret_key, next_node)
+
+    prev_result, next_result = await asyncio.gather(prev_exchange(), next_exchange())
+    prev_key, next_key = prev_result.key, next_result.key
+    with span('node.relay', trusted_node, prev_node):
+        msg = await recv_msg(trusted_node, prev_node)
+
+    with span('node.encrypt', trusted_node, next_node):
+        # Use the previous QKD key and the next QKD key to construct the new key by: ord(K12) = ord(K2) ^ ord(K1)
+        new_length = min([len(prev_key), len(next_key)])
+        new_key = prev_key[:new_length] ^ next_key[:new_length]
+        msg = encrypt_msg(new_key, msg) if msg is not None and new_length >= MIN_SECRET_BITS else None
+    with span('node.relay', trusted_node, next_node):
+        send_msg(trusted_node, msg, next_node)
+    return prev_result
+
+
+# Relay the message over a path, every node is a task of the running loop. Return the PathResult of qkd_report
+# with the decrypted message.
+async def run_path(network, path, msg, key_size):
+    # Excluded all spiers in the path.
+    graph = network.graph
+    nodes = [n for n in path if graph[n][0][0] != 'spier']
+    network.add_path(path)
+    hosts = network.hosts
+    start = asyncio.get_running_loop().time()
+
+    with span('path', path[0], path[-1]):
+        tasks = []
+        for i, n in enumerate(nodes):
+            name = graph[n][0][0]
+            if name == 'sender':
+                tasks.append(send_node(hosts[n], msg, Key.random(key_size), nodes[i + 1]))
+            elif name == 'receiver':
+                tasks.append(recv_node(hosts[n], key_size, nodes[i - 1]))
+            elif name == 'truster':
+                tasks.append(trusted_node(hosts[n], nodes[i - 1], nodes[i + 1], key_size, Key.random(key_size)))
+            else:
+                raise ValueError
+        results = await asyncio.gather(*tasks)
+    links, message = results[1:-1] + [results[-1][0]], results[-1][1]
+    return PathResult(path, links, message, asyncio.get_running_loop().time() - start)
+
+
+# Same as QKD in qkd_protocol on the asyncio runtime: relay the message over the first optimal path, then over
+# another one. Return the PathResults, with the messages decrypted by the receiver.
+def QKD(graph, msg, key_size, plot=False, channel=None, attacks=None):
+    from qkd.qkd_network import get_opt_path
+
+    PATH, OPT_PATH = get_opt_path(graph, plot=plot)
+    network = AsyncNetwork(graph, channel, attacks)
+
+    async def main():
+        path = OPT_PATH[0]
+        received = [await network.run_path(path, msg, key_size)]
+        others = [p for p in OPT_PATH if p != path] or [p for p in PATH if p != path]
+        if others:
+            received.append(await network.run_path(others[0], msg, key_size))
+        return received
+    return asyncio.run(main())
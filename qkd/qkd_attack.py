@@ -0,0 +1,221 @@
+########################################################################################################################
+# Copyright (c) Xiufan Li. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Author: Xiufan Li
+# Supervisor: Patrick Rebentrost
+# Institution: Centre for Quantum Technologies, National University of Singapore
+# For feedback, please contact Xiufan at: shenlongtianwu8@gmail.com.
+########################################################################################################################
+
+# !/usr/bin/env python3
+"""
+    Eavesdropping attacks on whole batches of qubit states. An attack sits on a spier node of the graph and acts
+    on all the states (bit, base) for H^base X^bit |0> that pass the spier at once, see 'prepare_states' in qkd_BB84.
+
+    - BitFlip(probability): X with the given probability on every qubit, the model of 'sniffing_quantum' in
+      qkd_node and the default attack of a spier. X only disturbs the states in Z basis.
+    - InterceptResend(basis, fraction): Eve measures a fraction of the qubits in a random basis, or always in
+      basis 0 = Z or 1 = X, and resends the state she measured. A measurement in the wrong basis gives a random bit.
+    - PhotonNumberSplitting(mu, block): the source sends weak coherent pulses of Poisson(mu) photons. Eve keeps one
+      photon of every multi-photon pulse and measures it once the bases are announced, without any error, and
+      blocks the single-photon pulses with probability 'block'. The links without a spier do not model the pulses
+      without photon, so they go on here too and only the pulses Eve blocks are lost to her.
+
+    The lost pulses never reach the detector, the receiver only measures the time slots where it clicked, like
+    through the fiber of qkd_channel. Every attack counts the qubits it saw, intercepted and learned. Example:
+
+        attacks = {'Darren': InterceptResend(fraction=0.5)}
+        run_path(path, graph, msg, key_size, engine='numpy', attacks=attacks)
+"""
+
+import random
+
+import numpy as np
+
+MEAN_PHOTON_NUMBER = 0.5
+
+
+class Attack:
+    """
+        Attack of a spier on the batches of states that pass it. 'apply' returns the states that go on, the pulses
+        that go on (None for all), and the number of qubits intercepted and learned.
+    """
+    name = 'attack'
+
+    def __init__(self):
+        self.qubits = 0
+        self.intercepted = 0
+        self.learned = 0
+
+    def apply(self, bits, basis):
+        raise NotImplementedError
+
+    # Same attack on one Qubit object relayed by a QuNetSim host, see 'connect' in qkd_network
+    def qubit(self, qubit):
+        pass
+
+    def __call__(self, bits, basis):
+        bits, basis, pulses, intercepted, learned = self.apply(np.asarray(bits, dtype=np.uint8),
+                                                               np.asarray(basis, dtype=np.uint8))
+        self.qubits += len(bits)
+        self.intercepted += int(intercepted)
+        self.learned += int(learned)
+        return bits, basis, pulses
+
+    # Relay callback of a QuNetSim host
+    def sniff(self, sender, receiver, qubit):
+        self.qubits += 1
+        self.qubit(qubit)
+
+    def stats(self):
+        return {'attack': self.name, 'qubits': self.qubits, 'intercepted': self.intercepted, 'learned': self.learned}
+
+    def __repr__(self):
+        return type(self).__name__ + '()'
+
+
+class BitFlip(Attack):
+    """
+        X gate with probability 'probability' on every qubit, by default sniff_probability() of qkd_BB84.
+    """
+    name = 'bit_flip'
+
+    def __init__(self, probability=None):
+        super().__init__()
+        if probability is None:
+            from qkd.qkd_BB84 import sniff_probability
+            probability = sniff_probability()
+        if not 0 <= probability <= 1:
+            raise ValueError("The probability of a bit flip must be in [0, 1].")
+        self.probability = probability
+
+    def apply(self, bits, basis):
+        flips = np.random.random(len(bits)) < self.probability
+        # |+> and |-> are unchanged up to a global phase
+        bits = bits ^ (flips & (basis == 0)).astype(np.uint8)
+        return bits, basis, None, np.count_nonzero(flips), 0
+
+    def qubit(self, qubit):
+        if random.random() < self.probability:
+            self.intercepted += 1
+            qubit.X()
+
+    def __repr__(self):
+        return 'BitFlip(' + str(self.probability) + ')'
+
+
+class InterceptResend(Attack):
+    """
+        Measure a fraction of the qubits, in a random basis with basis=None or in the fixed basis 0 = Z or 1 = X,
+        and resend the measured state.
+    """
+    name = 'intercept_resend'
+
+    def __init__(self, basis=None, fraction=1.0):
+        super().__init__()
+        if basis not in (None, 0, 1):
+            raise ValueError("The basis of the interception is None (random), 0 (Z) or 1 (X).")
+        if not 0 <= fraction <= 1:
+            raise ValueError("The fraction of intercepted qubits must be in [0, 1].")
+        self.basis = basis
+        self.fraction = fraction
+
+    def _basis(self, size):
+        if self.basis is None:
+            return np.random.randint(2, size=size).astype(np.uint8)
+        return np.full(size, self.basis, dtype=np.uint8)
+
+    def apply(self, bits, basis):
+        size = len(bits)
+        hit = np.random.random(size) < self.fraction
+        eve_basis = self._basis(size)
+        match = eve_basis == basis
+        measured = np.where(match, bits, np.random.randint(2, size=size)).astype(np.uint8)
+        bits = np.where(hit, measured, bits).astype(np.uint8)
+        basis = np.where(hit, eve_basis, basis).astype(np.uint8)
+        return bits, basis, None, np.count_nonzero(hit), np.count_nonzero(hit & match)
+
+    # A non-destructive measurement leaves the qubit in the measured state
+    def qubit(self, qubit):
+        if random.random() < self.fraction:
+            base = self._basis(1)[0]
+            self.intercepted += 1
+            if base:
+                qubit.H()
+            qubit.measure(non_destructive=True)
+            if base:
+                qubit.H()
+
+    def __repr__(self):
+        return 'InterceptResend(' + str(self.basis) + ', ' + str(self.fraction) + ')'
+
+
+class PhotonNumberSplitting(Attack):
+    """
+        Photon-number-splitting on weak coherent pulses of mean photon number 'mu'. Eve learns the bit of every
+        multi-photon pulse and blocks the single-photon pulses with probability 'block', the states that go on are
+        unchanged. A QuNetSim qubit is a single photon, so the attack leaves the 'qunetsim' engine alone.
+    """
+    name = 'pns'
+
+    def __init__(self, mu=MEAN_PHOTON_NUMBER, block=1.0):
+        super().__init__()
+        if mu < 0:
+            raise ValueError("The mean photon number must be positive.")
+        if not 0 <= block <= 1:
+            raise ValueError("The probability to block a single photon must be in [0, 1].")
+        self.mu = mu
+        self.block = block
+
+    def apply(self, bits, basis):
+        photons = np.random.poisson(self.mu, len(bits))
+        multi = photons > 1
+        blocked = (photons == 1) & (np.random.random(len(bits)) < self.block)
+        return bits, basis, ~blocked, np.count_nonzero(multi), np.count_nonzero(multi)
+
+    def __repr__(self):
+        return 'PhotonNumberSplitting(' + str(self.mu) + ', ' + str(self.block) + ')'
+
+
+ATTACKS = {'bit_flip': BitFlip,
+           'intercept_resend': InterceptResend,
+           'pns': PhotonNumberSplitting}
+
+
+# An attack from an Attack, a name of ATTACKS or a factory such as an Attack class
+def make_attack(attack, **kwargs):
+    if isinstance(attack, Attack):
+        return attack
+    if isinstance(attack, str):
+        if attack not in ATTACKS:
+            raise ValueError("Unknown attack '" + attack + "', choose from " + str(sorted(ATTACKS)) + ".")
+        attack = ATTACKS[attack]
+    return attack(**kwargs)
+
+
+# Attacks of the given spiers, a spier missing from 'attacks' flips bits like 'sniffing_quantum' in qkd_node
+def spier_attacks(spiers, attacks=None):
+    attacks = attacks or {}
+    return [make_attack(attacks[s]) if s in attacks else BitFlip() for s in spiers]
+
+
+# Pass a batch of states through the attacks in order. Return the states and the pulses that reach the receiver,
+# None if all do.
+def attack_states(bits, basis, attacks):
+    pulses = None
+    for attack in attacks:
+        bits, basis, kept = attack(bits, basis)
+        if kept is not None:
+            pulses = kept if pulses is None else pulses & kept
+    return bits, basis, pulses
@@ -0,0 +1,310 @@
+########################################################################################################################
+# Copyright (c) Xiufan Li. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Author: Xiufan Li
+# Supervisor: Patrick Rebentrost
+# Institution: Centre for Quantum Technologies, National University of Singapore
+# For feedback, please contact Xiufan at: shenlongtianwu8@gmail.com.
+########################################################################################################################
+
+# !/usr/bin/env python3
+
+"""
+    Benchmarks of the protocol, crypto and routing hot paths.
+
+    'run' times every benchmark over its sizes and writes the results as JSON, 'compare' matches two result files
+    and reports the benchmarks that got slower than a threshold, with a non-zero exit status. Example:
+
+        python -m qkd.qkd_bench run --quick --out before.json
+        python -m qkd.qkd_bench run --quick --out after.json
+        python -m qkd.qkd_bench compare before.json after.json --threshold 0.2
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+
+import numpy as np
+
+from qkd.qkd_key import Key
+from qkd.qkd_crypto import encrypt_msg
+from qkd.qkd_routing import clear_cache
+
+# Two hosts of one link for the protocol benchmarks
+LINK = {'Alice': [['sender'], [103.68, 1.34], ['Bob']],
+        'Bob': [['receiver'], [103.96, 1.34], ['Alice']]}
+
+# Name: (unit of size, sizes, sizes with --quick)
+BENCHMARKS = {
+    'bb84_numpy': ('bits', [10 ** 2, 10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6], [10 ** 2, 10 ** 4]),
+    'bb84_qunetsim': ('bits', [10 ** 2, 10 ** 3], [10 ** 2]),
+    'b92_numpy': ('bits', [10 ** 2, 10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6], [10 ** 2, 10 ** 4]),
+    'b92_qunetsim': ('bits', [10 ** 2, 10 ** 3], [10 ** 2]),
+    'encrypt_xor': ('bytes', [10 ** 3, 10 ** 5, 10 ** 6, 10 ** 7, 10 ** 8], [10 ** 3, 10 ** 5]),
+    'encrypt_otp': ('bytes', [10 ** 3, 10 ** 5, 10 ** 6, 10 ** 7, 10 ** 8], [10 ** 3, 10 ** 5]),
+    'trusted_xor': ('bits', [10 ** 2, 10 ** 4, 10 ** 6, 10 ** 8], [10 ** 2, 10 ** 4]),
+    'get_opt_path': ('nodes', [10, 20, 50, 100, 200], [10, 20]),
+    'toeplitz_hash': ('bits', [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6], [10 ** 3, 10 ** 4]),
+    'relay_sequential': ('nodes', [2, 5, 10, 20], [2, 5]),
+    'relay_concurrent': ('nodes', [2, 5, 10, 20], [2, 5]),
+    'relay_async': ('nodes', [2, 5, 10, 20, 200], [2, 5]),
+}
+HOST_BENCHMARKS = ['bb84_numpy', 'bb84_qunetsim', 'b92_numpy', 'b92_qunetsim']
+RELAY_BENCHMARKS = ['relay_sequential', 'relay_concurrent']
+RELAY_KEY_SIZE = 10 ** 5     # Qubits of every hop exchange of the relay benchmarks
+RELAY_MESSAGE = "Hey, are you nervous for the presentation??"
+REPEAT = 3
+THRESHOLD = 0.2
+
+
+# Random connected topology of n nodes with about 'degree' links per node, node 0 sends to node n - 1
+def random_topology(n, degree=4, seed=0):
+    rng = random.Random(seed)
+    graph = {i: [['truster'], [103.6 + rng.random() / 2, 1.2 + rng.random() / 4], []] for i in range(n)}
+    graph[0][0] = ['sender']
+    graph[n - 1][0] = ['receiver']
+    for u in range(1, n):
+        graph[rng.randrange(u)][2].append(u)
+    for _ in range(n * (degree - 2) // 2):
+        u, v = rng.sample(range(n), 2)
+        if v not in graph[u][2] and u not in graph[v][2]:
+            graph[u][2].append(v)
+    return graph
+
+
+# Path of n trusted nodes between a sender and a receiver
+def chain_topology(n):
+    names = ['Sender'] + ['Trusted' + str(i) for i in range(1, n + 1)] + ['Receiver']
+    graph = {name: [['truster'], [103.6 + i / 100, 1.3], []] for i, name in enumerate(names)}
+    graph['Sender'][0] = ['sender']
+    graph['Receiver'][0] = ['receiver']
+    for a, b in zip(names, names[1:]):
+        graph[a][2].append(b)
+        graph[b][2].append(a)
+    return graph
+
+
+# Latency of a message over a chain of trusted nodes, with the keys of the trusted nodes established one hop
+# after the other or all at once, see 'trusted_node' in qkd_node. The chain is the graph of the session.
+def bench_relay(session, concurrent, key_size=RELAY_KEY_SIZE):
+    from qkd import qkd_node
+
+    previous = qkd_node.CONCURRENT_KEYS
+    qkd_node.CONCURRENT_KEYS = concurrent
+    try:
+        start = time.perf_counter()
+        result = session.run_path(list(session.graph), RELAY_MESSAGE, key_size, 'numpy')
+        elapsed = time.perf_counter() - start
+    finally:
+        qkd_node.CONCURRENT_KEYS = previous
+    if result.message != RELAY_MESSAGE:
+        raise RuntimeError("The receiver decrypted " + repr(result.message) + " instead of the relayed message.")
+    return elapsed
+
+
+# Same relay as 'bench_relay' with every node a coroutine of one event loop, see qkd_async
+def bench_relay_async(size):
+    import asyncio
+    from qkd.qkd_async import AsyncNetwork
+
+    network = AsyncNetwork(chain_topology(size))
+    start = time.perf_counter()
+    asyncio.run(network.run_path(list(network.graph), RELAY_MESSAGE, RELAY_KEY_SIZE))
+    return time.perf_counter() - start
+
+
+# Run the sender and the receiver of a link in their host threads and time the exchange
+def _link_exchange(session, send, send_args, recv, recv_args):
+    alice, bob = session.host_name_dic['Alice'], session.host_name_dic['Bob']
+    start = time.perf_counter()
+    threads = [alice.run_protocol(send, send_args), bob.run_protocol(recv, recv_args)]
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    session.reset()
+    return elapsed
+
+
+def bench_bb84(size, session, engine):
+    from qkd.qkd_BB84 import send_bb84, receive_bb84
+
+    return _link_exchange(session, send_bb84, (Key.random(size), 'Bob', engine),
+                          receive_bb84, (size, 'Alice', engine))
+
+
+def bench_b92(size, session, engine):
+    from qkd.qkd_B92 import preparation, send_qkd, receive_qkd
+
+    alice_basis, bob_basis = preparation(size)
+    return _link_exchange(session, send_qkd, ('Bob', alice_basis, size, engine),
+                          receive_qkd, ('Alice', bob_basis, size, engine))
+
+
+def bench_encrypt(size, mode):
+    msg = np.random.randint(32, 127, size=size, dtype=np.uint8).tobytes().decode()
+    key = Key.random(8 * size if mode == 'otp' else 13)
+    start = time.perf_counter()
+    encrypt_msg(key, msg, mode)
+    return time.perf_counter() - start
+
+
+# The key of a trusted node, see 'trusted_node' in qkd_node
+def bench_trusted_xor(size):
+    prev_key, next_key = Key.random(size), Key.random(size + 8)
+    start = time.perf_counter()
+    new_length = min([len(prev_key), len(next_key)])
+    prev_key[:new_length] ^ next_key[:new_length]
+    return time.perf_counter() - start
+
+
+def bench_get_opt_path(size):
+    from qkd.qkd_network import get_opt_path
+
+    graph = random_topology(size, seed=size)
+    clear_cache()
+    start = time.perf_counter()
+    get_opt_path(graph)
+    return time.perf_counter() - start
+
+
+# Privacy amplification of a key to 70 % of its length, see qkd_privacy
+def bench_toeplitz_hash(size):
+    from qkd.qkd_privacy import toeplitz_hash
+
+    key = Key.random(size)
+    start = time.perf_counter()
+    toeplitz_hash(key, 1, int(0.7 * size))
+    return time.perf_counter() - start
+
+
+def _bench(name, size, session):
+    if name.startswith('bb84_'):
+        return bench_bb84(size, session, name[5:])
+    if name.startswith('b92_'):
+        return bench_b92(size, session, name[4:])
+    if name.startswith('encrypt_'):
+        return bench_encrypt(size, name[8:])
+    if name == 'trusted_xor':
+        return bench_trusted_xor(size)
+    if name == 'toeplitz_hash':
+        return bench_toeplitz_hash(size)
+    if name in RELAY_BENCHMARKS:
+        return bench_relay(session, name == 'relay_concurrent')
+    if name == 'relay_async':
+        return bench_relay_async(size)
+    return bench_get_opt_path(size)
+
+
+# Time the benchmarks 'repeat' times per size, after one warm-up run, and return the results with the environment
+# they ran in
+def run(names=None, quick=False, repeat=REPEAT, label=''):
+    names = list(BENCHMARKS) if not names else names
+    for name in names:
+        if name not in BENCHMARKS:
+            raise ValueError("Unknown benchmark '" + str(name) + "', choose from " + str(list(BENCHMARKS)) + ".")
+    results = []
+    # The protocols print every exchange
+    with contextlib.redirect_stdout(io.StringIO()):
+        for name in names:
+            unit, sizes, quick_sizes = BENCHMARKS[name]
+            for size in (quick_sizes if quick else sizes):
+                # The hosts of a benchmark are built once for all its runs, one network at a time
+                session = None
+                if name in HOST_BENCHMARKS or name in RELAY_BENCHMARKS:
+                    from qkd.qkd_network import NetworkSession
+                    session = NetworkSession(chain_topology(size) if name in RELAY_BENCHMARKS else LINK)
+                try:
+                    _bench(name, size, session)
+                    times = [_bench(name, size, session) for _ in range(repeat)]
+                finally:
+                    if session is not None:
+                        session.close()
+                median = statistics.median(times)
+                results.append({'benchmark': name, 'size': size, 'unit': unit, 'repeat': repeat,
+                                'min': min(times), 'median': median, 'mean': statistics.mean(times),
+                                'rate': size / median if median > 0 else float('inf')})
+    meta = {'label': label, 'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+            'numpy': np.__version__, 'platform': platform.platform(), 'quick': quick}
+    return {'meta': meta, 'results': results}
+
+
+# Match the results of two runs by benchmark and size, a row regresses when its best time grew by 'threshold'.
+# The best time is the least disturbed by the other load of the machine.
+def compare(old, new, threshold=THRESHOLD):
+    old_results = {(r['benchmark'], r['size']): r for r in old['results']}
+    rows = []
+    for r in new['results']:
+        key = (r['benchmark'], r['size'])
+        if key not in old_results:
+            continue
+        ratio = r['min'] / old_results[key]['min'] if old_results[key]['min'] > 0 else float('inf')
+        rows.append({'benchmark': r['benchmark'], 'size': r['size'], 'old': old_results[key]['min'],
+                     'new': r['min'], 'ratio': ratio, 'regression': ratio > 1 + threshold})
+    return rows
+
+
+def format_results(results):
+    lines = ['%-14s %12s %6s %12s %14s' % ('benchmark', 'size', 'unit', 'median (s)', 'rate (unit/s)')]
+    for r in results:
+        lines.append('%-14s %12d %6s %12.6f %14.4g' % (r['benchmark'], r['size'], r['unit'], r['median'], r['rate']))
+    return '\n'.join(lines)
+
+
+def format_comparison(rows):
+    lines = ['%-14s %12s %12s %12s %8s' % ('benchmark', 'size', 'old (s)', 'new (s)', 'ratio')]
+    for r in rows:
+        lines.append('%-14s %12d %12.6f %12.6f %8.3f%s' % (r['benchmark'], r['size'], r['old'], r['new'], r['ratio'],
+                                                           '  REGRESSION' if r['regression'] else ''))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks of the QKD hot paths.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help="run the benchmarks and write JSON results")
+    run_parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), default=None)
+    run_parser.add_argument('--quick', action='store_true', help="small sizes only")
+    run_parser.add_argument('--repeat', type=int, default=REPEAT)
+    run_parser.add_argument('--label', default='')
+    run_parser.add_argument('--out', help="write the results to a JSON file")
+    compare_parser = commands.add_parser('compare', help="compare two JSON results")
+    compare_parser.add_argument('old')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=THRESHOLD)
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        report = run(args.only, args.quick, args.repeat, args.label)
+        print(format_results(report['results']))
+        if args.out:
+            with open(args.out, 'w') as file:
+                json.dump(report, file, indent=2)
+        return 0
+    with open(args.old) as file:
+        old = json.load(file)
+    with open(args.new) as file:
+        new = json.load(file)
+    rows = compare(old, new, args.threshold)
+    print(format_comparison(rows))
+    return 1 if any(r['regression'] for r in rows) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
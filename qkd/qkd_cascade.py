@@ -0,0 +1,254 @@
+########################################################################################################################
+# Copyright (c) Xiufan Li. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Author: Xiufan Li
+# Supervisor: Patrick Rebentrost
+# Institution: Centre for Quantum Technologies, National University of Singapore
+# For feedback, please contact Xiufan at: shenlongtianwu8@gmail.com.
+########################################################################################################################
+
+# !/usr/bin/env python3
+
+"""
+    Cascade information reconciliation of a sifted key.
+
+    The receiver corrects its key towards the key of the sender, who only answers parities of ranges of its key.
+    Pass p splits the key, permuted by the p-th permutation of a shared seed, into blocks of k * 2^p bits, where
+    k follows from the QBER, and at most a quarter of the key. The parities of all blocks of a pass are asked in
+    one round trip. The blocks whose parities differ are then bisected together, one round trip per halving.
+    A corrected bit flips the parity of the blocks holding it in the earlier passes, and those blocks are
+    bisected again in the next batch.
+
+    Cascade may leave errors in the key, so both sides confirm the reconciled key: the receiver sends a TAG_BITS
+    Toeplitz hash of its key under a fresh seed, the sender answers with the hash of its own key, and the keys are
+    taken as equal only if both hashes are. Two different keys pass with probability 2^-TAG_BITS.
+
+    Every parity answered by the sender and every bit of the hash is one bit leaked to an eavesdropper, see
+    qkd_privacy.
+"""
+
+import math
+
+import numpy as np
+
+from qkd.qkd_key import Key
+from qkd.qkd_wire import PARITY_FRAME, encode_queries, decode_queries, encode_bits, decode_bits, run_steps
+from qkd.qkd_wire import encode_confirm, decode_confirm
+from qkd.qkd_metrics import count, count_message
+from qkd.qkd_privacy import toeplitz_hash
+
+PASSES = 4
+BLOCK_FACTOR = 0.73         # First block size is BLOCK_FACTOR / QBER
+MIN_QBER = 0.01             # QBER assumed for the block size when the estimate is lower
+MAX_BLOCK_FRACTION = 0.25   # Largest block as a fraction of the key, so that short keys keep several blocks a pass
+TAG_BITS = 16               # Bits of the hash that confirms the reconciled key
+
+
+# Size of the blocks of the first pass, the QBER is a fraction
+def block_size(qber, length):
+    return max(1, min(length, int(math.ceil(BLOCK_FACTOR / max(qber, MIN_QBER)))))
+
+
+# Permutations of the passes, the first pass is not permuted
+def permutations(length, seed, passes):
+    rng = np.random.default_rng(seed)
+    perms = np.empty((passes, length), dtype=np.int64)
+    perms[0] = np.arange(length)
+    for p in range(1, passes):
+        perms[p] = rng.permutation(length)
+    return perms
+
+
+# Cumulative parities of the permuted bits of every pass, the parity of [start, end) is prefix[end] ^ prefix[start]
+def prefix_parities(bits, perms):
+    prefix = np.zeros((len(perms), len(bits) + 1), dtype=np.uint8)
+    for p in range(len(perms)):
+        np.bitwise_xor.accumulate(bits[perms[p]], out=prefix[p, 1:])
+    return prefix
+
+
+class ParityOracle:
+    """
+        The sender side: parities of ranges of its key, with the permutations of the last seed cached.
+    """
+
+    def __init__(self, key):
+        self.bits = Key(key).bits()
+        self.leaked = 0
+        self._seed = None
+        self._prefix = None
+
+    def __call__(self, seed, passes, starts, ends):
+        passes = np.asarray(passes)
+        if len(passes) == 0:
+            return np.zeros(0, dtype=np.uint8)
+        needed = int(passes.max()) + 1
+        if seed != self._seed or len(self._prefix) < needed:
+            self._seed = seed
+            self._prefix = prefix_parities(self.bits, permutations(len(self.bits), seed, max(needed, PASSES)))
+        self.leaked += len(passes)
+        return self._prefix[passes, ends] ^ self._prefix[passes, starts]
+
+
+# Bisect ranges with an odd number of errors together, one query per halving.
+# Yield the queries, see 'reconcile_steps', and return the positions in the key of the wrong bits.
+def _bisect(prefix, perms, passes, lo, hi):
+    found = []
+    while len(lo):
+        done = hi - lo == 1
+        found.append(perms[passes[done], lo[done]])
+        passes, lo, hi = passes[~done], lo[~done], hi[~done]
+        if not len(lo):
+            break
+        mid = (lo + hi) // 2
+        left = (yield passes, lo, mid) != (prefix[passes, mid] ^ prefix[passes, lo])
+        hi = np.where(left, mid, hi)
+        lo = np.where(left, lo, mid)
+    return np.unique(np.concatenate(found))
+
+
+# The reconciliation without any channel: a generator that yields the parity queries (passes, starts, ends)
+# and is sent the parities of the sender in return, one round trip per query.
+# The QBER is a fraction. Return the corrected key, the number of leaked parities and of round trips.
+def reconcile_steps(key, qber, seed=0, passes=PASSES):
+    bits = Key(key).bits().copy()
+    length = len(bits)
+    leaked = rounds = 0
+    if length == 0:
+        return Key(bits), 0, 0
+
+    perms = permutations(length, seed, passes)
+    first = block_size(qber, length)
+    # The blocks of all passes so far with the parities of the sender
+    block_passes, block_starts, block_ends, block_parities = [], [], [], []
+    for p in range(passes):
+        size = max(1, min(int(length * MAX_BLOCK_FRACTION), first << p))
+        starts = np.arange(0, length, size)
+        ends = np.minimum(starts + size, length)
+        pass_ids = np.full(len(starts), p)
+        block_passes.append(pass_ids)
+        block_starts.append(starts)
+        block_ends.append(ends)
+        block_parities.append((yield pass_ids, starts, ends))
+        leaked += len(pass_ids)
+        rounds += 1
+        all_passes, all_starts, all_ends = (np.concatenate(block_passes), np.concatenate(block_starts),
+                                            np.concatenate(block_ends))
+        all_parities = np.concatenate(block_parities)
+        while True:
+            prefix = prefix_parities(bits, perms[:p + 1])
+            wrong = (prefix[all_passes, all_ends] ^ prefix[all_passes, all_starts]) != all_parities
+            if not wrong.any():
+                break
+            bisect = _bisect(prefix, perms, all_passes[wrong], all_starts[wrong], all_ends[wrong])
+            # Count the queries of the bisection as they pass through
+            try:
+                query = next(bisect)
+                while True:
+                    leaked += len(query[0])
+                    rounds += 1
+                    query = bisect.send((yield query))
+            except StopIteration as stop:
+                bits[stop.value] ^= 1
+    return Key(bits), leaked, rounds
+
+
+# Correct the key with the parities of the sender, 'oracle(seed, passes, starts, ends)' returns them.
+# The QBER is a fraction. Return the corrected key, the number of leaked parities and of round trips.
+def reconcile(key, qber, oracle, seed=0, passes=PASSES):
+    steps = reconcile_steps(key, qber, seed, passes)
+    try:
+        query = next(steps)
+        while True:
+            query = steps.send(np.asarray(oracle(seed, *query), dtype=np.uint8))
+    except StopIteration as stop:
+        return stop.value
+
+
+# Hash of a key for its confirmation
+def confirm_tag(key, seed):
+    return toeplitz_hash(key, seed, TAG_BITS)
+
+
+# Confirm two keys without hosts, True if their hashes are equal. The hash leaks TAG_BITS bits.
+def confirm(sender_key, key, seed=None):
+    seed = int(np.random.randint(0, 2 ** 62)) if seed is None else seed
+    return confirm_tag(sender_key, seed) == confirm_tag(key, seed)
+
+
+# Reconcile two keys without hosts, return the corrected receiver key, the leaked parities and the round trips
+def cascade(sender_key, key, qber, seed=None, passes=PASSES):
+    seed = int(np.random.randint(0, 2 ** 62)) if seed is None else seed
+    return reconcile(key, qber, ParityOracle(sender_key), seed, passes)
+
+
+# Receiver side over the classical channel as steps, see 'run_steps' in qkd_wire: ask the parities to the sender,
+# send an empty query to finish, then confirm the corrected key. Return the corrected key, the leaked bits (the
+# parities and the hash), the round trips and if the keys of both sides are confirmed equal.
+def reconcile_host_steps(host, peer, key, qber, passes=PASSES):
+    seed = int(np.random.randint(0, 2 ** 62))
+    steps = reconcile_steps(key, qber, seed, passes)
+    try:
+        query = next(steps)
+        while True:
+            frame = encode_queries(seed, *query)
+            host.send_classical(peer, frame, await_ack=False)
+            count_message(host, peer, frame)
+            query = steps.send(decode_bits(PARITY_FRAME, (yield peer)))
+    except StopIteration as stop:
+        key, leaked, rounds = stop.value
+    frame = encode_queries(seed, [], [], [])
+    host.send_classical(peer, frame, await_ack=False)
+    count_message(host, peer, frame)
+
+    seed = int(np.random.randint(0, 2 ** 62))
+    tag = confirm_tag(key, seed)
+    frame = encode_confirm(seed, tag)
+    host.send_classical(peer, frame, await_ack=False)
+    count_message(host, peer, frame)
+    confirmed = decode_confirm((yield peer))[1] == tag
+    leaked += TAG_BITS
+    count('leaked_bits', leaked, host, peer)
+    count('cascade_rounds', rounds + 1, host, peer)
+    if not confirmed:
+        count('confirm_failures', 1, host, peer)
+    return key, leaked, rounds + 1, confirmed
+
+
+# Sender side over the classical channel as steps: answer the parity queries until the empty one, then the hash
+# of the receiver. Return the leaked bits and if the keys of both sides are confirmed equal.
+def answer_host_steps(host, peer, key):
+    oracle = ParityOracle(key)
+    while True:
+        seed, pass_ids, starts, ends = decode_queries((yield peer))
+        if len(pass_ids) == 0:
+            seed, peer_tag = decode_confirm((yield peer))
+            tag = confirm_tag(key, seed)
+            frame = encode_confirm(seed, tag)
+            host.send_classical(peer, frame, await_ack=False)
+            count_message(host, peer, frame)
+            return oracle.leaked + TAG_BITS, tag == peer_tag
+        frame = encode_bits(PARITY_FRAME, oracle(seed, pass_ids, starts, ends))
+        host.send_classical(peer, frame, await_ack=False)
+        count_message(host, peer, frame)
+
+
+# Receiver side on a thread host
+def reconcile_host(host, peer, key, qber, wait_time, passes=PASSES):
+    return run_steps(host, reconcile_host_steps(host, peer, key, qber, passes), wait_time)
+
+
+# Sender side on a thread host
+def answer_host(host, peer, key, wait_time):
+    return run_steps(host, answer_host_steps(host, peer, key), wait_time)
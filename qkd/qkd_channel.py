@@ -0,0 +1,168 @@
+########################################################################################################################
+# Copyright (c) Xiufan Li. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Author: Xiufan Li
+# Supervisor: Patrick Rebentrost
+# Institution: Centre for Quantum Technologies, National University of Singapore
+# For feedback, please contact Xiufan at: shenlongtianwu8@gmail.com.
+########################################################################################################################
+
+# !/usr/bin/env python3
+"""
+    Fiber channel model of the links, from the [longitude, latitude] position of the nodes in the graph.
+
+    The fiber of a link is the great-circle distance between its two ends times ROUTE_FACTOR, unless its length
+    is given. A qubit reaches the detector of the receiver with probability
+
+        eta = 10^(-attenuation * length / 10) * detector_efficiency
+
+    and the detector also clicks on a dark count with probability 'dark_count' per time slot, which gives a
+    random bit. A detected qubit is flipped by the optical misalignment with probability 'misalignment'.
+    The receiver announces the time slots where its detector clicked and both sides keep only those, so
+
+        QBER = (dark_count / 2 + eta (1 - dark_count) misalignment) / (1 - (1 - eta) (1 - dark_count))
+
+    The light travels at SPEED_OF_LIGHT / FIBER_INDEX in the fiber. The channel applies to whole batches of states,
+    that is to the 'numpy' engine of qkd_BB84, the asyncio runtime and the key pool. As a latency model of the
+    discrete-event simulation (see qkd_des), it adds the propagation delay of the link.
+"""
+
+import numpy as np
+
+from qkd.qkd_routing import haversine, neighbours
+from qkd.qkd_des import LinkLatency, BANDWIDTH, QUBIT_RATE
+
+ATTENUATION = 0.2           # dB per km of standard telecom fiber at 1550 nm
+DETECTOR_EFFICIENCY = 0.1   # Probability that the detector clicks on a photon, InGaAs avalanche photodiodes
+DARK_COUNT = 1e-6           # Probability of a dark count per time slot
+MISALIGNMENT = 0.01         # Probability that the optics flip a detected qubit
+ROUTE_FACTOR = 1.0          # Fiber length over the great-circle distance
+FIBER_INDEX = 1.468         # Refractive index of the fiber core
+SPEED_OF_LIGHT = 299792.458     # km/s
+SIFTING_RATIO = 0.5
+
+
+class FiberLink:
+    """
+        Fiber of one link, 'length' in km.
+    """
+
+    def __init__(self, length, attenuation=ATTENUATION, detector_efficiency=DETECTOR_EFFICIENCY,
+                 dark_count=DARK_COUNT, misalignment=MISALIGNMENT):
+        if length < 0:
+            raise ValueError("Negative fiber length " + str(length) + " km.")
+        self.length = length
+        self.attenuation = attenuation
+        self.detector_efficiency = detector_efficiency
+        self.dark_count = dark_count
+        self.misalignment = misalignment
+
+    # Probability that a qubit sent into the fiber is detected
+    @property
+    def transmittance(self):
+        return 10 ** (-self.attenuation * self.length / 10) * self.detector_efficiency
+
+    # Seconds the light takes through the fiber
+    @property
+    def delay(self):
+        return self.length * FIBER_INDEX / SPEED_OF_LIGHT
+
+    # Probability that the detector clicks in a time slot
+    @property
+    def click_probability(self):
+        return 1 - (1 - self.transmittance) * (1 - self.dark_count)
+
+    # Expected error rate of the detected qubits, a fraction
+    @property
+    def qber(self):
+        eta = self.transmittance
+        errors = self.dark_count / 2 + eta * (1 - self.dark_count) * self.misalignment
+        return errors / self.click_probability if self.click_probability else 0.0
+
+    # Send a batch of states (bit, base) through the fiber. Return the states as they reach the detector and the
+    # time slots where it clicked, the states of the other slots are meaningless.
+    # 'pulses' masks the time slots that carry a pulse, e.g. after an attack of qkd_attack, None for all.
+    def transmit(self, bits, basis, pulses=None):
+        size = len(bits)
+        photons = np.random.random(size) < self.transmittance
+        if pulses is not None:
+            photons &= np.asarray(pulses, dtype=bool)
+        dark = np.random.random(size) < self.dark_count
+        bits = np.asarray(bits, dtype=np.uint8)
+        if self.misalignment:
+            bits = bits ^ (photons & (np.random.random(size) < self.misalignment)).astype(np.uint8)
+        # A dark count gives a random bit, whatever the basis
+        bits = np.where(dark, np.random.randint(2, size=size), bits).astype(np.uint8)
+        return bits, np.asarray(basis, dtype=np.uint8), photons | dark
+
+
+class FiberChannel(LinkLatency):
+    """
+        Fibers of all links of a topology. 'lengths' maps links (u, v) to their length in km and overrides the
+        distance of the positions. A FiberChannel is also the latency model of the links for SimNetwork.
+    """
+
+    def __init__(self, graph, lengths=None, attenuation=ATTENUATION, detector_efficiency=DETECTOR_EFFICIENCY,
+                 dark_count=DARK_COUNT, misalignment=MISALIGNMENT, route_factor=ROUTE_FACTOR,
+                 bandwidth=BANDWIDTH, qubit_rate=QUBIT_RATE):
+        super().__init__(0.0, bandwidth, qubit_rate)
+        self.graph = graph
+        self.lengths = {frozenset(link): length for link, length in (lengths or {}).items()}
+        self.attenuation = attenuation
+        self.detector_efficiency = detector_efficiency
+        self.dark_count = dark_count
+        self.misalignment = misalignment
+        self.route_factor = route_factor
+        self._links = {}
+
+    # Fiber length in km between two nodes
+    def length(self, u, v):
+        link = frozenset((u, v))
+        if link in self.lengths:
+            return self.lengths[link]
+        return haversine(self.graph[u][1], self.graph[v][1]) * self.route_factor
+
+    def link(self, u, v):
+        link = frozenset((u, v))
+        fiber = self._links.get(link)
+        if fiber is None:
+            fiber = self._links[link] = FiberLink(self.length(u, v), self.attenuation, self.detector_efficiency,
+                                                  self.dark_count, self.misalignment)
+        return fiber
+
+    def transmit(self, sender, receiver, bits, basis, pulses=None):
+        return self.link(sender, receiver).transmit(bits, basis, pulses)
+
+    # Latency of a delivery on the link, see LinkLatency
+    def __call__(self, sender, receiver, channel, size):
+        delay = self.link(sender, receiver).delay
+        if channel == 'quantum':
+            return delay + size / self.qubit_rate
+        return delay + 8 * size / self.bandwidth
+
+    # Expected figures of the link: fiber length (km), transmittance, QBER (%), sifted key rate (bits/s) at the
+    # qubit rate of the source, and propagation delay (s)
+    def figures(self, u, v):
+        fiber = self.link(u, v)
+        return {'link': (u, v),
+                'length': fiber.length,
+                'transmittance': fiber.transmittance,
+                'qber': fiber.qber * 100,
+                'sifted_rate': self.qubit_rate * fiber.click_probability * SIFTING_RATIO,
+                'delay': fiber.delay}
+
+    # Figures of every link of the topology
+    def summary(self):
+        adjacency = neighbours(self.graph)
+        return [self.figures(u, v) for u in self.graph for v in sorted(adjacency[u]) if str(u) < str(v)]
@@ -21,11 +21,18 @@
 # !/usr/bin/env python3
 
 """
-    Cryptographic module of QKD. The messages are encrypted by Python's pointer 'ord' and 'chr' functions.
+    Cryptographic module of QKD. The messages are encrypted by Python's pointer 'ord' and 'chr' functions ('xor' mode),
+    or by a one-time pad that consumes the bytes of the QKD key ('otp' mode).
 """
 
-from qunetsim.objects import Logger
-Logger.DISABLED = True
+import numpy as np
+from qkd.qkd_key import Key
+from qkd.qkd_metrics import count_message
+from qkd.qkd_wire import encode_text, decode_text, encode_drop, frame_kind, DROP_FRAME
+
+# Cipher modes: 'xor' XORs every character with the first key byte, 'otp' XORs every message byte with its own key byte
+CIPHER_MODES = ['xor', 'otp']
+CHUNK_SIZE = 1 << 20        # Bytes per chunk when streaming
 
 wait_time = 10
 qkd_key_length = 13
@@ -45,37 +52,121 @@ CGREENBG = '\33[42m'
 CRED2 = '\33[91m'
 CGREEN2 = '\33[92m'
 
+# One-time pad on the bytes of a QKD key, every key byte is used for one message byte only
+class OneTimePad:
+
+    def __init__(self, key):
+        key = Key(key)
+        self._pad = np.frombuffer(key[:len(key) // 8 * 8].to_bytes(), dtype=np.uint8)
+        self._used = 0
+
+    # Number of key bytes used so far
+    @property
+    def used(self):
+        return self._used
+
+    # Number of key bytes left
+    @property
+    def remaining(self):
+        return len(self._pad) - self._used
+
+    # Append more key material to the pad
+    def extend(self, key):
+        key = Key(key)
+        more = np.frombuffer(key[:len(key) // 8 * 8].to_bytes(), dtype=np.uint8)
+        self._pad = np.concatenate([self._pad[self._used:], more])
+        self._used = 0
+
+    # Consume the next 'size' key bytes
+    def take(self, size):
+        if size > self.remaining:
+            raise ValueError("Message of " + str(size) + " bytes is longer than the " + str(self.remaining) +
+                             " bytes of remaining key material.")
+        pad = self._pad[self._used:self._used + size]
+        self._used += size
+        return pad
+
+    def encrypt(self, data):
+        data = np.frombuffer(data, dtype=np.uint8)
+        return (data ^ self.take(len(data))).tobytes()
+
+    def decrypt(self, data):
+        return self.encrypt(data)
+
+    # Encrypt an iterable of byte chunks lazily, in linear time and with one chunk in memory.
+    # If the total size is known, the stream is rejected before anything is encrypted.
+    def encrypt_stream(self, chunks, size=None):
+        if size is not None and size > self.remaining:
+            raise ValueError("Stream of " + str(size) + " bytes is longer than the " + str(self.remaining) +
+                             " bytes of remaining key material.")
+        for chunk in chunks:
+            yield self.encrypt(chunk)
+
+    def decrypt_stream(self, chunks, size=None):
+        return self.encrypt_stream(chunks, size)
+
+
+# Read a binary file object in chunks
+def iter_chunks(file, chunk_size=CHUNK_SIZE):
+    while True:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
 # Function to encrypt the message
-def encrypt_msg(key, msg):
-    # Make the key to a string
-    key_string_binary = ''.join([str(x) for x in key])          # helper function, used to make the key to a string
-    secret_key_string = ''.join(chr(int(''.join(x), 2)) for x in zip(*[iter(key_string_binary)] * 8))
+def encrypt_msg(key, msg, mode='xor'):
+    if mode == 'otp':
+        # The key is a QKD key or a OneTimePad that keeps track of the used key bytes
+        pad = key if isinstance(key, OneTimePad) else OneTimePad(key)
+        return pad.encrypt(msg.encode('utf-8', 'surrogatepass')).decode('latin-1')
+    if mode != 'xor':
+        raise ValueError("Unknown cipher mode '" + str(mode) + "', choose from " + str(CIPHER_MODES) + ".")
 
-    # Encrypt the message with the key string
-    encrypted_msg = ""
-    for char in msg:
-        encrypted_msg += chr(ord(secret_key_string) ^ ord(char))
+    # The first byte of the key encrypts every character
+    key = Key(key)
+    if len(key) < 8:
+        raise ValueError("Key of " + str(len(key)) + " bits is shorter than the byte needed to encrypt a message.")
+    key_byte = key[:8].to_bytes()[0]
 
-    return encrypted_msg
+    # Encrypt the message with the key byte, XOR all code points at once
+    code_points = np.frombuffer(msg.encode('utf-32-le', 'surrogatepass'), dtype='<u4')
+    encrypted_msg = (code_points ^ key_byte).astype('<u4').tobytes()
+    return encrypted_msg.decode('utf-32-le', 'surrogatepass')
 
 
 # Function to decrypt the message
-def decrypt_msg(key, msg):
-    return encrypt_msg(key, msg)
+def decrypt_msg(key, msg, mode='xor'):
+    if mode == 'otp':
+        pad = key if isinstance(key, OneTimePad) else OneTimePad(key)
+        return pad.decrypt(msg.encode('latin-1')).decode('utf-8', 'surrogatepass')
+    return encrypt_msg(key, msg, mode)
+
+# Frame an encrypted message as a text whatever characters the cipher text holds. A message of None was dropped
+# on a link without secret key and is framed as such.
+def encode_msg(encrypted_msg):
+    return encode_drop() if encrypted_msg is None else encode_text(encrypted_msg)
+
+
+def decode_msg(frame):
+    return None if frame_kind(frame) == DROP_FRAME else decode_text(frame)
+
 
 # Function to send the message
 def send_msg(sender, encrypted_msg_to_eve, receiver):
     print(CRED + str(sender.host_id) + CEND +
-          " sends encrypted message to " +
+          (" sends encrypted message to " if encrypted_msg_to_eve is not None else " drops the message to ") +
           CGREEN + str(receiver) + CEND)
-    sender.send_classical(receiver, "-1:" + encrypted_msg_to_eve, await_ack=False)
+    message = encode_msg(encrypted_msg_to_eve)
+    sender.send_classical(receiver, message, await_ack=False)
+    count_message(sender, receiver, message)
 
-# Function to receive the message
+# Function to receive the message, None if it was dropped
 def recv_msg(receiver, sender):
-    encrypted_msg = receiver.get_next_classical(sender, -1).content
-    encrypted_msg = encrypted_msg.split(':')[1]
+    encrypted_msg = decode_msg(receiver.get_next_classical(sender, -1).content)
     print(CGREEN + str(receiver.host_id) + CEND +
-          " receives encrypted message from " +
+          (" receives encrypted message from " if encrypted_msg is not None else " receives no message from ") +
           CRED + str(sender) + CEND)
     print()
-    return encrypted_msg
\ No newline at end of file
+    return encrypted_msg
@@ -0,0 +1,190 @@
+########################################################################################################################
+# Copyright (c) Xiufan Li. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Author: Xiufan Li
+# Supervisor: Patrick Rebentrost
+# Institution: Centre for Quantum Technologies, National University of Singapore
+# For feedback, please contact Xiufan at: shenlongtianwu8@gmail.com.
+########################################################################################################################
+
+# !/usr/bin/env python3
+"""
+    Discrete-event simulation of QKD networks on a virtual clock.
+
+    The coroutines of the asyncio runtime (qkd_async) run on an event loop whose clock only moves from one
+    scheduled event to the next: every classical message and batch of qubits is delivered at the simulated time
+    given by the latency model of its link, and the timeouts of the protocols expire in simulated time too.
+    A run takes as long as the CPU needs, whatever the latencies, and a run where every host waits for a message
+    that never comes stops at once with a DeadlockError.
+    Example:
+
+        network = SimNetwork(graph, latency=LinkLatency(delay=0.005))
+        msg = network.run(network.run_path(path, "Hello", key_size)).message
+        print(network.sim_time, network.wall_time)
+"""
+
+import asyncio
+import collections
+import random
+import time
+
+from qkd.qkd_async import AsyncNetwork
+
+LINK_DELAY = 1e-3           # Seconds of propagation over a link, about 200 km of fiber
+BANDWIDTH = 1e9             # Bits per second of the classical channel
+QUBIT_RATE = 1e6            # Qubits per second sent by the source of the quantum channel
+
+
+class DeadlockError(RuntimeError):
+    """
+        Every host waits and no event is scheduled, the simulation cannot go on.
+    """
+
+
+class _VirtualSelector:
+    """
+        Selector of the virtual clock loop. Waiting for the next timer moves the clock to it instead of sleeping,
+        real file descriptors (the self-pipe of the loop) are only polled.
+    """
+
+    def __init__(self, selector, loop):
+        self._selector = selector
+        self._loop = loop
+
+    def select(self, timeout=None):
+        events = self._selector.select(0)
+        if events or timeout == 0:
+            return events
+        if timeout is None:
+            raise DeadlockError("No event left at simulated time " + str(round(self._loop.time(), 6)) +
+                                " s, every host waits for a message that never comes.")
+        self._loop.advance(timeout)
+        return []
+
+    def __getattr__(self, name):
+        return getattr(self._selector, name)
+
+
+class VirtualClockLoop(asyncio.SelectorEventLoop):
+    """
+        Event loop on a virtual clock that starts at 'start' seconds.
+    """
+
+    def __init__(self, start=0.0):
+        self._now = start
+        super().__init__()
+        self._selector = _VirtualSelector(self._selector, self)
+
+    def time(self):
+        return self._now
+
+    def advance(self, seconds):
+        self._now += seconds
+
+
+class LinkLatency:
+    """
+        Latency model of the links: a propagation delay plus the time to send the message over the channel.
+        Any callable latency(sender, receiver, channel, size) -> seconds can replace it.
+    """
+
+    def __init__(self, delay=LINK_DELAY, bandwidth=BANDWIDTH, qubit_rate=QUBIT_RATE):
+        self.delay = delay
+        self.bandwidth = bandwidth
+        self.qubit_rate = qubit_rate
+
+    def __call__(self, sender, receiver, channel, size):
+        if channel == 'quantum':
+            return self.delay + size / self.qubit_rate
+        return self.delay + 8 * size / self.bandwidth
+
+
+class SimNetwork(AsyncNetwork):
+    """
+        The hosts of a topology on the virtual clock. Each delivery is an event at the time given by the latency
+        model, and the deliveries of a link arrive in the order they were sent. With 'loss', every message or
+        batch of qubits is lost with this probability. A FiberChannel of qkd_channel is the latency model unless
+        another one is given.
+        The simulated time goes on from one run to the next.
+    """
+
+    def __init__(self, graph, latency=None, loss=0.0, seed=None, channel=None, attacks=None):
+        super().__init__(graph, channel, attacks)
+        self.latency = (LinkLatency() if channel is None else channel) if latency is None else latency
+        self.loss = loss
+        self.clock = 0.0            # Simulated seconds since the network was built
+        self.sim_time = 0.0         # Simulated seconds of the last run
+        self.wall_time = 0.0        # Seconds of the last run on the wall clock
+        self.delivered = 0
+        self.lost = 0
+        self._random = random.Random(seed)
+        self._arrivals = {}         # (sender, receiver, channel) -> time of the last delivery
+        self._pending = {}          # (sender, receiver, channel) -> items on the way, in the order they were sent
+
+    def deliver(self, sender, receiver, channel, item, size):
+        if self.loss and self._random.random() < self.loss:
+            self.lost += 1
+            return
+        loop = asyncio.get_running_loop()
+        link = (sender, receiver, channel)
+        arrival = max(loop.time() + self.latency(sender, receiver, channel, size), self._arrivals.get(link, 0.0))
+        self._arrivals[link] = arrival
+        self._pending.setdefault(link, collections.deque()).append((item, size))
+        # Events at the same time may run in any order, so each one delivers the oldest item of the link
+        loop.call_at(arrival, self._arrive, link)
+
+    def _arrive(self, link):
+        item, size = self._pending[link].popleft()
+        self.delivered += 1
+        super().deliver(*link, item, size)
+
+    # Run a coroutine, e.g. 'run_path', until it completes and return its result
+    def run(self, coroutine):
+        loop = VirtualClockLoop(self.clock)
+        start = time.perf_counter()
+        try:
+            return loop.run_until_complete(coroutine)
+        finally:
+            self.wall_time = time.perf_counter() - start
+            self.sim_time = loop.time() - self.clock
+            self.clock = loop.time()
+            # Stop the hosts that still wait, the inboxes belong to the loop
+            tasks = asyncio.all_tasks(loop)
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            loop.close()
+            for host in self.hosts.values():
+                host._classical.clear()
+                host._quantum.clear()
+            self._pending.clear()
+
+
+# Same as QKD in qkd_async on the virtual clock, print the simulated and the wall time of every path.
+# Return the PathResults, with the messages decrypted by the receiver and the rates in simulated time.
+def QKD(graph, msg, key_size, latency=None, loss=0.0, plot=False, channel=None, attacks=None):
+    from qkd.qkd_network import get_opt_path
+
+    PATH, OPT_PATH = get_opt_path(graph, plot=plot)
+    network = SimNetwork(graph, latency, loss, channel=channel, attacks=attacks)
+
+    path = OPT_PATH[0]
+    paths = [path] + ([p for p in OPT_PATH if p != path] or [p for p in PATH if p != path])[:1]
+    received = []
+    for path in paths:
+        received.append(network.run(network.run_path(path, msg, key_size)))
+        print("Path " + " - ".join(path) + " took " + "%.6f" % network.sim_time + " s simulated, " +
+              "%.6f" % network.wall_time + " s on the wall clock.")
+    return received
@@ -0,0 +1,80 @@
+########################################################################################################################
+# Copyright (c) Xiufan Li. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Author: Xiufan Li
+# Supervisor: Patrick Rebentrost
+# Institution: Centre for Quantum Technologies, National University of Singapore
+# For feedback, please contact Xiufan at: shenlongtianwu8@gmail.com.
+########################################################################################################################
+
+# !/usr/bin/env python3
+
+"""
+    Parameter estimation of a sifted key: only a random sample of the positions is revealed to estimate the error
+    rate (QBER), the other positions are kept for the final key.
+
+    The sample positions are drawn from a seed, so the sender only reveals the seed and the sampled bits.
+    The upper bound of the QBER follows from Hoeffding's inequality: with m sampled bits, the QBER of the kept bits
+    exceeds the sample QBER by more than sqrt(ln(1 / epsilon) / (2 m)) with probability at most epsilon.
+"""
+
+import math
+
+import numpy as np
+
+from qkd.qkd_key import Key
+
+SAMPLE_FRACTION = 0.25      # Fraction of the sifted key revealed for the estimation
+EPSILON = 1e-3              # Failure probability of the QBER upper bound
+
+
+# Random seed of the sample positions
+def sample_seed():
+    return int(np.random.randint(0, 2 ** 62))
+
+
+# Number of revealed positions, at least one of a non-empty key
+def sample_size(length, fraction=SAMPLE_FRACTION):
+    if length == 0:
+        return 0
+    return min(length, max(1, int(round(fraction * length))))
+
+
+# Mask of the sampled positions, the same for both sides with the same seed
+def sample_mask(length, seed, fraction=SAMPLE_FRACTION):
+    mask = np.zeros(length, dtype=bool)
+    mask[np.random.default_rng(seed).choice(length, sample_size(length, fraction), replace=False)] = True
+    return mask
+
+
+# Upper bound of the QBER in percent, from the QBER in percent of m sampled bits
+def qber_bound(error_rate, m, epsilon=EPSILON):
+    if m == 0:
+        return 100.0
+    return min(100.0, error_rate + 100 * math.sqrt(math.log(1 / epsilon) / (2 * m)))
+
+
+# Error rate in percent of the sampled bits of both keys
+def sample_error_rate(sender_sample, sample):
+    if len(sample) == 0:
+        return 0.0
+    return round(Key(sender_sample).hamming(Key(sample)) / len(sample) * 100, 2)
+
+
+# Estimate the QBER of two sifted keys without hosts, return the kept keys, the sample error rate and its bound
+def estimate(sender_key, key, fraction=SAMPLE_FRACTION, seed=None):
+    sender_key, key = Key(sender_key), Key(key)
+    mask = sample_mask(len(key), sample_seed() if seed is None else seed, fraction)
+    error_rate = sample_error_rate(sender_key.sift(mask), key.sift(mask))
+    return sender_key.sift(~mask), key.sift(~mask), error_rate, qber_bound(error_rate, int(mask.sum()))
@@ -0,0 +1,143 @@
+########################################################################################################################
+# Copyright (c) Xiufan Li. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Author: Xiufan Li
+# Supervisor: Patrick Rebentrost
+# Institution: Centre for Quantum Technologies, National University of Singapore
+# For feedback, please contact Xiufan at: shenlongtianwu8@gmail.com.
+########################################################################################################################
+
+# !/usr/bin/env python3
+
+"""
+    Bit-packed key shared by the protocols, the trusted nodes and the cryptographic module.
+"""
+
+import numpy as np
+
+# Number of set bits of every byte value
+POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+class Key:
+    """
+        A key of 'len(key)' bits, packed eight per byte (first bit in the most significant position).
+        The padding bits of the last byte are always zero.
+    """
+
+    def __init__(self, bits=()):
+        if isinstance(bits, Key):
+            self._words = bits._words.copy()
+            self._length = bits._length
+        else:
+            bits = np.asarray(bits).astype(bool, copy=False).ravel()
+            self._words = np.packbits(bits)
+            self._length = len(bits)
+
+    # Build a key from packed words, clearing the padding bits
+    @classmethod
+    def from_words(cls, words, length):
+        key = cls.__new__(cls)
+        key._words = np.array(words, dtype=np.uint8)[:(length + 7) // 8]
+        key._length = length
+        if len(key._words) * 8 < length:
+            raise ValueError("Not enough words for a key of " + str(length) + " bits.")
+        if length % 8:
+            key._words[-1] &= (0xFF << (8 - length % 8)) & 0xFF
+        return key
+
+    @classmethod
+    def from_bytes(cls, data, length=None):
+        words = np.frombuffer(data, dtype=np.uint8)
+        return cls.from_words(words, 8 * len(words) if length is None else length)
+
+    # Uniformly random key
+    @classmethod
+    def random(cls, length):
+        return cls.from_words(np.random.randint(256, size=(length + 7) // 8, dtype=np.uint8), length)
+
+    @property
+    def words(self):
+        return self._words
+
+    def __len__(self):
+        return self._length
+
+    # Unpacked bits as an uint8 array
+    def bits(self):
+        return np.unpackbits(self._words, count=self._length)
+
+    def tolist(self):
+        return self.bits().tolist()
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def __array__(self, dtype=None, copy=None):
+        bits = self.bits()
+        return bits if dtype is None else bits.astype(dtype)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._length)
+            if step == 1 and start % 8 == 0:
+                # Byte aligned slices only copy words
+                length = max(stop - start, 0)
+                return Key.from_words(self._words[start // 8:start // 8 + (length + 7) // 8], length)
+            return Key(self.bits()[index])
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("Key index out of range.")
+        return int(self._words[index >> 3] >> (7 - (index & 7))) & 1
+
+    # Keep the bits where the mask is set
+    def sift(self, mask):
+        mask = np.asarray(mask).astype(bool, copy=False)[:self._length]
+        return Key(self.bits()[:len(mask)][mask])
+
+    # Concatenate keys
+    def __add__(self, other):
+        if self._length % 8 == 0:
+            return Key.from_words(np.concatenate([self._words, Key(other)._words]), self._length + len(other))
+        return Key(np.concatenate([self.bits(), Key(other).bits()]))
+
+    def __xor__(self, other):
+        other = Key(other) if not isinstance(other, Key) else other
+        if self._length != other._length:
+            raise ValueError("Cannot XOR keys of " + str(self._length) + " and " + str(other._length) + " bits.")
+        return Key.from_words(self._words ^ other._words, self._length)
+
+    # Number of set bits
+    def popcount(self):
+        return int(POPCOUNT[self._words].sum(dtype=np.int64))
+
+    # Number of different bits between two keys of the same length
+    def hamming(self, other):
+        return (self ^ other).popcount()
+
+    # Packed bytes, the padding bits of the last byte are zero
+    def to_bytes(self):
+        return self._words.tobytes()
+
+    def __eq__(self, other):
+        if not isinstance(other, Key):
+            return NotImplemented
+        return self._length == other._length and np.array_equal(self._words, other._words)
+
+    __hash__ = None
+
+    def __repr__(self):
+        bits = ''.join(map(str, self[:64].tolist()))
+        return 'Key(' + repr(bits + ('...' if self._length > 64 else '')) + ', length=' + str(self._length) + ')'
@@ -0,0 +1,173 @@
+########################################################################################################################
+# Copyright (c) Xiufan Li. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Author: Xiufan Li
+# Supervisor: Patrick Rebentrost
+# Institution: Centre for Quantum Technologies, National University of Singapore
+# For feedback, please contact Xiufan at: shenlongtianwu8@gmail.com.
+########################################################################################################################
+
+# !/usr/bin/env python3
+
+"""
+    Instrumentation of QKD sessions: timed spans around the protocol phases and counters per host and link.
+
+    Recording is off by default, then 'span' returns a shared no-op context and 'count' returns at once.
+    Example:
+
+        with recording():
+            QKD(graph, msg, key_size, engine='numpy')
+            print(to_prometheus())
+
+    A span or counter is keyed by its name, the host that records it and the peer of the link (None for a host).
+"""
+
+import json
+import threading
+import time
+
+ENABLED = False
+
+_LOCK = threading.Lock()
+_SPANS = {}         # (phase, host, peer) -> [count, seconds]
+_COUNTERS = {}      # (name, host, peer) -> value
+
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class _Span:
+    __slots__ = ('key', 'start')
+
+    def __init__(self, key):
+        self.key = key
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        with _LOCK:
+            record = _SPANS.setdefault(self.key, [0, 0.0])
+            record[0] += 1
+            record[1] += elapsed
+        return False
+
+
+def enable(flag=True):
+    global ENABLED
+    ENABLED = flag
+
+
+def reset():
+    with _LOCK:
+        _SPANS.clear()
+        _COUNTERS.clear()
+
+
+# Time the block as one occurrence of the phase
+def span(phase, host=None, peer=None):
+    if not ENABLED:
+        return _NO_SPAN
+    return _Span((phase, _id(host), _id(peer)))
+
+
+def count(name, value=1, host=None, peer=None):
+    if not ENABLED:
+        return
+    key = (name, _id(host), _id(peer))
+    with _LOCK:
+        _COUNTERS[key] = _COUNTERS.get(key, 0) + value
+
+
+# Count one classical message of the link and its size
+def count_message(host, peer, content):
+    if not ENABLED:
+        return
+    count('classical_messages', 1, host, peer)
+    count('classical_bytes', len(content), host, peer)
+
+
+# Hosts are recorded by their id
+def _id(host):
+    return getattr(host, 'host_id', host)
+
+
+class recording:
+    """
+        Record from a clean state within the block, and restore the previous state on exit.
+    """
+
+    def __init__(self, clear=True):
+        self.clear = clear
+
+    def __enter__(self):
+        self.previous = ENABLED
+        if self.clear:
+            reset()
+        enable(True)
+        return self
+
+    def __exit__(self, *exc):
+        enable(self.previous)
+        return False
+
+
+def snapshot():
+    with _LOCK:
+        spans = [{'phase': k[0], 'host': k[1], 'peer': k[2], 'count': v[0], 'seconds': v[1]}
+                 for k, v in sorted(_SPANS.items(), key=lambda item: str(item[0]))]
+        counters = [{'name': k[0], 'host': k[1], 'peer': k[2], 'value': v}
+                    for k, v in sorted(_COUNTERS.items(), key=lambda item: str(item[0]))]
+    return {'spans': spans, 'counters': counters}
+
+
+def to_json(indent=2):
+    return json.dumps(snapshot(), indent=indent)
+
+
+def _labels(**labels):
+    items = [(k, v) for k, v in labels.items() if v is not None]
+    return '{' + ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in items) + '}'
+
+
+# Prometheus text exposition format
+def to_prometheus(prefix='qkd'):
+    data = snapshot()
+    lines = ['# HELP %s_phase_seconds_total Wall time spent in a protocol phase.' % prefix,
+             '# TYPE %s_phase_seconds_total counter' % prefix]
+    for s in data['spans']:
+        lines.append('%s_phase_seconds_total%s %r' % (prefix, _labels(phase=s['phase'], host=s['host'],
+                                                                        peer=s['peer']), s['seconds']))
+    lines += ['# HELP %s_phase_count_total Occurrences of a protocol phase.' % prefix,
+              '# TYPE %s_phase_count_total counter' % prefix]
+    for s in data['spans']:
+        lines.append('%s_phase_count_total%s %d' % (prefix, _labels(phase=s['phase'], host=s['host'],
+                                                                      peer=s['peer']), s['count']))
+    names = sorted(set(c['name'] for c in data['counters']))
+    for name in names:
+        lines += ['# TYPE %s_%s_total counter' % (prefix, name)]
+        for c in data['counters']:
+            if c['name'] == name:
+                lines.append('%s_%s_total%s %r' % (prefix, name, _labels(host=c['host'], peer=c['peer']), c['value']))
+    return '\n'.join(lines) + '\n'
@@ -24,34 +24,44 @@
     The building block of QKD networks within a path.
 """
 
+import time
 
-import numpy as np
+from qkd.qkd_key import Key
+from qkd.qkd_routing import shortest_paths, endpoints, K_PATHS
+from qkd.qkd_plot import draw_topology
+from qkd.qkd_metrics import span
+from qkd.qkd_node import send_node, recv_node, trusted_node
+from qkd.qkd_attack import spier_attacks
+from qkd.qkd_report import PathResult
 
-from qunetsim.components import Host
-from qunetsim.components import Network
-from qunetsim.objects import Logger
 
-import networkx as nx
-from networkx import draw_networkx
-import matplotlib.pyplot as plt
+# The QuNetSim network, imported on first use. QuNetSim also loads matplotlib, so it stays off the import path
+# of the vectorized engines. Its logging is disabled here once for the whole package.
+def get_network():
+    from qunetsim.components import Network
+    from qunetsim.objects import Logger
 
-from qkd.qkd_node import sniffing_quantum, sniffing_classical
-from qkd.qkd_node import send_node, recv_node, trusted_node
+    Logger.DISABLED = True
+    return Network.get_instance()
 
-Logger.DISABLED = True
 
-# Initialize Networks, create hosts and make connections
-def connect(graph):
+# Initialize Networks, create hosts and make connections.
+# With a FiberChannel of qkd_channel, the batches of states of the 'numpy' engine go through the fibers of the links.
+# 'attacks' maps spiers to their attack of qkd_attack, the other spiers flip bits (BitFlip).
+def connect(graph, channel=None, attacks=None):
     # graph = {'Ani': [['sender'], [], ['Arya', ]],
     #          'Arya': [['truster'], [], ['Ani', 'Darren', 'Nayan']],
     #          'Darren': [['truster'], [], ['Xiufan']],
     #          'Nayan': [['truster'], [], ['Arya', 'Xiufan']],
     #          'Xiufan': [['receiver'], [], ['Nayan']]}
 
+    from qunetsim.components import Host
+
     nodes = graph.keys()
     # Initialize a network
-    network = Network.get_instance()
+    network = get_network()
     network.delay = 0.0  # Set delay to 0
+    network.qkd_channel = channel
     network.start(nodes)  # Start the network with the defined hosts
 
     # Declare the hosts
@@ -67,130 +77,119 @@ def connect(graph):
         host_name_dic[n].start()
         network.add_host(host_name_dic[n])
 
-    # Spiers start sniffing
-    for n in nodes:
-        if graph[n][0][0] == 'spier':
-            host_name_dic[n].q_relay_sniffing = True
-            host_name_dic[n].q_relay_sniffing_fn = sniffing_quantum
-            # host_name_dic[n].c_relay_sniffing = True
-            # host_name_dic[n].c_relay_sniffing_fn = sniffing_classical
+    # Spiers start sniffing, the attack applies to single qubits and to batches of states
+    spiers = [n for n in nodes if graph[n][0][0] == 'spier']
+    for n, attack in zip(spiers, spier_attacks(spiers, attacks)):
+        host_name_dic[n].qkd_attack = attack
+        host_name_dic[n].q_relay_sniffing = True
+        host_name_dic[n].q_relay_sniffing_fn = attack.sniff
     return host_name_dic, network
 
 
-# Find all Paths and the optimal path (with smallest number of nodes) given a graph, with sender and receiver
-def get_opt_path(graph):
+class NetworkSession:
+    """
+        Network and hosts of a topology, built once and reused by several paths and messages.
+    """
+
+    def __init__(self, graph, channel=None, attacks=None):
+        self.graph = graph
+        self.channel = channel
+        self.host_name_dic, self.network = connect(graph, channel, attacks)
+        self.runs = 0
+
+    # Empty the classical and quantum storages of all hosts between two runs
+    def reset(self):
+        for host in self.host_name_dic.values():
+            host.empty_classical(reset_seq_nums=True)
+            host.reset_data_qubits()
+
+    def run_path(self, path, msg, key_size, engine='qunetsim', pool=None):
+        return run_path(path, self.graph, msg, key_size, engine, pool, session=self)
+
+    def close(self):
+        self.network.stop(True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Find the k shortest paths and the optimal paths (with smallest number of nodes) given a graph,
+# with sender and receiver. The paths are weighted by 'hop', 'distance' or 'qber', see qkd_routing.
+# Routing is headless: the topology is drawn only with 'plot' (in a window) or 'filename' (to an image file).
+def get_opt_path(graph, k=K_PATHS, weight='hop', qber=None, plot=False, filename=None):
     # graph = {'Ani': [['sender'], [], ['Arya', ]],
     #          'Arya': [['truster'], [], ['Ani', 'Darren', 'Nayan']],
     #          'Darren': [['truster'], [], ['Xiufan']],
     #          'Nayan': [['truster'], [], ['Arya', 'Xiufan']],
     #          'Xiufan': [['receiver'], [], ['Nayan']]}
+    if plot or filename is not None:
+        draw_topology(graph, filename=filename, show=plot)
 
-    G = nx.Graph()
-    G.add_nodes_from(list(graph.keys()))
-    edges = []
-
-    sender_list = []
-    receiver_list = []
-    trusted_nodes_list = []
-    spy_nodes_list = []
-
-    pos = {}
-
-    for n in graph.keys():
-        name = graph[n][0][0]
-        recvs = graph[n][2]
-        longti = graph[n][1][0]
-        lati = graph[n][1][1]
-        pos[n] = (longti, lati)
-        if name == 'sender':
-            sender = n
-            sender_list.append(sender)
-        elif name == 'receiver':
-            receiver = n
-            receiver_list.append(receiver)
-        elif name == 'truster':
-            trusted_nodes_list.append(n)
-        elif name == 'spier':
-            spy_nodes_list.append(n)
-        for v in recvs:
-            edges.append((n, v))
-    print(edges)
-    G.add_edges_from(edges)
-
-    nodes_list = [sender_list, trusted_nodes_list, spy_nodes_list, receiver_list]
-    colors = ['red', 'blue', 'gray', 'green']
-    # positions = {v: pos for v in list(G.nodes)}
-    # positions = spring_layout(G)
-    positions = pos
-
-    plt.figure()
-    plt.title("QKE Networks Topology", fontsize=22)
-    plt.xlabel("Sender (RED)     Receiver (GREEN)     Trusted Nodes (BLUE)     SPY Nodes (GRAY)", fontsize=22)
-    # plt.grid()
-    for j in range(4):
-        for vertex in nodes_list[j]:
-            options = {
-                'arrows': True,
-                'arrowsize': 100,
-                # 'arrowstyle':'<|-|>',
-                "nodelist": [vertex],
-                "node_color": colors[j],
-                # "node_shape": '8' if vertex in sender_list or vertex in receiver_list else 'o',
-                "node_shape": 'o',
-                "with_labels": True,
-                'node_size': 10000,
-                "width": 5,
-                'linewidths': 1.5,
-                'font_size': 22,
-                'font_color': 'white'
-            }
-            draw_networkx(G, positions, **options)
-            ax = plt.gca()
-            ax.margins(0.20)
-            plt.axis("on")
-            ax.set_axisbelow(True)
-    plt.show()
-    PATH = list(nx.all_simple_paths(G, source=sender_list[0], target=receiver_list[0]))
+    sender, receiver = endpoints(graph)
+    PATH = shortest_paths(graph, sender, receiver, k, weight, qber)
     min_len = min([len(p) for p in PATH])
     OPT_PATH = [p for p in PATH if len(p) == min_len]
     return PATH, OPT_PATH
 
 
-def run_path(path, graph, msg, key_size):
+# With a started KeyPool of the path, the message relay draws the keys from the pool.
+# With a NetworkSession, the hosts of the session are reused instead of building and stopping a new network.
+# Otherwise the network is built with the fiber channel and the attacks of the spiers, if any.
+# Return the PathResult of qkd_report with the decrypted message.
+def run_path(path, graph, msg, key_size, engine='qunetsim', pool=None, session=None, channel=None, attacks=None):
     # Excluded all spiers in the path.
     path_no_spiers = [n for n in path if graph[n][0][0] != 'spier']
+    # Results of the links and the decrypted message, filled by the receiving end of every link
+    results = {}
+    start = time.perf_counter()
 
-    host_name_dic, network = connect(graph)
-    # Draws out the classical_network graph
-    # network.draw_classical_network()
-
-    # Initialize a thread list
-    Th_lst = [_ for _ in range(len(path_no_spiers))]
-    # Eavesdropper detection using a counter
-
-    for i in range(len(path_no_spiers)):
-        n = path_no_spiers[i]
-        name = graph[n][0][0]
-        if name == 'sender':
-            # Generate random key
-            secret_key = np.random.randint(2, size=key_size)
-            sender = host_name_dic[n]
-            Th_lst[i] = sender.run_protocol(send_node,
-                                            arguments=(msg, secret_key, host_name_dic[path_no_spiers[i + 1]]))
-        elif name == 'receiver':
-            receiver = host_name_dic[n]
-            Th_lst[i] = receiver.run_protocol(recv_node, arguments=(key_size, host_name_dic[path_no_spiers[i - 1]]))
-        elif name == 'truster':
-            # Generate random key
-            secret_key = np.random.randint(2, size=key_size)
-            truster = host_name_dic[n]
-            Th_lst[i] = truster.run_protocol(trusted_node, arguments=(host_name_dic[path_no_spiers[i - 1]],
-                                                                      host_name_dic[path_no_spiers[i + 1]],
-                                                                      key_size, secret_key))
+    with span('path', path[0], path[-1]):
+        if session is None:
+            host_name_dic, network = connect(graph, channel, attacks)
         else:
-            raise ValueError
-
-    for t in Th_lst:  # join all Threads
-        t.join()
-    network.stop(True)
+            host_name_dic = session.host_name_dic
+        # Draws out the classical_network graph
+        # network.draw_classical_network()
+
+        # Initialize a thread list
+        Th_lst = [_ for _ in range(len(path_no_spiers))]
+        # Eavesdropper detection using a counter
+
+        for i in range(len(path_no_spiers)):
+            n = path_no_spiers[i]
+            name = graph[n][0][0]
+            if name == 'sender':
+                # Generate random key
+                secret_key = Key.random(key_size)
+                sender = host_name_dic[n]
+                Th_lst[i] = sender.run_protocol(send_node,
+                                                arguments=(msg, secret_key, host_name_dic[path_no_spiers[i + 1]],
+                                                           engine, pool))
+            elif name == 'receiver':
+                receiver = host_name_dic[n]
+                Th_lst[i] = receiver.run_protocol(recv_node, arguments=(key_size, host_name_dic[path_no_spiers[i - 1]],
+                                                                        engine, pool, results))
+            elif name == 'truster':
+                # Generate random key
+                secret_key = Key.random(key_size)
+                truster = host_name_dic[n]
+                Th_lst[i] = truster.run_protocol(trusted_node, arguments=(host_name_dic[path_no_spiers[i - 1]],
+                                                                          host_name_dic[path_no_spiers[i + 1]],
+                                                                          key_size, secret_key, engine, pool, results))
+            else:
+                raise ValueError
+
+        for t in Th_lst:  # join all Threads
+            t.join()
+    wall_time = time.perf_counter() - start
+    if session is None:
+        network.stop(True)
+    else:
+        session.reset()
+        session.runs += 1
     # exit()
+    links = [results[link] for link in zip(path_no_spiers, path_no_spiers[1:]) if link in results]
+    return PathResult(path, links, results.get('message'), wall_time)
@@ -25,17 +25,20 @@
     between Alice, Bob, and Eve.
 """
 
-from qunetsim.objects import Logger
 
-import random
-from qkd.qkd_BB84 import send_bb84, receive_bb84
+import threading
+from qkd.qkd_BB84 import send_bb84, receive_bb84, MIN_SECRET_BITS
 from qkd.qkd_crypto import encrypt_msg, decrypt_msg, send_msg, recv_msg
-Logger.DISABLED = True
+from qkd.qkd_metrics import span
 
 wait_time = 10
 qkd_key_length = 13
 ERROR_RATE = 10
 
+# Trusted nodes establish the keys with both neighbours at once, ahead of the message.
+# Otherwise the key with the next node waits for the message, and the latency grows with every hop exchange.
+CONCURRENT_KEYS = True
+
 EAVESDROPPER_NUMBER = 1
 # Eve randomly choose a number from [0, 1, ..., 9].
 # If the randomly chosen number is larger than 'EAVESDROPPER_NUMBER', Eve performs X gate.
@@ -52,83 +55,124 @@ CGREEN2 = '\33[92m'
 
 
 # Send keys between nodes
-def send_node(sender, msg, secret_key, receiver):
+# With a key pool, the nodes draw already distilled key of the link instead of running BB84
+def send_node(sender, msg, secret_key, receiver, engine='qunetsim', pool=None):
     print(str(sender.host_id) + " encrypts the message: " + msg)
     print()
-    send_key, eves = send_bb84(sender, secret_key, receiver.host_id)
+    with span('node.key', sender, receiver):
+        if pool is None:
+            send_key = send_bb84(sender, secret_key, receiver.host_id, engine).key
+        else:
+            send_key = pool.draw(sender.host_id, receiver.host_id, qkd_key_length)
     # if eves > 0:
     #     raise KeyError
     # else:
-    encrypted_msg = encrypt_msg(send_key, msg)
-    send_msg(sender, encrypted_msg, receiver.host_id)
-
-
-# Receive keys between nodes
-def recv_node(receiver, key_size, sender):
-    recv_key, eves = receive_bb84(receiver, key_size, sender.host_id)
+    with span('node.encrypt', sender, receiver):
+        # The message is dropped on a link without secret key, see report_short_key in qkd_BB84
+        encrypted_msg = encrypt_msg(send_key, msg) if len(send_key) >= MIN_SECRET_BITS else None
+    with span('node.relay', sender, receiver):
+        send_msg(sender, encrypted_msg, receiver.host_id)
+
+
+# Receive keys between nodes. With 'results', the LinkResult of the link and the decrypted message are put in it
+# under the ids of the link and under 'message', None if a link of the relay dropped the message.
+def recv_node(receiver, key_size, sender, engine='qunetsim', pool=None, results=None):
+    with span('node.key', receiver, sender):
+        if pool is None:
+            result = receive_bb84(receiver, key_size, sender.host_id, engine)
+            recv_key = result.key
+            if results is not None:
+                results[(sender.host_id, receiver.host_id)] = result
+        else:
+            recv_key = pool.draw(receiver.host_id, sender.host_id, qkd_key_length)
     # if eves > 0:
     #     raise KeyError
     # else:
-    encrypted_msg = recv_msg(receiver, sender.host_id)
-    decrypted_msg = decrypt_msg(recv_key, encrypted_msg)
-    print(str(receiver.host_id) + " decrypts the message: " + decrypted_msg)
+    with span('node.relay', receiver, sender):
+        encrypted_msg = recv_msg(receiver, sender.host_id)
+    if encrypted_msg is None:
+        decrypted_msg = None
+    else:
+        with span('node.decrypt', receiver, sender):
+            decrypted_msg = decrypt_msg(recv_key, encrypted_msg)
+        print(str(receiver.host_id) + " decrypts the message: " + decrypted_msg)
+    if results is not None:
+        results['message'] = decrypted_msg
+
+
+# Run a function in a thread, the returned function joins it and returns the result or raises the error
+def _start(function, *args):
+    outcome = {}
+
+    def target():
+        try:
+            outcome['result'] = function(*args)
+        except BaseException as error:
+            outcome['error'] = error
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+
+    def join():
+        thread.join()
+        if 'error' in outcome:
+            raise outcome['error']
+        return outcome['result']
+    return join
+
+
+# Key with the next node, see 'trusted_node'
+def _next_key(trusted_node, next_node, secret_key, engine, pool):
+    with span('node.key', trusted_node, next_node):
+        if pool is None:
+            next_key = send_bb84(trusted_node, secret_key, next_node.host_id, engine).key
+        else:
+            next_key = pool.draw(trusted_node.host_id, next_node.host_id, qkd_key_length)
+    return next_key
+
+
+# Code for trusted node, works for any number. With 'results', the LinkResult of the link to the previous node is
+# put in it, see 'recv_node'.
+def trusted_node(trusted_node, prev_node, next_node, key_size, secret_key, engine='qunetsim', pool=None,
+                 results=None):
+    if CONCURRENT_KEYS:
+        # Build the QKD protocol with the next node while the one with the previous node runs
+        next_exchange = _start(_next_key, trusted_node, next_node, secret_key, engine, pool)
 
-
-# Code for trusted node, works for any number
-def trusted_node(trusted_node, prev_node, next_node, key_size, secret_key):
     # Build the QKD protocol with the previous node and obtain the private key, then receive encrypted message
-    prev_key, eves = receive_bb84(trusted_node, key_size, prev_node.host_id)
+    with span('node.key', trusted_node, prev_node):
+        if pool is None:
+            result = receive_bb84(trusted_node, key_size, prev_node.host_id, engine)
+            prev_key = result.key
+            if results is not None:
+                results[(prev_node.host_id, trusted_node.host_id)] = result
+        else:
+            prev_key = pool.draw(trusted_node.host_id, prev_node.host_id, qkd_key_length)
     # if eves > 0:
     #     raise KeyError
     # else:
-    msg = recv_msg(trusted_node, prev_node.host_id)
-
-    # Build the QKD protocol with the next node and obtain the private key
-    next_key, eves = send_bb84(trusted_node, secret_key, next_node.host_id)
+    with span('node.relay', trusted_node, prev_node):
+        msg = recv_msg(trusted_node, prev_node.host_id)
+
+    # Obtain the private key of the next node
+    if CONCURRENT_KEYS:
+        next_key = next_exchange()
+    else:
+        next_key = _next_key(trusted_node, next_node, secret_key, engine, pool)
     # if eves > 0:
     #     raise KeyError
     # else:
-    # Use the previous QKD key and the next QKD key to construct the new key by: ord(K12) = ord(K2) ^ ord(K1)
-    new_key = [(prev_key[j] + next_key[j]) % 2 for j in range(min([len(prev_key), len(next_key)]))]
-
-    # Encrypt the message with the new key and send the message to the next node
-    msg = encrypt_msg(new_key, msg)
-    send_msg(trusted_node, msg, next_node.host_id)
+    with span('node.encrypt', trusted_node, next_node):
+        # Use the previous QKD key and the next QKD key to construct the new key by: ord(K12) = ord(K2) ^ ord(K1)
+        new_length = min([len(prev_key), len(next_key)])
+        new_key = prev_key[:new_length] ^ next_key[:new_length]
 
+        # Encrypt the message with the new key and send the message to the next node, a dropped message or a link
+        # without secret key drops it
+        msg = encrypt_msg(new_key, msg) if msg is not None and new_length >= MIN_SECRET_BITS else None
+    with span('node.relay', trusted_node, next_node):
+        send_msg(trusted_node, msg, next_node.host_id)
 
-# Spy Function for eavesdropping on BB84_main communication
-# def spy_node(spy_node, sender, receiver, key_size):
-#     basis = []  # Measurement basis record
-#     key = []  # Raw key
-#     count = 0  # Count of bits received
-#
-#     while count < key_size:
-#         # Receive qubit from the sender
-#         base = random.randint(0, 1)  # choose a random measurement base
-#         basis.append(base)  # save the measurement basis
-#         q_bit = spy_node.get_qubit(sender, wait=wait_time)  # wait for the qubit
-#
-#         if base: q_bit.H()  # apply Hadamard if base is X
-#         bit = q_bit.measure()  # measure the qubit
-#         key.append(bit)  # save the full raw key
-#
-#         # Send qubit to receiver
-#         # base = random.randint(0, 1)  # choose a random basis 0 = Z basis, 1 = X basis
-#         q_bit = Qubit(spy_node)  # create qubit
-#
-#         if bit: q_bit.X()  # qubit flip operation if bit = 1
-#         if base: q_bit.H()  # Apply basis change if necessary
-#
-#         spy_node.send_qubit(receiver, q_bit, await_ack=False)  # Send Qubit to Bob
-#         count += 1
-
-# Spy Function using the sniffing method
-# Code for Eavesdropper sniffing
-def sniffing_quantum(sender, receiver, qubit):
-    # Spy applies an X operation to all qubits that are routed through him.
-    a = random.randint(0, 9)
-    if a > EAVESDROPPER_NUMBER:
-        qubit.X()
 
 def sniffing_classical(sender, receiver, msg):
     # Bob modifies the message content of all classical messages routed through him
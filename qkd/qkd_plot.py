@@ -0,0 +1,80 @@
+########################################################################################################################
+# Copyright (c) Xiufan Li. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Author: Xiufan Li
+# Supervisor: Patrick Rebentrost
+# Institution: Centre for Quantum Technologies, National University of Singapore
+# For feedback, please contact Xiufan at: shenlongtianwu8@gmail.com.
+########################################################################################################################
+
+# !/usr/bin/env python3
+
+"""
+    Optional renderer of QKD network topologies. Matplotlib and networkx are imported only when drawing.
+"""
+
+import threading
+
+ROLE_COLORS = {'sender': 'red', 'truster': 'blue', 'spier': 'gray', 'receiver': 'green'}
+XLABEL = "Sender (RED)     Receiver (GREEN)     Trusted Nodes (BLUE)     SPY Nodes (GRAY)"
+
+
+def _draw(ax, graph):
+    import networkx as nx
+
+    G = nx.Graph()
+    G.add_nodes_from(list(graph.keys()))
+    G.add_edges_from([(n, v) for n in graph for v in graph[n][2]])
+    positions = {n: (graph[n][1][0], graph[n][1][1]) for n in graph}
+    nodes = list(graph.keys())
+
+    ax.set_title("QKE Networks Topology", fontsize=22)
+    ax.set_xlabel(XLABEL, fontsize=22)
+    # All nodes in one call, colored by role
+    nx.draw_networkx(G, positions, ax=ax, nodelist=nodes,
+                     node_color=[ROLE_COLORS.get(graph[n][0][0], 'black') for n in nodes],
+                     node_shape='o', with_labels=True, node_size=10000, width=5, linewidths=1.5,
+                     font_size=22, font_color='white')
+    ax.margins(0.20)
+    ax.axis("on")
+    ax.set_axisbelow(True)
+
+
+# Write the topology to an image file, without pyplot so that it is safe off the main thread
+def save_topology(graph, filename, figsize=(24, 18)):
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    _draw(fig.add_subplot(), graph)
+    fig.savefig(filename)
+
+
+# Draw the topology: to a file (in a background thread if asked, the thread is returned) and/or in a window
+def draw_topology(graph, filename=None, show=False, background=False):
+    thread = None
+    if filename is not None:
+        if background:
+            thread = threading.Thread(target=save_topology, args=(graph, filename), daemon=True)
+            thread.start()
+        else:
+            save_topology(graph, filename)
+    if show:
+        import matplotlib.pyplot as plt
+
+        plt.figure()
+        _draw(plt.gca(), graph)
+        plt.show()
+    return thread
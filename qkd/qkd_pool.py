@@ -0,0 +1,234 @@
+########################################################################################################################
+# Copyright (c) Xiufan Li. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Author: Xiufan Li
+# Supervisor: Patrick Rebentrost
+# Institution: Centre for Quantum Technologies, National University of Singapore
+# For feedback, please contact Xiufan at: shenlongtianwu8@gmail.com.
+########################################################################################################################
+
+# !/usr/bin/env python3
+
+"""
+    Per-link key pool. Background threads run the vectorized BB84/B92 engines between adjacent nodes of a path
+    and keep the distilled key of every link between a low and a high watermark, so that the message relay only
+    draws key that is already there.
+"""
+
+import threading
+import time
+
+from qkd.qkd_key import Key
+from qkd.qkd_BB84 import bb84_exchange, ERROR_RATE
+from qkd.qkd_B92 import b92_exchange
+from qkd.qkd_cascade import cascade, confirm, TAG_BITS
+from qkd.qkd_privacy import amplify
+from qkd.qkd_attack import spier_attacks
+
+PROTOCOLS = ['bb84', 'b92']
+
+LOW_WATERMARK = 1 << 12         # Refill a link when it holds fewer key bits
+HIGH_WATERMARK = 1 << 16        # and stop refilling when it holds this many key bits
+BATCH_SIZE = 1 << 14            # Raw qubits per exchange
+
+
+# Links between the consecutive non-spier nodes of a path, with the spiers in between
+def path_spiers(graph, path):
+    links = []
+    spiers = []
+    prev = None
+    for n in path:
+        if graph[n][0][0] == 'spier':
+            spiers.append(n)
+            continue
+        if prev is not None:
+            links.append((prev, n, spiers))
+        prev = n
+        spiers = []
+    return links
+
+
+# Links between the consecutive non-spier nodes of a path, with the number of spiers in between
+def path_links(graph, path):
+    return [(sender, receiver, len(spiers)) for sender, receiver, spiers in path_spiers(graph, path)]
+
+
+class KeyBuffer:
+    """
+        Distilled key of the link between 'sender' and 'receiver'. Each end consumes its own copy of the key
+        in the same order, so both ends draw the same bits without talking to each other.
+    """
+
+    def __init__(self, sender, receiver, low=LOW_WATERMARK, high=HIGH_WATERMARK):
+        if not 0 <= low <= high:
+            raise ValueError("Watermarks need 0 <= low <= high.")
+        self.sender = sender
+        self.receiver = receiver
+        self.low = low
+        self.high = high
+        self._keys = [Key(), Key()]         # Key of the sender end and of the receiver end
+        self._used = [0, 0]                 # Bits consumed by each end
+        self._wanted = [0, 0]               # Bits each end is waiting for
+        self._cond = threading.Condition()
+        self.generated = 0                  # Distilled bits put into the buffer
+        self.discarded = 0                  # Exchanges thrown away because of an Eavesdropper
+        self.leaked = 0                     # Parities revealed by the error correction
+        self.busy_time = 0.0                # Seconds spent generating key
+
+    def _end(self, host_id):
+        if host_id == self.sender:
+            return 0
+        if host_id == self.receiver:
+            return 1
+        raise KeyError(str(host_id) + " is not an end of the link " + self.sender + " - " + self.receiver + ".")
+
+    # Bits that both ends can still draw
+    @property
+    def level(self):
+        with self._cond:
+            return len(self._keys[0]) - max(self._used)
+
+    def put(self, sender_key, receiver_key):
+        with self._cond:
+            # Drop the bytes that both ends have consumed
+            cut = min(self._used) // 8 * 8
+            self._keys = [self._keys[0][cut:] + sender_key, self._keys[1][cut:] + receiver_key]
+            self._used = [u - cut for u in self._used]
+            self.generated += len(sender_key)
+            self._cond.notify_all()
+
+    # Draw the next 'size' bits for the end 'host_id', waiting until the key is there
+    def draw(self, host_id, size, timeout=None):
+        if size > self.high:
+            raise ValueError("Cannot draw " + str(size) + " bits from a buffer with high watermark " +
+                             str(self.high) + ".")
+        end = self._end(host_id)
+        with self._cond:
+            # A draw above the level wakes the refill even if the level is not below the low watermark
+            self._wanted[end] = size
+            self._cond.notify_all()
+            ready = self._cond.wait_for(lambda: len(self._keys[end]) - self._used[end] >= size, timeout)
+            self._wanted[end] = 0
+            if not ready:
+                raise TimeoutError("No " + str(size) + " key bits on the link " + self.sender + " - " +
+                                   self.receiver + " after " + str(timeout) + " s.")
+            key = self._keys[end][self._used[end]:self._used[end] + size]
+            self._used[end] += size
+            self._cond.notify_all()
+            return key
+
+    # Block until the buffer falls below the low watermark or an end waits for more than it holds,
+    # return False on timeout
+    def wait_refill(self, timeout=None):
+        def needed():
+            return (len(self._keys[0]) - max(self._used) < self.low or
+                    any(len(self._keys[end]) - self._used[end] < self._wanted[end] for end in (0, 1)))
+
+        with self._cond:
+            return self._cond.wait_for(needed, timeout)
+
+    def metrics(self):
+        level = self.level
+        return {'level': level,
+                'fill': level / self.high if self.high else 1.0,
+                'generated': self.generated,
+                'discarded': self.discarded,
+                'leaked': self.leaked,
+                'refill_rate': self.generated / self.busy_time if self.busy_time else 0.0}
+
+
+class KeyPool:
+    """
+        Key buffers of all links of a path, filled by one background thread per link.
+        With a FiberChannel of qkd_channel, the BB84 exchanges go through the fiber of every link.
+        'attacks' maps spiers to their attack, see qkd_attack, the other spiers flip bits.
+    """
+
+    def __init__(self, graph, path, protocol='bb84', low=LOW_WATERMARK, high=HIGH_WATERMARK, batch_size=BATCH_SIZE,
+                 channel=None, attacks=None):
+        if protocol not in PROTOCOLS:
+            raise ValueError("Unknown protocol '" + str(protocol) + "', choose from " + str(PROTOCOLS) + ".")
+        self.protocol = protocol
+        self.batch_size = batch_size
+        self._buffers = {}
+        self._attacks = {}
+        self._fibers = {}
+        for sender, receiver, spiers in path_spiers(graph, path):
+            self._buffers[frozenset((sender, receiver))] = KeyBuffer(sender, receiver, low, high)
+            self._attacks[frozenset((sender, receiver))] = spier_attacks(spiers, attacks)
+            # The fiber of the link for BB84, see qkd_channel
+            self._fibers[frozenset((sender, receiver))] = None if channel is None else channel.link(sender, receiver)
+        self._stop = threading.Event()
+        self._threads = []
+
+    def buffer(self, host_id, peer_id):
+        return self._buffers[frozenset((host_id, peer_id))]
+
+    # Draw the next 'size' key bits of the link to 'peer_id' for the end 'host_id'
+    def draw(self, host_id, peer_id, size, timeout=None):
+        return self.buffer(host_id, peer_id).draw(host_id, size, timeout)
+
+    # One exchange on a link, returns the keys of both ends and the error rate
+    def exchange(self, link):
+        if self.protocol == 'b92':
+            return b92_exchange(self.batch_size, attacks=self._attacks[link])
+        return bb84_exchange(self.batch_size, link=self._fibers[link], attacks=self._attacks[link])
+
+    def _refill(self, link):
+        buffer = self._buffers[link]
+        while not self._stop.is_set():
+            if not buffer.wait_refill(timeout=0.1):
+                continue
+            while buffer.level < buffer.high and not self._stop.is_set():
+                start = time.perf_counter()
+                sender_key, receiver_key, error_rate = self.exchange(link)
+                confirmed = False
+                if error_rate < ERROR_RATE:
+                    # Correct the receiver key, the batch is dropped unless both keys are confirmed equal
+                    receiver_key, leaked, rounds = cascade(sender_key, receiver_key, error_rate / 100)
+                    confirmed = confirm(sender_key, receiver_key)
+                    leaked += TAG_BITS
+                if confirmed:
+                    # Both ends buffer the same secret key once both are compressed
+                    sender_key, receiver_key = amplify(sender_key, receiver_key, error_rate / 100, leaked)
+                    buffer.leaked += leaked
+                    buffer.busy_time += time.perf_counter() - start
+                    buffer.put(sender_key, receiver_key)
+                else:
+                    buffer.busy_time += time.perf_counter() - start
+                    buffer.discarded += 1
+
+    def start(self):
+        self._stop.clear()
+        for link in self._buffers:
+            thread = threading.Thread(target=self._refill, args=(link,), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # Fill level and refill rate of every link
+    def metrics(self):
+        return {(b.sender, b.receiver): b.metrics() for b in self._buffers.values()}
@@ -0,0 +1,131 @@
+########################################################################################################################
+# Copyright (c) Xiufan Li. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Author: Xiufan Li
+# Supervisor: Patrick Rebentrost
+# Institution: Centre for Quantum Technologies, National University of Singapore
+# For feedback, please contact Xiufan at: shenlongtianwu8@gmail.com.
+########################################################################################################################
+
+# !/usr/bin/env python3
+
+"""
+    Privacy amplification of a reconciled key by Toeplitz hashing.
+
+    The m x n Toeplitz matrix T[i, j] = t[i - j + n - 1] is given by m + n - 1 random bits t drawn from a seed, so
+    the sender only sends the seed and the output length m to the receiver. T x is the middle of the convolution of
+    t and x, computed with real FFTs over blocks of the key small enough for the float64 sums to stay exact.
+    The middle of a linear convolution is also the middle of the circular one as long as the FFT is as long as t,
+    so no zero padding is needed.
+
+    The output length removes from the n reconciled bits what an eavesdropper may know: n h(QBER) bits for the
+    errors, the parities leaked by the error correction, and 2 log2(1 / EPSILON) bits of security margin.
+"""
+
+import math
+
+import numpy as np
+
+from qkd.qkd_key import Key
+from qkd.qkd_wire import encode_seed, decode_seed, run_steps
+from qkd.qkd_metrics import count, count_message
+
+EPSILON = 1e-3              # Distance of the final key from a uniform key unknown to an eavesdropper
+BLOCK = 1 << 20             # Key bits per FFT convolution
+
+
+# Binary entropy
+def entropy(p):
+    if p <= 0 or p >= 1:
+        return 0.0
+    return -p * math.log2(p) - (1 - p) * math.log2(1 - p)
+
+
+# Length of the secret key from n reconciled bits, the QBER is a fraction
+def secret_length(n, qber, leaked, epsilon=EPSILON):
+    if qber >= 0.5:
+        return 0
+    return max(0, int(math.floor(n * (1 - entropy(qber)) - leaked - 2 * math.log2(1 / epsilon))))
+
+
+# Smallest 5-smooth number not below n, a fast FFT length
+def fast_length(n):
+    best = 1 << max(0, (n - 1).bit_length())
+    p5 = 1
+    while p5 < best:
+        p35 = p5
+        while p35 < best:
+            p = p35
+            while p < n:
+                p *= 2
+            best = min(best, p)
+            p35 *= 3
+        p5 *= 5
+    return best
+
+
+# Random bits of the Toeplitz matrix
+def toeplitz_bits(seed, rows, columns):
+    size = rows + columns - 1
+    return np.unpackbits(np.random.default_rng(seed).integers(0, 256, size=(size + 7) // 8, dtype=np.uint8),
+                         count=size)
+
+
+# Multiply the key by the Toeplitz matrix of the seed, the result has 'length' bits
+def toeplitz_hash(key, seed, length):
+    bits = Key(key).bits()
+    n = len(bits)
+    if length == 0 or n == 0:
+        return Key()
+    t = toeplitz_bits(seed, length, n).astype(np.float64)
+    result = np.zeros(length, dtype=np.int64)
+    for a in range(0, n, BLOCK):
+        b = min(n, a + BLOCK)
+        size = b - a
+        segment = t[n - b:n - b + length + size - 1]
+        fft_size = fast_length(len(segment))
+        product = np.fft.rfft(segment, fft_size) * np.fft.rfft(bits[a:b].astype(np.float64), fft_size)
+        result ^= np.rint(np.fft.irfft(product, fft_size)[size - 1:size - 1 + length]).astype(np.int64) & 1
+    return Key(result)
+
+
+# Compress both keys without hosts, return the secret keys
+def amplify(sender_key, key, qber, leaked, seed=None, epsilon=EPSILON):
+    seed = int(np.random.randint(0, 2 ** 62)) if seed is None else seed
+    length = secret_length(len(key), qber, leaked, epsilon)
+    return toeplitz_hash(sender_key, seed, length), toeplitz_hash(key, seed, length)
+
+
+# Sender side over the classical channel: choose the seed and the length, send them and compress the key
+def amplify_send(host, peer, key, qber, leaked, epsilon=EPSILON):
+    seed = int(np.random.randint(0, 2 ** 62))
+    length = secret_length(len(key), qber, leaked, epsilon)
+    frame = encode_seed(seed, length)
+    host.send_classical(peer, frame, await_ack=False)
+    count_message(host, peer, frame)
+    count('secret_bits', length, host, peer)
+    return toeplitz_hash(key, seed, length)
+
+
+# Receiver side over the classical channel as steps, see 'run_steps' in qkd_wire: compress the key with the seed
+# and the length of the sender
+def amplify_receive_steps(host, peer, key):
+    seed, length = decode_seed((yield peer))
+    count('secret_bits', length, host, peer)
+    return toeplitz_hash(key, seed, length)
+
+
+# Receiver side on a thread host
+def amplify_receive(host, peer, key, wait_time):
+    return run_steps(host, amplify_receive_steps(host, peer, key), wait_time)
@@ -25,31 +25,32 @@
 """
 
 
-from qunetsim.objects import Logger
-Logger.DISABLED = True
+from qkd.qkd_network import get_opt_path, NetworkSession
 
-from qkd.qkd_network import get_opt_path, run_path
-def QKD(graph, msg, key_size):
+# The engine is 'qunetsim' (one Qubit object per key bit) or 'numpy' (vectorized), see ENGINES in qkd_BB84.
+# QKD is headless unless 'plot' is set, then the topology is shown before the paths run.
+# A FiberChannel of qkd_channel models the fibers of the links for the 'numpy' engine, and 'attacks' maps spiers
+# to their attack of qkd_attack. Return the PathResults of the paths, see qkd_report.
+def QKD(graph, msg, key_size, engine='qunetsim', plot=False, channel=None, attacks=None):
 
     # Get all paths and the optimal path from sender to receiver
-    PATH, OPT_PATH = get_opt_path(graph)
+    PATH, OPT_PATH = get_opt_path(graph, plot=plot)
 
-    # Run protocol with a path
-    # EAVES_DETECTOR = 0
-    path = OPT_PATH[0]
-
-    run_path(path, graph, msg, key_size)
-
-    OPT_PATH = [i for i in OPT_PATH if i != path]
-    PATH = [i for i in PATH if i != path]
-    if OPT_PATH:
+    # Build the hosts once for both paths
+    with NetworkSession(graph, channel, attacks) as session:
+        # Run protocol with a path
+        # EAVES_DETECTOR = 0
         path = OPT_PATH[0]
-        run_path(path, graph, msg, key_size)
-    else:
-        if PATH:
-            path = PATH[0]
-            run_path(path, graph, msg, key_size)
-
-
-
 
+        results = [session.run_path(path, msg, key_size, engine)]
+
+        OPT_PATH = [i for i in OPT_PATH if i != path]
+        PATH = [i for i in PATH if i != path]
+        if OPT_PATH:
+            path = OPT_PATH[0]
+            results.append(session.run_path(path, msg, key_size, engine))
+        else:
+            if PATH:
+                path = PATH[0]
+                results.append(session.run_path(path, msg, key_size, engine))
+    return results
@@ -0,0 +1,178 @@
+########################################################################################################################
+# Copyright (c) Xiufan Li. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Author: Xiufan Li
+# Supervisor: Patrick Rebentrost
+# Institution: Centre for Quantum Technologies, National University of Singapore
+# For feedback, please contact Xiufan at: shenlongtianwu8@gmail.com.
+########################################################################################################################
+
+# !/usr/bin/env python3
+"""
+    Structured results of the key exchanges and the paths, with their secret key throughput.
+
+    Every run of send_bb84/receive_bb84 (qkd_BB84 and qkd_async) and send_qkd/receive_qkd (qkd_B92) returns a
+    LinkResult for its end of the link: the raw qubits, the sifted bits, the estimated QBER, the secret bits after
+    privacy amplification, the time of the exchange and the derived rates. 'run_path' returns a PathResult with the
+    result of every link, and the rate of the path is the rate of its bottleneck link. Example:
+
+        results = [session.run_path(path, msg, key_size, 'numpy') for _ in range(10)]
+        print(format_summary(summarize(results)))
+"""
+
+import numpy as np
+
+
+class LinkResult:
+    """
+        One key exchange seen from the end 'host' of the link to 'peer'. 'key' is the key used by the protocol,
+        'secret_bits' the length of the distilled key before it is cut to that key, 0 for an unsafe link.
+        'qber' is in percent, 'wall_time' in seconds (on the virtual clock for SimNetwork of qkd_des).
+        It unpacks to the (key, eves) tuple that send_bb84 and receive_bb84 used to return.
+    """
+
+    def __init__(self, host, peer, protocol, key, qubits, sifted_bits, qber, secret_bits, wall_time, eves=0,
+                 detected=None):
+        self.host = host
+        self.peer = peer
+        self.protocol = protocol
+        self.key = key
+        self.qubits = qubits                                    # Raw qubits sent
+        self.detected = qubits if detected is None else detected   # Qubits the receiver detected
+        self.sifted_bits = sifted_bits
+        self.qber = qber
+        self.secret_bits = secret_bits
+        self.wall_time = wall_time
+        self.eves = eves
+
+    @property
+    def sifted_rate(self):
+        return self.sifted_bits / self.wall_time if self.wall_time > 0 else 0.0
+
+    @property
+    def secret_rate(self):
+        return self.secret_bits / self.wall_time if self.wall_time > 0 else 0.0
+
+    def as_dict(self):
+        return {'link': (self.host, self.peer),
+                'protocol': self.protocol,
+                'qubits': self.qubits,
+                'detected': self.detected,
+                'sifted_bits': self.sifted_bits,
+                'qber': self.qber,
+                'secret_bits': self.secret_bits,
+                'wall_time': self.wall_time,
+                'sifted_rate': self.sifted_rate,
+                'secret_rate': self.secret_rate,
+                'eves': self.eves}
+
+    # key, eves = link
+    def __iter__(self):
+        return iter((self.key, self.eves))
+
+    def __repr__(self):
+        return ('LinkResult(' + str(self.host) + ' - ' + str(self.peer) + ', ' + str(self.secret_bits) +
+                ' secret bits at ' + '%.4g' % self.secret_rate + ' bit/s)')
+
+
+class PathResult:
+    """
+        One run of a path: the LinkResult of every link, in the order of the path, the decrypted message and the
+        time of the whole run. With a key pool, the links run no exchange and 'links' is empty.
+    """
+
+    def __init__(self, path, links, message=None, wall_time=0.0):
+        self.path = list(path)
+        self.links = list(links)
+        self.message = message
+        self.wall_time = wall_time
+
+    # Rate of the path, the secret key rate of its bottleneck link
+    @property
+    def secret_rate(self):
+        return min((link.secret_rate for link in self.links), default=0.0)
+
+    @property
+    def sifted_rate(self):
+        return min((link.sifted_rate for link in self.links), default=0.0)
+
+    @property
+    def sifted_bits(self):
+        return min((link.sifted_bits for link in self.links), default=0)
+
+    # Secret bits the path can relay, those of its shortest link key
+    @property
+    def secret_bits(self):
+        return min((link.secret_bits for link in self.links), default=0)
+
+    @property
+    def qber(self):
+        return max((link.qber for link in self.links), default=0.0)
+
+    @property
+    def eves(self):
+        return sum(link.eves for link in self.links)
+
+    # The link that bounds the rate of the path
+    @property
+    def bottleneck(self):
+        return min(self.links, key=lambda link: link.secret_rate, default=None)
+
+    def as_dict(self):
+        return {'path': self.path,
+                'links': [link.as_dict() for link in self.links],
+                'qber': self.qber,
+                'sifted_bits': self.sifted_bits,
+                'secret_bits': self.secret_bits,
+                'wall_time': self.wall_time,
+                'sifted_rate': self.sifted_rate,
+                'secret_rate': self.secret_rate,
+                'eves': self.eves}
+
+    def __repr__(self):
+        return 'PathResult(' + ' - '.join(map(str, self.path)) + ', ' + '%.4g' % self.secret_rate + ' bit/s)'
+
+
+SUMMARY = ['qber', 'sifted_bits', 'secret_bits', 'wall_time', 'sifted_rate', 'secret_rate']
+
+
+# Aggregate repeated runs, one row per link for LinkResults and per path for PathResults, with the mean and the
+# standard deviation of every figure of SUMMARY and the number of runs where an eavesdropper was detected
+def summarize(results):
+    groups = {}
+    for result in results:
+        if isinstance(result, PathResult):
+            key = ('path', tuple(result.path))
+        else:
+            key = ('link', (result.host, result.peer))
+        groups.setdefault(key, []).append(result)
+    rows = []
+    for (kind, name), runs in groups.items():
+        row = {kind: name, 'runs': len(runs), 'detected': sum(1 for r in runs if r.eves)}
+        for figure in SUMMARY:
+            values = [getattr(r, figure) for r in runs]
+            row[figure] = float(np.mean(values))
+            row[figure + '_std'] = float(np.std(values))
+        rows.append(row)
+    return rows
+
+
+def format_summary(rows):
+    columns = ['runs', 'detected'] + SUMMARY
+    cells = [['link / path'] + columns]
+    for row in rows:
+        name = ' - '.join(map(str, row.get('path', row.get('link'))))
+        cells.append([name] + [('%.4g' % row[c]) if isinstance(row[c], float) else str(row[c]) for c in columns])
+    widths = [max(len(row[j]) for row in cells) for j in range(len(cells[0]))]
+    return '\n'.join('  '.join(cell.rjust(w) for cell, w in zip(row, widths)) for row in cells)
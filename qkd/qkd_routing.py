@@ -0,0 +1,160 @@
+########################################################################################################################
+# Copyright (c) Xiufan Li. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Author: Xiufan Li
+# Supervisor: Patrick Rebentrost
+# Institution: Centre for Quantum Technologies, National University of Singapore
+# For feedback, please contact Xiufan at: shenlongtianwu8@gmail.com.
+########################################################################################################################
+
+# !/usr/bin/env python3
+
+"""
+    Routing in QKD networks: k-shortest loopless paths (Yen's algorithm) between the sender and the receiver,
+    generated lazily and cached per topology version and endpoints.
+
+    The links of a graph are undirected, a node 'n' is at longitude graph[n][1][0] and latitude graph[n][1][1].
+    Paths are weighted by the number of hops ('hop'), the geographic distance in km ('distance'), or the number
+    of hops penalized by the observed QBER in percent of every link ('qber').
+"""
+
+import heapq
+import math
+import threading
+
+WEIGHTS = ['hop', 'distance', 'qber']
+K_PATHS = 8                 # Number of paths returned by default
+EARTH_RADIUS = 6371.0       # km
+
+_CACHE = {}
+_CACHE_LOCK = threading.Lock()
+
+
+# Great-circle distance in km between two [longitude, latitude] positions
+def haversine(pos_u, pos_v):
+    lon_u, lat_u, lon_v, lat_v = map(math.radians, [pos_u[0], pos_u[1], pos_v[0], pos_v[1]])
+    a = math.sin((lat_v - lat_u) / 2) ** 2 + math.cos(lat_u) * math.cos(lat_v) * math.sin((lon_v - lon_u) / 2) ** 2
+    return 2 * EARTH_RADIUS * math.asin(math.sqrt(a))
+
+
+# Sender and receiver of a graph
+def endpoints(graph):
+    sender = [n for n in graph if graph[n][0][0] == 'sender'][0]
+    receiver = [n for n in graph if graph[n][0][0] == 'receiver'][0]
+    return sender, receiver
+
+
+# Undirected adjacency of a graph
+def neighbours(graph):
+    adjacency = {n: set() for n in graph}
+    for n in graph:
+        for v in graph[n][2]:
+            adjacency[n].add(v)
+            adjacency.setdefault(v, set()).add(n)
+    return adjacency
+
+
+# Hashable version of a topology: roles, positions and links
+def topology_version(graph):
+    return hash(tuple(sorted((n, graph[n][0][0], tuple(graph[n][1]), tuple(sorted(graph[n][2]))) for n in graph)))
+
+
+# Weight function of a link, 'qber' maps links (u, v) to their observed QBER in percent
+def weight_function(graph, weight='hop', qber=None):
+    if weight == 'hop':
+        return lambda u, v: 1
+    if weight == 'distance':
+        return lambda u, v: haversine(graph[u][1], graph[v][1])
+    if weight == 'qber':
+        observed = {frozenset(link): q for link, q in (qber or {}).items()}
+        return lambda u, v: 1 + observed.get(frozenset((u, v)), 0)
+    raise ValueError("Unknown weight '" + str(weight) + "', choose from " + str(WEIGHTS) + ".")
+
+
+# Cheapest path from source to target avoiding some nodes and links, returns (cost, path) or None
+def dijkstra(adjacency, weight, source, target, removed_nodes=(), removed_links=()):
+    dist = {source: 0}
+    prev = {source: None}
+    heap = [(0, source)]
+    while heap:
+        d, n = heapq.heappop(heap)
+        if n == target:
+            path = [n]
+            while prev[path[-1]] is not None:
+                path.append(prev[path[-1]])
+            return d, path[::-1]
+        if d > dist[n]:
+            continue
+        for v in sorted(adjacency[n]):
+            if v in removed_nodes or frozenset((n, v)) in removed_links:
+                continue
+            dv = d + weight(n, v)
+            if v not in dist or dv < dist[v]:
+                dist[v] = dv
+                prev[v] = n
+                heapq.heappush(heap, (dv, v))
+    return None
+
+
+# Yen's k-shortest loopless paths, generated lazily in order of cost
+def k_shortest_paths(graph, source, target, weight='hop', qber=None):
+    adjacency = neighbours(graph)
+    w = weight_function(graph, weight, qber)
+    first = dijkstra(adjacency, w, source, target)
+    if first is None:
+        return
+    found = [first[1]]
+    yield first[1]
+    candidates = []
+    seen = {tuple(first[1])}
+    while True:
+        last = found[-1]
+        for i in range(len(last) - 1):
+            root = last[:i + 1]
+            removed_links = {frozenset((p[i], p[i + 1])) for p in found if p[:i + 1] == root}
+            spur = dijkstra(adjacency, w, last[i], target, set(root[:-1]), removed_links)
+            if spur is None:
+                continue
+            path = root[:-1] + spur[1]
+            if tuple(path) not in seen:
+                seen.add(tuple(path))
+                cost = sum(w(path[j], path[j + 1]) for j in range(len(path) - 1))
+                heapq.heappush(candidates, (cost, len(path), path))
+        if not candidates:
+            return
+        path = heapq.heappop(candidates)[2]
+        found.append(path)
+        yield path
+
+
+# The k shortest paths from source to target, cached per (topology version, endpoints, weight)
+def shortest_paths(graph, source, target, k=K_PATHS, weight='hop', qber=None):
+    observed = tuple(sorted((tuple(sorted(link)), q) for link, q in (qber or {}).items())) if weight == 'qber' else ()
+    key = (topology_version(graph), source, target, weight, observed)
+    with _CACHE_LOCK:
+        if key not in _CACHE:
+            _CACHE[key] = ([], k_shortest_paths(graph, source, target, weight, qber))
+        paths, generator = _CACHE[key]
+        while len(paths) < k and generator is not None:
+            try:
+                paths.append(next(generator))
+            except StopIteration:
+                generator = None
+        _CACHE[key] = (paths, generator)
+        return [list(p) for p in paths[:k]]
+
+
+def clear_cache():
+    with _CACHE_LOCK:
+        _CACHE.clear()
@@ -0,0 +1,287 @@
+########################################################################################################################
+# Copyright (c) Xiufan Li. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Author: Xiufan Li
+# Supervisor: Patrick Rebentrost
+# Institution: Centre for Quantum Technologies, National University of Singapore
+# For feedback, please contact Xiufan at: shenlongtianwu8@gmail.com.
+########################################################################################################################
+
+# !/usr/bin/env python3
+"""
+    Long-lived QKD sessions. A session builds the network and the key pool of a path once, then relays a stream of
+    messages from the sender to the receiver of the topology. Every hop encrypts the message with a one-time pad on
+    the distilled key of its link, and a pad draws more key from the pool only when the key at hand is used up.
+    Example:
+
+        with QKDSession(graph) as session:
+            for message in session.relay(telemetry):
+                print(message)
+
+    The messages are str or bytes, and come out of the receiver as they went in, in the order they were submitted.
+"""
+
+import queue
+import threading
+
+from qkd.qkd_key import Key
+from qkd.qkd_crypto import OneTimePad
+from qkd.qkd_metrics import span, count_message
+from qkd.qkd_network import NetworkSession, get_opt_path
+from qkd.qkd_pool import KeyPool, LOW_WATERMARK, HIGH_WATERMARK, BATCH_SIZE
+from qkd.qkd_wire import encode_data, decode_data, DATA_BYTES, DATA_TEXT, DATA_MARK, DATA_END
+
+DRAW_SIZE = 1 << 12         # Key bits a pad draws at least from the pool once its key is used up
+WAIT_TIME = 60              # Seconds to wait for key from the pool, and for the nodes to stop
+
+
+class LinkPad:
+    """
+        One-time pad of one end of a link, refilled from the key pool. Both ends of the link pass the same messages
+        through their pads in the same order, so they draw the same key bits from the pool.
+    """
+
+    def __init__(self, pool, host_id, peer_id, draw_size=DRAW_SIZE, timeout=WAIT_TIME):
+        self.pool = pool
+        self.host_id = host_id
+        self.peer_id = peer_id
+        self.draw_size = max(draw_size // 8 * 8, 8)
+        self.timeout = timeout
+        self.drawn = 0              # Key bits drawn from the pool
+        self._pad = OneTimePad(Key())
+
+    @property
+    def remaining(self):
+        return self._pad.remaining
+
+    # Draw whole bytes of key for a message of 'size' bytes, in pieces the buffer of the link can hold
+    def _refill(self, size):
+        high = self.pool.buffer(self.host_id, self.peer_id).high // 8 * 8
+        need = max(8 * (size - self._pad.remaining), self.draw_size)
+        key = Key()
+        while need > 0:
+            bits = min(need, high)
+            key = key + self.pool.draw(self.host_id, self.peer_id, bits, self.timeout)
+            need -= bits
+        self._pad.extend(key)
+        self.drawn += len(key)
+
+    def encrypt(self, data):
+        if len(data) > self._pad.remaining:
+            self._refill(len(data))
+        return self._pad.encrypt(data)
+
+    def decrypt(self, data):
+        return self.encrypt(data)
+
+
+# Node of a session, runs until the session closes. The sender takes the messages from the inbox and the
+# receiver puts them into the outbox, every other node decrypts with the pad of the previous link and encrypts
+# with the pad of the next one. The mark of a relay goes to the outbox as its relay id alone, and errors go to
+# the outbox, so that the session raises them.
+def _node(host, prev_pad, next_pad, inbox, outbox):
+    try:
+        while True:
+            if prev_pad is None:
+                index, kind, data = inbox.get()
+            else:
+                message = host.get_next_classical(prev_pad.peer_id)
+                # The message stays in the classical storage of QuNetSim, the frame is copied out of it
+                index, kind, data = decode_data(bytes(message.content))
+                with span('session.decrypt', host, prev_pad.peer_id):
+                    data = prev_pad.decrypt(data)
+
+            if next_pad is not None:
+                with span('session.encrypt', host, next_pad.peer_id):
+                    frame = encode_data(index, kind, next_pad.encrypt(data))
+                # QuNetSim formats every message it receives into a log line, even with logging disabled, and the
+                # text of a memoryview does not depend on the size of the frame
+                host.send_classical(next_pad.peer_id, memoryview(frame), await_ack=False)
+                count_message(host, next_pad.peer_id, frame)
+            elif kind == DATA_MARK:
+                outbox.put(index)
+            elif kind != DATA_END:
+                outbox.put((index, data.decode('utf-8', 'surrogatepass') if kind == DATA_TEXT else data))
+
+            if kind == DATA_END:
+                return
+    except Exception as error:
+        outbox.put(error)
+
+
+class QKDSession:
+    """
+        Relay of a stream of messages between the sender and the receiver of a topology, over one path. The network,
+        the key pool and the nodes are set up once when the session opens, and stop when it closes.
+        Without a path, the session takes the first optimal path of 'get_opt_path'. 'pad' makes the pads of the
+        links, LinkPad or e.g. StreamPad of qkd_transfer.
+    """
+
+    def __init__(self, graph, path=None, protocol='bb84', weight='hop', qber=None, low=LOW_WATERMARK,
+                 high=HIGH_WATERMARK, batch_size=BATCH_SIZE, timeout=WAIT_TIME, pad=LinkPad):
+        if path is None:
+            PATH, OPT_PATH = get_opt_path(graph, weight=weight, qber=qber)
+            path = OPT_PATH[0]
+        self.graph = graph
+        self.path = path
+        self.protocol = protocol
+        self.low = low
+        self.high = high
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.pad = pad
+        self.submitted = 0          # Messages put into the session
+        self.delivered = 0          # Messages out of the receiver
+        self._relays = 0            # Relays started, the id of a relay marks the end of its messages
+        self._abandoned = {}        # Indices of the messages still on the way, per relay stopped early
+        self._network = None
+        self._pool = None
+        self._pads = []
+        self._threads = []
+        self._inbox = queue.Queue()
+        self._outbox = queue.Queue()
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self._network is not None
+
+    def open(self):
+        if self.is_open:
+            return self
+        self._pool = KeyPool(self.graph, self.path, self.protocol, self.low, self.high, self.batch_size).start()
+        self._network = NetworkSession(self.graph)
+        hosts = self._network.host_name_dic
+
+        # Excluded all spiers in the path, every link has a pad at both ends
+        nodes = [n for n in self.path if self.graph[n][0][0] != 'spier']
+        self._pads = [(self.pad(self._pool, a, b, timeout=self.timeout), self.pad(self._pool, b, a, timeout=self.timeout))
+                      for a, b in zip(nodes, nodes[1:])]
+        for i, n in enumerate(nodes):
+            prev_pad = self._pads[i - 1][1] if i > 0 else None
+            next_pad = self._pads[i][0] if i < len(self._pads) else None
+            self._threads.append(hosts[n].run_protocol(_node, arguments=(prev_pad, next_pad,
+                                                                         self._inbox, self._outbox)))
+        return self
+
+    # Stop the nodes once they relayed all messages, then the key pool and the network
+    def close(self):
+        if not self.is_open:
+            return
+        self._inbox.put((self.submitted, DATA_END, b''))
+        for thread in self._threads:
+            thread.join(self.timeout)
+        self._pool.stop()
+        self._network.close()
+        self._network = None
+        self._threads = []
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # Put a message into the session without waiting for it, returns its index
+    def submit(self, message):
+        return self._submit(message)
+
+    # The index goes into 'owned' before the message goes on the way
+    def _submit(self, message, owned=None):
+        if not self.is_open:
+            raise RuntimeError("The session is not open.")
+        if isinstance(message, str):
+            kind, data = DATA_TEXT, message.encode('utf-8', 'surrogatepass')
+        else:
+            kind, data = DATA_BYTES, bytes(message)
+        with self._lock:
+            index = self.submitted
+            self.submitted += 1
+            if owned is not None:
+                owned.add(index)
+            self._inbox.put((index, kind, data))
+        return index
+
+    def _feed(self, messages, window, owned, stop, relay_id):
+        try:
+            if isinstance(messages, queue.Queue):
+                messages = iter(messages.get, None)
+            for message in messages:
+                if window is not None:
+                    window.acquire()
+                if stop.is_set():
+                    break
+                self._submit(message, owned)
+        except Exception as error:
+            self._outbox.put(error)
+        finally:
+            self._inbox.put((relay_id, DATA_MARK, b''))
+
+    # Relay the messages of an iterable, or of a queue until it yields None, and yield every message out of the
+    # receiver as soon as it is there. Messages submitted before are yielded first.
+    # With a window, the iterable is read only while fewer than 'window' of its messages are on the way, so the
+    # nodes hold no more than that many messages at a time.
+    # If the caller stops early, the iterable is no longer read and the next relays drop the messages of this one
+    # that are still on the way, up to its mark.
+    def relay(self, messages=(), window=None):
+        if not self.is_open:
+            raise RuntimeError("The session is not open.")
+        with self._lock:
+            relay_id = self._relays
+            self._relays += 1
+        window = None if window is None else threading.Semaphore(window)
+        owned = set()
+        stop = threading.Event()
+        feeder = threading.Thread(target=self._feed, args=(messages, window, owned, stop, relay_id), daemon=True)
+        feeder.start()
+        done = False
+        try:
+            while True:
+                result = self._outbox.get()
+                if isinstance(result, Exception):
+                    raise result
+                if isinstance(result, int):
+                    if result == relay_id:
+                        done = True
+                        break
+                    # Mark of a relay stopped early, all its messages are out
+                    self._abandoned.pop(result, None)
+                    continue
+                index, message = result
+                if index in owned:
+                    owned.discard(index)
+                    if window is not None:
+                        window.release()
+                elif any(index in stale for stale in self._abandoned.values()):
+                    continue
+                self.delivered += 1
+                yield message
+        finally:
+            if not done:
+                stop.set()
+                if window is not None:
+                    window.release()
+                self._abandoned[relay_id] = owned
+        feeder.join()
+
+    # Relay one message and return it as the receiver decrypts it
+    def send(self, message):
+        return list(self.relay([message]))[-1]
+
+    # Key drawn by the pads of every link, and the fill level of the key pool
+    def metrics(self):
+        return {'submitted': self.submitted,
+                'delivered': self.delivered,
+                'drawn': {(a.host_id, b.host_id): a.drawn for a, b in self._pads},
+                'pool': self._pool.metrics() if self._pool is not None else {}}
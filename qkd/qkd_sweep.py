@@ -0,0 +1,189 @@
+########################################################################################################################
+# Copyright (c) Xiufan Li. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Author: Xiufan Li
+# Supervisor: Patrick Rebentrost
+# Institution: Centre for Quantum Technologies, National University of Singapore
+# For feedback, please contact Xiufan at: shenlongtianwu8@gmail.com.
+########################################################################################################################
+
+# !/usr/bin/env python3
+
+"""
+    Monte Carlo parameter sweeps of QKD scenarios on a process pool.
+
+    Every run simulates the links of the optimal path with the vectorized engines, so a worker needs no hosts
+    and no QuNetSim network, and runs in different processes never share state. Example:
+
+        python -m qkd.qkd_sweep --key-size 1000 10000 --eavesdropper-number 1 5 9 --protocol bb84 b92 --repeats 100
+
+    Every spier of the path runs the attack of the scenario, a name of ATTACKS in qkd_attack or a picklable factory
+    such as functools.partial(InterceptResend, fraction=0.5). The 'bit_flip' attack flips with the probability of
+    the eavesdropper number, see sniff_probability in qkd_BB84.
+
+    Every link is distilled like in the key pool of qkd_pool: a link whose QBER reaches the 'error_rate' threshold
+    of the scenario is aborted, the others are corrected with Cascade, confirmed and compressed. The final key
+    length is the secret key of the weakest link, 0 if any link of the path was aborted.
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from qkd.qkd_BB84 import bb84_exchange, sniff_probability
+from qkd.qkd_B92 import b92_exchange
+from qkd.qkd_pool import path_spiers
+from qkd.qkd_cascade import cascade, confirm, TAG_BITS
+from qkd.qkd_privacy import secret_length
+from qkd.qkd_attack import ATTACKS, BitFlip, make_attack
+from qkd.qkd_routing import shortest_paths, endpoints
+from qkd.qkd_topology import TOPOLOGIES
+
+GRID = {'key_size': [1000],
+        'eavesdropper_number': [1],
+        'error_rate': [10],
+        'topology': ['nqsn'],
+        'protocol': ['bb84'],
+        'attack': ['bit_flip']}
+
+COLUMNS = ['protocol', 'topology', 'attack', 'key_size', 'eavesdropper_number', 'error_rate']
+METRICS = ['qber', 'detection_rate', 'final_key_length', 'wall_time']
+
+
+# Attacks of the spiers of a link in a scenario
+def scenario_attacks(params, spiers):
+    attack = params.get('attack', 'bit_flip')
+    if attack == 'bit_flip':
+        return [BitFlip(sniff_probability(params['eavesdropper_number'])) for _ in spiers]
+    return [make_attack(attack) for _ in spiers]
+
+
+# One run of a scenario, the QBER is the largest link error rate and the final key the shortest secret link key
+def run_scenario(params, seed=None):
+    np.random.seed(seed)
+    random.seed(seed)
+    graph = params['topology']
+    graph = TOPOLOGIES[graph] if isinstance(graph, str) else graph
+    start = time.perf_counter()
+    qbers = []
+    key_lengths = []
+    path = shortest_paths(graph, *endpoints(graph), k=1)[0]
+    for sender, receiver, spiers in path_spiers(graph, path):
+        attacks = scenario_attacks(params, spiers)
+        if params['protocol'] == 'b92':
+            send_key, recv_key, error_rate = b92_exchange(params['key_size'], attacks=attacks)
+        elif params['protocol'] == 'bb84':
+            send_key, recv_key, error_rate = bb84_exchange(params['key_size'], attacks=attacks)
+        else:
+            raise ValueError("Unknown protocol '" + str(params['protocol']) + "'.")
+        qbers.append(error_rate)
+        secret = 0
+        if error_rate < params['error_rate']:
+            # Correct, confirm and compress the link like _refill of KeyPool in qkd_pool
+            recv_key, leaked, rounds = cascade(send_key, recv_key, error_rate / 100)
+            if confirm(send_key, recv_key):
+                secret = secret_length(len(send_key), error_rate / 100, leaked + TAG_BITS)
+        key_lengths.append(secret)
+    qber = max(qbers)
+    return {'qber': qber,
+            'detected': qber >= params['error_rate'],
+            'final_key_length': min(key_lengths),
+            'wall_time': time.perf_counter() - start}
+
+
+def _run(args):
+    params, seed = args
+    return run_scenario(params, seed)
+
+
+# All combinations of the grid, a grid value is a list of the values to sweep
+def expand_grid(grid):
+    grid = dict(GRID, **grid)
+    return [dict(zip(COLUMNS, values)) for values in itertools.product(*[grid[c] for c in COLUMNS])]
+
+
+# Run every combination of the grid 'repeats' times on a process pool and return one aggregated row per combination
+def sweep(grid, repeats=1, workers=None, seed=0):
+    scenarios = expand_grid(grid)
+    jobs = [(params, seed + i * repeats + r) for i, params in enumerate(scenarios) for r in range(repeats)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(_run, jobs, chunksize=max(1, len(jobs) // (4 * (workers or os.cpu_count())))))
+    table = []
+    for i, params in enumerate(scenarios):
+        runs = results[i * repeats:(i + 1) * repeats]
+        row = {c: (params[c] if isinstance(params[c], (str, int, float)) else 'custom') for c in COLUMNS}
+        row['runs'] = repeats
+        row['qber'] = float(np.mean([r['qber'] for r in runs]))
+        row['detection_rate'] = float(np.mean([r['detected'] for r in runs]))
+        row['final_key_length'] = float(np.mean([r['final_key_length'] for r in runs]))
+        row['wall_time'] = float(np.mean([r['wall_time'] for r in runs]))
+        table.append(row)
+    return table
+
+
+def format_table(table):
+    columns = COLUMNS + ['runs'] + METRICS
+    cells = [[c for c in columns]] + [[('%.4g' % r[c]) if isinstance(r[c], float) else str(r[c]) for c in columns]
+                                      for r in table]
+    widths = [max(len(row[j]) for row in cells) for j in range(len(columns))]
+    return '\n'.join('  '.join(cell.rjust(w) for cell, w in zip(row, widths)) for row in cells)
+
+
+# Write the table as CSV or JSON according to the file extension
+def save_table(table, filename):
+    with open(filename, 'w', newline='') as file:
+        if filename.endswith('.json'):
+            json.dump(table, file, indent=2)
+        else:
+            writer = csv.DictWriter(file, fieldnames=COLUMNS + ['runs'] + METRICS)
+            writer.writeheader()
+            writer.writerows(table)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Monte Carlo sweep of QKD scenarios.")
+    parser.add_argument('--key-size', type=int, nargs='+', default=GRID['key_size'])
+    parser.add_argument('--eavesdropper-number', type=int, nargs='+', default=GRID['eavesdropper_number'])
+    parser.add_argument('--error-rate', type=float, nargs='+', default=GRID['error_rate'],
+                        help="QBER threshold in percent: a link at or above it is detected and aborted, so it only "
+                             "changes detection_rate and final_key_length, not the simulated QBER")
+    parser.add_argument('--topology', nargs='+', default=GRID['topology'], choices=sorted(TOPOLOGIES))
+    parser.add_argument('--protocol', nargs='+', default=GRID['protocol'], choices=['bb84', 'b92'])
+    parser.add_argument('--attack', nargs='+', default=GRID['attack'], choices=sorted(ATTACKS))
+    parser.add_argument('--repeats', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help="write the table to a .csv or .json file")
+    args = parser.parse_args(argv)
+
+    grid = {'key_size': args.key_size, 'eavesdropper_number': args.eavesdropper_number,
+            'error_rate': args.error_rate, 'topology': args.topology, 'protocol': args.protocol,
+            'attack': args.attack}
+    table = sweep(grid, args.repeats, args.workers, args.seed)
+    print(format_table(table))
+    if args.out:
+        save_table(table, args.out)
+    return table
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,112 @@
+########################################################################################################################
+# Copyright (c) Xiufan Li. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Author: Xiufan Li
+# Supervisor: Patrick Rebentrost
+# Institution: Centre for Quantum Technologies, National University of Singapore
+# For feedback, please contact Xiufan at: shenlongtianwu8@gmail.com.
+########################################################################################################################
+
+# !/usr/bin/env python3
+"""
+    Bulk file transfer over a QKD session. The sender memory-maps the file and relays it in chunks of CHUNK_SIZE
+    bytes, every chunk is a binary DATA frame of qkd_wire that holds its length and index. The receiver writes the
+    chunks to the target file as they arrive. At most WINDOW chunks are on the way, so that the hosts hold only a
+    few chunks at a time whatever the size of the file. Example:
+
+        stats = send_file(graph, 'dataset.bin', 'received.bin')
+
+    A one-time pad would take as many key bits as the file has, so every hop encrypts a chunk with StreamPad:
+    SEED_BYTES of fresh key of the link expanded by SHAKE-256. The key rate of the links then bounds the number of
+    chunks per second, and not the number of bytes.
+"""
+
+import hashlib
+import mmap
+import os
+import time
+
+import numpy as np
+
+from qkd.qkd_crypto import CHUNK_SIZE
+from qkd.qkd_session import QKDSession, LinkPad
+
+WINDOW = 4                  # Chunks on the way at most
+SEED_BYTES = 32             # Key bytes per chunk
+
+
+class StreamPad(LinkPad):
+    """
+        Pad of one end of a link for bulk transfers. Every message takes the next SEED_BYTES key bytes of the link
+        and is XORed with their SHAKE-256 expansion. Both ends draw the same key bytes for the same message.
+    """
+
+    def encrypt(self, data):
+        if SEED_BYTES > self._pad.remaining:
+            self._refill(SEED_BYTES)
+        seed = self._pad.take(SEED_BYTES).tobytes()
+        stream = np.frombuffer(hashlib.shake_256(seed).digest(len(data)), dtype=np.uint8)
+        return (np.frombuffer(data, dtype=np.uint8) ^ stream).tobytes()
+
+    def decrypt(self, data):
+        return self.encrypt(data)
+
+
+# Chunks of a file read through a memory map, only the chunk at hand is copied out of the map, and the pages
+# read are given back to the system where it supports it. 'digest' is updated with every chunk, if given.
+def file_chunks(filename, chunk_size=CHUNK_SIZE, digest=None):
+    with open(filename, 'rb') as file:
+        size = os.fstat(file.fileno()).st_size
+        if size == 0:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for offset in range(0, size, chunk_size):
+                chunk = data[offset:offset + chunk_size]
+                if hasattr(mmap, 'MADV_DONTNEED'):
+                    start = offset - offset % mmap.PAGESIZE
+                    data.madvise(mmap.MADV_DONTNEED, start, offset + len(chunk) - start)
+                if digest is not None:
+                    digest.update(chunk)
+                yield chunk
+
+
+# Relay a file over an open session and write it to 'target'. Return the size, the number of chunks, the seconds
+# it took, the throughput in bytes per second and if the SHA-256 of both files match.
+def transfer_file(session, source, target, chunk_size=CHUNK_SIZE, window=WINDOW):
+    if chunk_size <= 0:
+        raise ValueError("The chunk size must be positive.")
+    sent = hashlib.sha256()
+    received = hashlib.sha256()
+    size = 0
+    chunks = 0
+    start = time.perf_counter()
+    with open(target, 'wb') as file:
+        for chunk in session.relay(file_chunks(source, chunk_size, sent), window):
+            file.write(chunk)
+            received.update(chunk)
+            size += len(chunk)
+            chunks += 1
+    seconds = time.perf_counter() - start
+    return {'bytes': size,
+            'chunks': chunks,
+            'seconds': seconds,
+            'throughput': size / seconds if seconds else 0.0,
+            'verified': sent.digest() == received.digest()}
+
+
+# Open a session on the topology with stream pads, transfer the file and close the session, see QKDSession for the
+# other arguments
+def send_file(graph, source, target, path=None, chunk_size=CHUNK_SIZE, window=WINDOW, **kwargs):
+    with QKDSession(graph, path, pad=StreamPad, **kwargs) as session:
+        return transfer_file(session, source, target, chunk_size, window)
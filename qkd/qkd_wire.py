@@ -0,0 +1,252 @@
+########################################################################################################################
+# Copyright (c) Xiufan Li. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Author: Xiufan Li
+# Supervisor: Patrick Rebentrost
+# Institution: Centre for Quantum Technologies, National University of Singapore
+# For feedback, please contact Xiufan at: shenlongtianwu8@gmail.com.
+########################################################################################################################
+
+# !/usr/bin/env python3
+
+"""
+    Binary wire format of the classical messages of QKD.
+
+    Every payload is framed by a 12-byte header: magic b'QK', version, kind and the number of items.
+    Bits (basis, sifting masks, keys) are packed eight per byte with numpy.packbits, the states of a batch
+    of qubits are two packed bit arrays (bits, then basis). Frames are decoded without any 'eval'.
+
+    The protocols read their frames as steps: a generator yields the peer whose next frame it needs, is sent the
+    content of that frame, and returns its result. 'run_steps' drives the steps on a thread host, 'run_steps' of
+    qkd_async on a coroutine host, so both runtimes share one implementation of every protocol.
+"""
+
+import struct
+import numpy as np
+
+from qkd.qkd_key import Key
+
+MAGIC = b'QK'
+VERSION = 1
+HEADER = struct.Struct('>2sBBQ')        # magic, version, kind, number of items
+
+# Kinds of frames
+BASIS_FRAME = 1         # measurement or preparation basis, 0 = Z basis, 1 = X basis
+SIFT_FRAME = 2          # sifting mask, 1 where both basis agree
+KEY_FRAME = 3           # key bits
+STATES_FRAME = 4        # batch of qubit states (bit, base) for H^base X^bit |0>
+RATE_FRAME = 5          # error rate as a float
+TEXT_FRAME = 6          # UTF-8 text, e.g. receipts and encrypted messages
+SAMPLE_FRAME = 7        # seed of the sample positions and the sampled key bits, see qkd_estimate
+QUERY_FRAME = 8         # seed of the permutations and the (pass, start, end) ranges of parity queries, see qkd_cascade
+PARITY_FRAME = 9        # parities answering a query frame
+SEED_FRAME = 10         # seed of a Toeplitz hash and its output length, see qkd_privacy
+DATA_FRAME = 11         # index, type and one-time pad encrypted bytes of a session message, see qkd_session
+SLOTS_FRAME = 12        # batch of qubit states with the detector click of every time slot, see qkd_channel
+DETECT_FRAME = 13       # time slots where the detector clicked, 1 for a click
+CONFIRM_FRAME = 14      # seed of a universal hash and the hash of a reconciled key, see qkd_cascade
+DROP_FRAME = 15         # no message, a link of the relay had no secret key to encrypt it, see qkd_crypto
+
+KINDS = {BASIS_FRAME: 'basis', SIFT_FRAME: 'sift', KEY_FRAME: 'key',
+         STATES_FRAME: 'states', RATE_FRAME: 'rate', TEXT_FRAME: 'text', SAMPLE_FRAME: 'sample',
+         QUERY_FRAME: 'query', PARITY_FRAME: 'parity', SEED_FRAME: 'seed', DATA_FRAME: 'data',
+         SLOTS_FRAME: 'slots', DETECT_FRAME: 'detect', CONFIRM_FRAME: 'confirm', DROP_FRAME: 'drop'}
+
+# Types of data frames
+DATA_BYTES = 0          # the message is bytes
+DATA_TEXT = 1           # the message is UTF-8 text
+DATA_MARK = 2           # no message, marks the end of a batch of messages
+DATA_END = 3            # no message, closes the session
+
+
+# Length in bytes of n packed bits
+def packed_size(n):
+    return (n + 7) // 8
+
+
+def _frame(kind, count, payload):
+    return HEADER.pack(MAGIC, VERSION, kind, count) + payload
+
+
+# Check the header of a frame and return the number of items and the payload
+def _unframe(frame, kind, payload_size):
+    if not isinstance(frame, (bytes, bytearray, memoryview)):
+        raise ValueError("Malformed frame: expected bytes, got " + type(frame).__name__ + ".")
+    frame = memoryview(frame)
+    if len(frame) < HEADER.size:
+        raise ValueError("Malformed frame: " + str(len(frame)) + " bytes is shorter than the header.")
+    magic, version, frame_kind, count = HEADER.unpack(frame[:HEADER.size])
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Malformed frame: unknown magic or version.")
+    if frame_kind != kind:
+        raise ValueError("Malformed frame: expected a " + KINDS.get(kind, str(kind)) + " frame, got " +
+                         KINDS.get(frame_kind, str(frame_kind)) + ".")
+    payload = frame[HEADER.size:]
+    if len(payload) != payload_size(count):
+        raise ValueError("Malformed frame: payload of " + str(len(payload)) + " bytes for " + str(count) + " items.")
+    return count, payload
+
+
+# Kind of a frame, checked like the rest of the header
+def frame_kind(frame):
+    if not isinstance(frame, (bytes, bytearray, memoryview)) or len(frame) < HEADER.size:
+        raise ValueError("Malformed frame: no header.")
+    magic, version, kind, count = HEADER.unpack(memoryview(frame)[:HEADER.size])
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Malformed frame: unknown magic or version.")
+    return kind
+
+
+# Frame an array of bits of the given kind (BASIS_FRAME, SIFT_FRAME or KEY_FRAME)
+def encode_bits(kind, bits):
+    bits = np.asarray(bits, dtype=np.uint8)
+    return _frame(kind, len(bits), np.packbits(bits).tobytes())
+
+
+def decode_bits(kind, frame):
+    count, payload = _unframe(frame, kind, packed_size)
+    return np.unpackbits(np.frombuffer(payload, dtype=np.uint8), count=count)
+
+
+# Frame a key without unpacking its bits
+def encode_key(key):
+    key = key if isinstance(key, Key) else Key(key)
+    return _frame(KEY_FRAME, len(key), key.to_bytes())
+
+
+def decode_key(frame):
+    count, payload = _unframe(frame, KEY_FRAME, packed_size)
+    return Key.from_bytes(payload, count)
+
+
+# Frame a batch of qubit states
+def encode_states(bits, basis):
+    bits = np.asarray(bits, dtype=np.uint8)
+    basis = np.asarray(basis, dtype=np.uint8)
+    if len(bits) != len(basis):
+        raise ValueError("States need as many bits as basis.")
+    return _frame(STATES_FRAME, len(bits), np.packbits(bits).tobytes() + np.packbits(basis).tobytes())
+
+
+def decode_states(frame):
+    count, payload = _unframe(frame, STATES_FRAME, lambda n: 2 * packed_size(n))
+    packed = np.frombuffer(payload, dtype=np.uint8)
+    half = packed_size(count)
+    return np.unpackbits(packed[:half], count=count), np.unpackbits(packed[half:], count=count)
+
+
+# Frame a batch of qubit states as they reach the detector, with the time slots where it clicked
+def encode_slots(bits, basis, clicks):
+    arrays = [np.asarray(a, dtype=np.uint8) for a in (bits, basis, clicks)]
+    if not len(arrays[0]) == len(arrays[1]) == len(arrays[2]):
+        raise ValueError("Slots need as many bits, basis and clicks.")
+    return _frame(SLOTS_FRAME, len(arrays[0]), b''.join(np.packbits(a).tobytes() for a in arrays))
+
+
+def decode_slots(frame):
+    count, payload = _unframe(frame, SLOTS_FRAME, lambda n: 3 * packed_size(n))
+    packed = np.frombuffer(payload, dtype=np.uint8)
+    size = packed_size(count)
+    return tuple(np.unpackbits(packed[i * size:(i + 1) * size], count=count) for i in range(3))
+
+
+# Frame the seed of a sample and the sampled key bits
+def encode_sample(seed, sample):
+    sample = sample if isinstance(sample, Key) else Key(sample)
+    return _frame(SAMPLE_FRAME, len(sample), struct.pack('>Q', seed) + sample.to_bytes())
+
+
+def decode_sample(frame):
+    count, payload = _unframe(frame, SAMPLE_FRAME, lambda n: 8 + packed_size(n))
+    return struct.unpack('>Q', payload[:8])[0], Key.from_bytes(payload[8:], count)
+
+
+# Frame a batch of parity queries, each the range [start, end) of the key permuted for a pass
+def encode_queries(seed, passes, starts, ends):
+    ranges = np.stack([np.asarray(passes), np.asarray(starts), np.asarray(ends)]).astype('>u4')
+    return _frame(QUERY_FRAME, ranges.shape[1], struct.pack('>Q', seed) + ranges.tobytes())
+
+
+def decode_queries(frame):
+    count, payload = _unframe(frame, QUERY_FRAME, lambda n: 8 + 12 * n)
+    ranges = np.frombuffer(payload[8:], dtype='>u4').reshape(3, count).astype(np.int64)
+    return struct.unpack('>Q', payload[:8])[0], ranges[0], ranges[1], ranges[2]
+
+
+# Frame the seed of a hash and the number of output bits
+def encode_seed(seed, length):
+    return _frame(SEED_FRAME, length, struct.pack('>Q', seed))
+
+
+def decode_seed(frame):
+    length, payload = _unframe(frame, SEED_FRAME, lambda n: 8)
+    return struct.unpack('>Q', payload)[0], length
+
+
+# Frame the seed of a hash and the hash of a key
+def encode_confirm(seed, tag):
+    tag = tag if isinstance(tag, Key) else Key(tag)
+    return _frame(CONFIRM_FRAME, len(tag), struct.pack('>Q', seed) + tag.to_bytes())
+
+
+def decode_confirm(frame):
+    count, payload = _unframe(frame, CONFIRM_FRAME, lambda n: 8 + packed_size(n))
+    return struct.unpack('>Q', payload[:8])[0], Key.from_bytes(payload[8:], count)
+
+
+# Frame a message of a session with its index and type
+def encode_data(index, kind, data=b''):
+    return _frame(DATA_FRAME, len(data), struct.pack('>QB', index, kind) + bytes(data))
+
+
+def decode_data(frame):
+    _, payload = _unframe(frame, DATA_FRAME, lambda n: 9 + n)
+    index, kind = struct.unpack('>QB', payload[:9])
+    return index, kind, bytes(payload[9:])
+
+
+# Frame an error rate
+def encode_rate(rate):
+    return _frame(RATE_FRAME, 1, struct.pack('>d', rate))
+
+
+def decode_rate(frame):
+    _, payload = _unframe(frame, RATE_FRAME, lambda n: 8 * n)
+    return struct.unpack('>d', payload)[0]
+
+
+# Frame a text
+def encode_text(text):
+    payload = text.encode('utf-8', 'surrogatepass')
+    return _frame(TEXT_FRAME, len(payload), payload)
+
+
+def decode_text(frame):
+    _, payload = _unframe(frame, TEXT_FRAME, lambda n: n)
+    return bytes(payload).decode('utf-8', 'surrogatepass')
+
+
+# Frame of a dropped message
+def encode_drop():
+    return _frame(DROP_FRAME, 0, b'')
+
+
+# Drive the steps of a protocol on a host whose 'get_next_classical' blocks, and return their result
+def run_steps(host, steps, wait_time):
+    try:
+        peer = next(steps)
+        while True:
+            peer = steps.send(host.get_next_classical(peer, wait_time).content)
+    except StopIteration as stop:
+        return stop.value
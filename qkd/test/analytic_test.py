@@ -0,0 +1,56 @@
+########################################################################################################################
+# Copyright (c) Xiufan Li. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Author: Xiufan Li
+# Supervisor: Patrick Rebentrost
+# Institution: Centre for Quantum Technologies, National University of Singapore
+# For feedback, please contact Xiufan at: shenlongtianwu8@gmail.com.
+########################################################################################################################
+
+# !/usr/bin/env python3
+
+"""
+    Test of the closed-form key rates against the vectorized simulation.
+"""
+
+from qkd.qkd_analytic import link_qber, link_rate, binomial_tail, analyze
+from qkd.qkd_BB84 import bb84_exchange, sniff_probability
+from qkd.qkd_sweep import TOPOLOGIES
+
+
+def test_link_qber_matches_simulation():
+    for sniffers in [1, 2, 3]:
+        send_key, recv_key, error_rate = bb84_exchange(200000, sniffers, flip_prob=0.3)
+        assert abs(error_rate - 100 * link_qber(sniffers, 0.3)) < 1
+    assert link_qber(1) == (1 - (1 - 2 * sniff_probability()) ** 1) / 4
+
+
+def test_binomial_tail():
+    assert abs(binomial_tail(10, 0.5, 5) - 638 / 1024) < 1e-12
+    assert binomial_tail(10, 0, 1) == 0 and binomial_tail(10, 0.3, 0) == 1
+    assert abs(binomial_tail(10000, 0.1, 1000) - 0.5) < 0.01
+
+
+def test_link_rate_without_spiers():
+    link = link_rate(0, 10000)
+    assert link['qber'] == 0 and link['detection_probability'] == 0
+    assert link['sifted_bits'] == 5000 and link['secret_bits'] == 3750 - 20
+
+
+def test_path_bottleneck():
+    path = analyze(TOPOLOGIES['nqsn'], 10000)[0]
+    assert path['path'] == ['Ani', 'Arya', 'Darren', 'Xiufan']
+    assert path['bottleneck'] == ('Arya', 'Xiufan') and path['secret_bits'] == 0
+    assert path['detection_probability'] > 0.999
+    assert analyze(TOPOLOGIES['direct'], 10000)[0]['secret_bits'] == 3730
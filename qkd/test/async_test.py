@@ -0,0 +1,78 @@
+########################################################################################################################
+# Copyright (c) Xiufan Li. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Author: Xiufan Li
+# Supervisor: Patrick Rebentrost
+# Institution: Centre for Quantum Technologies, National University of Singapore
+# For feedback, please contact Xiufan at: shenlongtianwu8@gmail.com.
+########################################################################################################################
+
+# !/usr/bin/env python3
+
+"""
+    Test of the asyncio runtime with thousands of hosts on one event loop.
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+from qkd.qkd_async import AsyncNetwork, QKD
+from qkd.qkd_bench import chain_topology
+from qkd.qkd_metrics import recording, snapshot
+
+msg = "Hey, are you nervous for the presentation??"
+
+
+def test_long_chain_one_thread():
+    network = AsyncNetwork(chain_topology(2000))
+    threads = threading.active_count()
+    assert asyncio.run(network.run_path(list(network.graph), msg, 400)).message == msg
+    assert threading.active_count() == threads
+
+
+# A chain of links without secret key relays a dropped message to the receiver
+def test_short_keys_drop_message():
+    network = AsyncNetwork(chain_topology(2))
+    result = asyncio.run(network.run_path(list(network.graph), msg, 60))
+    assert result.message is None
+    assert all(link.eves == 1 and len(link.key) == 0 for link in result.links)
+
+
+def test_spier_detected():
+    graph = chain_topology(2)
+    graph['Trusted1'][0] = ['spier']
+    network = AsyncNetwork(graph)
+    with recording():
+        asyncio.run(network.run_path(list(graph), msg, 2000))
+        counters = snapshot()['counters']
+    assert network.sniffers('Sender', 'Trusted2') == 1
+    # A sniffed link is not safe, so its key is neither corrected nor compressed
+    assert not any(c['name'] == 'leaked_bits' and c['peer'] == 'Sender' for c in counters)
+    assert any(c['name'] == 'leaked_bits' and c['peer'] == 'Trusted2' for c in counters)
+
+
+def test_qkd_two_paths():
+    graph = {'Ani': [['sender'], [103.68, 1.34], ['Arya', 'Nayan']],
+             'Arya': [['truster'], [103.76, 1.3], ['Ani', 'Xiufan']],
+             'Nayan': [['truster'], [103.64, 1.28], ['Ani', 'Xiufan']],
+             'Xiufan': [['receiver'], [103.7, 1.37], ['Arya', 'Nayan']]}
+    assert [result.message for result in QKD(graph, msg, 500)] == [msg, msg]
+
+
+def test_receive_timeout():
+    network = AsyncNetwork(chain_topology(1))
+    with pytest.raises(TimeoutError):
+        asyncio.run(network.hosts['Receiver'].get_next_classical('Sender', 0.01))
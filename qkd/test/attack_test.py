@@ -0,0 +1,108 @@
+########################################################################################################################
+# Copyright (c) Xiufan Li. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Author: Xiufan Li
+# Supervisor: Patrick Rebentrost
+# Institution: Centre for Quantum Technologies, National University of Singapore
+# For feedback, please contact Xiufan at: shenlongtianwu8@gmail.com.
+########################################################################################################################
+
+# !/usr/bin/env python3
+
+"""
+    Test of the vectorized attacks of the spiers.
+"""
+
+import asyncio
+import contextlib
+import io
+
+import numpy as np
+import pytest
+
+from qkd.qkd_attack import BitFlip, InterceptResend, PhotonNumberSplitting, make_attack, attack_states
+from qkd.qkd_BB84 import bb84_exchange, prepare_states
+from qkd.qkd_B92 import b92_exchange
+from qkd.qkd_estimate import SAMPLE_FRACTION
+from qkd.qkd_async import AsyncNetwork
+from qkd.qkd_bench import chain_topology
+from qkd.qkd_sweep import run_scenario
+
+
+def test_intercept_resend_error_rates():
+    # A random basis disturbs a quarter of the sifted bits, a fixed basis half of them in the other basis
+    send_key, recv_key, error_rate = bb84_exchange(200000, attacks=[InterceptResend()])
+    assert error_rate == pytest.approx(25, abs=1)
+    send_key, recv_key, error_rate = bb84_exchange(200000, attacks=[InterceptResend(basis=0)])
+    assert error_rate == pytest.approx(25, abs=1)
+    send_key, recv_key, error_rate = bb84_exchange(200000, attacks=[InterceptResend(fraction=0.2)])
+    assert error_rate == pytest.approx(5, abs=1)
+
+
+def test_bit_flip_matches_sniffers():
+    for flip_prob in [0.3, 0.8]:
+        send_key, recv_key, error_rate = bb84_exchange(200000, attacks=[BitFlip(flip_prob), BitFlip(flip_prob)])
+        assert error_rate == pytest.approx(100 * (1 - (1 - 2 * flip_prob) ** 2) / 4, abs=1)
+
+
+def test_photon_number_splitting():
+    attack = PhotonNumberSplitting(mu=0.5)
+    bits, basis = prepare_states(np.random.randint(2, size=200000))
+    states, states_basis, pulses = attack_states(bits, basis, [attack])
+    # Only the single-photon pulses are blocked, the others go on untouched and Eve learns the multi-photon ones
+    assert pulses.mean() == pytest.approx(1 - 0.5 * np.exp(-0.5), abs=0.005)
+    assert np.array_equal(states, bits) and np.array_equal(states_basis, basis)
+    assert attack.learned / 200000 == pytest.approx(1 - np.exp(-0.5) * 1.5, abs=0.005)
+    assert attack.qubits == 200000
+
+    send_key, recv_key, error_rate = bb84_exchange(200000, attacks=[PhotonNumberSplitting()])
+    assert error_rate == 0
+    sifted = 200000 * (1 - 0.5 * np.exp(-0.5)) / 2
+    assert len(send_key) == pytest.approx(sifted * (1 - SAMPLE_FRACTION), rel=0.02)
+
+
+def test_b92_attacks():
+    send_key, recv_key, error_rate = b92_exchange(400000, attacks=[InterceptResend()])
+    assert error_rate == pytest.approx(25, abs=2)
+    send_key, recv_key, error_rate = b92_exchange(400000, attacks=[PhotonNumberSplitting(block=0)])
+    assert error_rate == 0
+
+
+def test_make_attack():
+    attack = InterceptResend(fraction=0.5)
+    assert make_attack(attack) is attack
+    assert isinstance(make_attack('pns', mu=0.1), PhotonNumberSplitting)
+    with pytest.raises(ValueError):
+        make_attack('unknown')
+    with pytest.raises(ValueError):
+        InterceptResend(basis=2)
+
+
+def test_async_spier_attack():
+    graph = chain_topology(2)
+    graph['Trusted1'][0] = ['spier']
+    attack = PhotonNumberSplitting()
+    network = AsyncNetwork(graph, attacks={'Trusted1': attack})
+    with contextlib.redirect_stdout(io.StringIO()):
+        msg = asyncio.run(network.run_path(list(graph), "Hello", 100000)).message
+    # The pulses that reach Trusted2 carry no error, so the link stays safe
+    assert msg == "Hello"
+    assert attack.qubits == 100000 and attack.learned > 0
+
+
+def test_sweep_attack():
+    params = {'topology': 'spied', 'protocol': 'bb84', 'attack': 'intercept_resend', 'key_size': 10000,
+              'eavesdropper_number': 1, 'error_rate': 10}
+    assert run_scenario(params, seed=1)['detected']
+    assert run_scenario(dict(params, attack='pns'), seed=1)['qber'] == 0
@@ -0,0 +1,114 @@
+########################################################################################################################
+# Copyright (c) Xiufan Li. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Author: Xiufan Li
+# Supervisor: Patrick Rebentrost
+# Institution: Centre for Quantum Technologies, National University of Singapore
+# For feedback, please contact Xiufan at: shenlongtianwu8@gmail.com.
+########################################################################################################################
+
+# !/usr/bin/env python3
+
+"""
+    Test of the NumPy engine of B92 protocol.
+"""
+
+import contextlib
+import io
+import numpy as np
+import pytest
+
+from qkd.qkd_B92 import preparation, entangle_batch, measure_batch, sift_bits, alice_key_string, bob_key_string
+from qkd.qkd_B92 import send_qkd, receive_qkd, encry_msg, decry_msg, QKD
+from qkd.qkd_BB84 import MIN_SECRET_BITS
+from qkd.qkd_key import Key
+from qkd.qkd_bench import LINK
+from qkd.qkd_network import NetworkSession
+from qkd.qkd_topology import TOPOLOGIES
+
+key_size = 100000
+
+
+def test_same_basis_outcomes_correlated():
+    alice_basis, bob_basis = preparation(key_size)
+    alice_bits, (state_bits, state_basis) = entangle_batch(alice_basis)
+    bob_bits = measure_batch(state_bits, state_basis, bob_basis)
+    alice_key = sift_bits(alice_bits, alice_basis, bob_basis, key_size)
+    bob_key = sift_bits(bob_bits, bob_basis, alice_basis, key_size)
+    assert abs(len(alice_key) - key_size / 8) < key_size / 100
+    assert np.array_equal(alice_key, bob_key)
+
+
+def test_other_basis_outcomes_uncorrelated():
+    alice_basis = 'Z' * key_size
+    alice_bits, (state_bits, state_basis) = entangle_batch(alice_basis)
+    bob_bits = measure_batch(state_bits, state_basis, 'X' * key_size)
+    assert abs(np.mean(alice_bits == bob_bits) - 0.5) < 0.01
+
+
+def test_key_strings():
+    assert alice_key_string('0110', 'ZXXZ', 'ZZXZ', 16) == '010'
+    assert bob_key_string('01101111', 'ZXXZZZZZ', 'ZZXZZZZZ', 8) == '0'
+
+
+def test_encryption_uses_first_key_byte():
+    key = Key([0, 1, 1, 0, 0, 0, 0, 1]) + Key.random(100)
+    assert encry_msg(key, 'abc') == ''.join(chr(0x61 ^ ord(c)) for c in 'abc')
+    assert decry_msg(key, encry_msg(key, 'abc')) == 'abc'
+
+
+# Run both ends of a B92 link over a session, return the LinkResults of Alice and Bob
+def exchange(key_size):
+    alice_basis, bob_basis = preparation(key_size)
+    results = {}
+    with NetworkSession(LINK) as session, contextlib.redirect_stdout(io.StringIO()):
+        hosts = session.host_name_dic
+        threads = [hosts['Alice'].run_protocol(lambda *args: results.update(alice=send_qkd(*args)),
+                                               ('Bob', alice_basis, key_size, 'numpy')),
+                   hosts['Bob'].run_protocol(lambda *args: results.update(bob=receive_qkd(*args)),
+                                             ('Alice', bob_basis, key_size, 'numpy'))]
+        for thread in threads:
+            thread.join()
+    return results['alice'], results['bob']
+
+
+# The key size of the B92 demo in BB84_main/main.py distills a secret key
+def test_demo_key_size():
+    msg = "Hey, are you nervous for the presentation??"
+    alice, bob = exchange(2000)
+    assert alice.eves == bob.eves == 0
+    assert alice.secret_bits == bob.secret_bits >= MIN_SECRET_BITS
+    assert alice.key == bob.key and alice.qber == bob.qber
+    assert decry_msg(bob.key, encry_msg(alice.key, msg)) == msg
+
+
+# Too few sifted bits leave no secret key, both ends flag the link and keep no key to encrypt with
+def test_short_key():
+    alice, bob = exchange(180)
+    assert alice.eves == bob.eves == 1
+    assert alice.secret_bits == bob.secret_bits == 0
+    assert len(alice.key) == len(bob.key) == 0
+    with pytest.raises(ValueError, match='shorter than the byte'):
+        encry_msg(alice.key, "Hey")
+
+
+# The public entry point relays the message over the optimal path of a topology, the spier is left out
+def test_qkd_over_topology():
+    msg = "Hey, are you nervous for the presentation??"
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = QKD(TOPOLOGIES['nqsn'], msg, 2000, 'numpy')
+    assert result.path == ['Ani', 'Arya', 'Darren', 'Xiufan']
+    assert [(link.peer, link.host) for link in result.links] == [('Ani', 'Arya'), ('Arya', 'Xiufan')]
+    assert all(link.secret_bits >= MIN_SECRET_BITS for link in result.links)
+    assert result.message == msg
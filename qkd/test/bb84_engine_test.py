@@ -0,0 +1,124 @@
+########################################################################################################################
+# Copyright (c) Xiufan Li. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Author: Xiufan Li
+# Supervisor: Patrick Rebentrost
+# Institution: Centre for Quantum Technologies, National University of Singapore
+# For feedback, please contact Xiufan at: shenlongtianwu8@gmail.com.
+########################################################################################################################
+
+# !/usr/bin/env python3
+
+"""
+    Test of the NumPy engine of BB84 protocol.
+"""
+
+import collections
+import contextlib
+import io
+
+import numpy as np
+
+from qkd.qkd_key import Key
+from qkd.qkd_BB84 import prepare_states, measure_states, sniff_probability, key_error_rate
+from qkd.qkd_BB84 import detect_states, send_steps, receive_steps, send_bb84, receive_bb84
+from qkd.qkd_bench import LINK
+from qkd.qkd_network import NetworkSession
+
+key_size = 100000
+
+
+def sift(key, sniffers, flip_prob=None):
+    bits, basis = prepare_states(key, sniffers, flip_prob)
+    recv_key, measured_basis = measure_states(bits, basis)
+    mask = basis == measured_basis
+    return key[mask], recv_key[mask], mask
+
+
+def test_no_eavesdropper_keys_match():
+    key = np.random.randint(2, size=key_size)
+    send_key, recv_key, mask = sift(key, 0)
+    assert abs(mask.mean() - 0.5) < 0.01
+    assert key_error_rate(send_key, recv_key) == 0
+
+
+def test_sniffer_error_rate():
+    # X gates only disturb the half of the sifted states prepared in Z basis
+    key = np.random.randint(2, size=key_size)
+    send_key, recv_key, _ = sift(key, 1)
+    assert abs(key_error_rate(send_key, recv_key) - sniff_probability() / 2 * 100) < 1.5
+
+
+def test_two_sniffers_flip_back():
+    key = np.random.randint(2, size=key_size)
+    send_key, recv_key, _ = sift(key, 2, flip_prob=1)
+    assert key_error_rate(send_key, recv_key) == 0
+
+
+def test_sniff_probability():
+    assert sniff_probability(1) == 0.8
+    assert sniff_probability(9) == 0
+    assert sniff_probability(-5) == 1
+
+
+class Peer:
+    """
+        End of a link without any runtime, the frames it sends wait in the inbox of the other end.
+    """
+
+    def __init__(self, host_id, inboxes):
+        self.host_id = host_id
+        self.inboxes = inboxes
+
+    def send_classical(self, receiver, content, await_ack=False):
+        self.inboxes[receiver].append(content)
+
+
+# The steps of both ends exchange a key by hand, each end runs until it needs a frame that is not there yet
+def test_steps_without_runtime():
+    inboxes = {'Alice': collections.deque(), 'Bob': collections.deque()}
+    alice, bob = Peer('Alice', inboxes), Peer('Bob', inboxes)
+    key = Key.random(2000)
+    bits, basis = prepare_states(key.bits())
+    measured, measured_basis, clicks = detect_states(bits, basis, None, len(key))
+    ends = {'Alice': send_steps(alice, key, 'Bob', basis), 'Bob': receive_steps(bob, len(key), 'Alice', measured,
+                                                                              measured_basis)}
+    frames = {name: None for name in ends}
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(100):
+            for name, steps in ends.items():
+                try:
+                    while name not in results and (frames[name] is None or inboxes[name]):
+                        frames[name] = steps.send(None if frames[name] is None else inboxes[name].popleft())
+                except StopIteration as stop:
+                    results[name] = stop.value
+    assert results['Alice'].key == results['Bob'].key and len(results['Alice'].key) == 13
+    assert results['Alice'].qber == results['Bob'].qber == 0
+
+
+# Callers of the hosts unpack the key and the detections of the link as before the LinkResult
+def test_unpack_key_and_eves():
+    results = {}
+    with NetworkSession(LINK) as session, contextlib.redirect_stdout(io.StringIO()):
+        hosts = session.host_name_dic
+        threads = [hosts['Alice'].run_protocol(lambda *args: results.update(alice=tuple(send_bb84(*args))),
+                                               (Key.random(2000), 'Bob', 'numpy')),
+                   hosts['Bob'].run_protocol(lambda *args: results.update(bob=tuple(receive_bb84(*args))),
+                                             (2000, 'Alice', 'numpy'))]
+        for thread in threads:
+            thread.join()
+    (send_key, send_eves), (recv_key, recv_eves) = results['alice'], results['bob']
+    assert send_key == recv_key and len(send_key) > 0
+    assert send_eves == recv_eves == 0
@@ -0,0 +1,69 @@
+########################################################################################################################
+# Copyright (c) Xiufan Li. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Author: Xiufan Li
+# Supervisor: Patrick Rebentrost
+# Institution: Centre for Quantum Technologies, National University of Singapore
+# For feedback, please contact Xiufan at: shenlongtianwu8@gmail.com.
+########################################################################################################################
+
+# !/usr/bin/env python3
+
+"""
+    Test of the benchmark runner and the regression comparison.
+"""
+
+import contextlib
+import io
+
+from qkd.qkd_bench import run, compare, random_topology, chain_topology, bench_relay, RELAY_MESSAGE
+from qkd.qkd_routing import k_shortest_paths
+
+
+def test_run_quick():
+    report = run(['trusted_xor', 'get_opt_path'], quick=True, repeat=1)
+    assert [(r['benchmark'], r['size']) for r in report['results']] == [('trusted_xor', 100), ('trusted_xor', 10000),
+                                                                       ('get_opt_path', 10), ('get_opt_path', 20)]
+    assert all(r['min'] > 0 and r['rate'] > 0 for r in report['results'])
+
+
+def test_compare():
+    old = {'results': [{'benchmark': 'a', 'size': 1, 'min': 1.0}, {'benchmark': 'b', 'size': 1, 'min': 1.0}]}
+    new = {'results': [{'benchmark': 'a', 'size': 1, 'min': 1.1}, {'benchmark': 'b', 'size': 1, 'min': 1.5},
+                       {'benchmark': 'c', 'size': 1, 'min': 1.0}]}
+    rows = compare(old, new, threshold=0.2)
+    assert [(r['benchmark'], r['regression']) for r in rows] == [('a', False), ('b', True)]
+
+
+def test_random_topology_connected():
+    graph = random_topology(30, seed=1)
+    assert next(k_shortest_paths(graph, 0, 29))[0] == 0
+
+
+def test_relay_chain():
+    from qkd import qkd_node
+    from qkd.qkd_network import NetworkSession
+
+    graph = chain_topology(3)
+    assert list(graph) == ['Sender', 'Trusted1', 'Trusted2', 'Trusted3', 'Receiver']
+    with NetworkSession(graph) as session, contextlib.redirect_stdout(io.StringIO()):
+        for concurrent in [False, True]:
+            qkd_node.CONCURRENT_KEYS = concurrent
+            try:
+                assert session.run_path(list(graph), RELAY_MESSAGE, 2000, 'numpy').message == RELAY_MESSAGE
+            finally:
+                qkd_node.CONCURRENT_KEYS = True
+            # The benchmark fails on a garbled message and restores the mode
+            assert bench_relay(session, concurrent, 2000) > 0
+            assert qkd_node.CONCURRENT_KEYS
@@ -0,0 +1,93 @@
+########################################################################################################################
+# Copyright (c) Xiufan Li. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Author: Xiufan Li
+# Supervisor: Patrick Rebentrost
+# Institution: Centre for Quantum Technologies, National University of Singapore
+# For feedback, please contact Xiufan at: shenlongtianwu8@gmail.com.
+########################################################################################################################
+
+# !/usr/bin/env python3
+
+"""
+    Test of the Cascade error correction.
+"""
+
+import asyncio
+
+import numpy as np
+
+from qkd.qkd_key import Key
+from qkd.qkd_cascade import cascade, block_size, ParityOracle, confirm, reconcile_host_steps, answer_host_steps
+from qkd.qkd_cascade import TAG_BITS
+from qkd.qkd_wire import encode_queries, decode_queries
+from qkd.qkd_async import AsyncNetwork, run_steps
+
+
+def noisy(key, qber):
+    return Key(key.bits() ^ (np.random.random(len(key)) < qber))
+
+
+def test_cascade_corrects_errors():
+    for length, qber in [(1000, 0.01), (100000, 0.05)]:
+        key = Key.random(length)
+        corrected, leaked, rounds = cascade(key, noisy(key, qber), qber)
+        assert corrected == key
+        assert leaked < length and rounds > 0
+
+
+def test_cascade_leakage_near_shannon_limit():
+    key = Key.random(100000)
+    corrected, leaked, rounds = cascade(key, noisy(key, 0.03), 0.03)
+    # h(0.03) = 0.194
+    assert corrected == key and leaked / 100000 < 0.3
+
+
+def test_matching_keys_leak_one_parity_per_block():
+    key = Key.random(1000)
+    corrected, leaked, rounds = cascade(key, key, 0.1, passes=2)
+    assert corrected == key
+    size = block_size(0.1, 1000)
+    assert leaked == -(-1000 // size) + -(-1000 // (2 * size))
+    assert rounds == 2
+
+
+def test_query_frame():
+    seed, passes, starts, ends = decode_queries(encode_queries(12, [0, 1], [0, 8], [8, 16]))
+    assert seed == 12 and passes.tolist() == [0, 1] and starts.tolist() == [0, 8] and ends.tolist() == [8, 16]
+    key = Key([1, 0, 1, 1])
+    assert ParityOracle(key)(0, [0, 0], [0, 1], [4, 3]).tolist() == [1, 1]
+
+
+def test_confirm():
+    key = Key.random(1000)
+    assert confirm(key, Key(key), seed=3)
+    assert not confirm(key, noisy(key, 0.01), seed=3)
+
+
+# Both ends of a link flag the keys that Cascade leaves different, here after one pass on a far too noisy key
+def test_confirmation_over_hosts():
+    graph = {'A': [['sender'], [0, 0], ['B']], 'B': [['receiver'], [0, 0], ['A']]}
+
+    async def link(key, received, passes):
+        network = AsyncNetwork(graph)
+        a, b = network.hosts['A'], network.hosts['B']
+        return await asyncio.gather(run_steps(b, reconcile_host_steps(b, 'A', received, 0.05, passes), 10),
+                                    run_steps(a, answer_host_steps(a, 'B', key), 10))
+
+    key = Key.random(1000)
+    (corrected, leaked, rounds, confirmed), (sent, accepted) = asyncio.run(link(key, noisy(key, 0.05), 4))
+    assert corrected == key and confirmed and accepted and leaked == sent
+    (corrected, leaked, rounds, confirmed), (sent, accepted) = asyncio.run(link(key, noisy(key, 0.3), 1))
+    assert corrected != key and not confirmed and not accepted and leaked == sent > TAG_BITS
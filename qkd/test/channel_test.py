@@ -0,0 +1,85 @@
+########################################################################################################################
+# Copyright (c) Xiufan Li. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Author: Xiufan Li
+# Supervisor: Patrick Rebentrost
+# Institution: Centre for Quantum Technologies, National University of Singapore
+# For feedback, please contact Xiufan at: shenlongtianwu8@gmail.com.
+########################################################################################################################
+
+# !/usr/bin/env python3
+
+"""
+    Test of the fiber channel model of the links.
+"""
+
+import contextlib
+import io
+
+import numpy as np
+import pytest
+
+from qkd.qkd_channel import FiberChannel, FiberLink
+from qkd.qkd_BB84 import bb84_exchange
+from qkd.qkd_bench import chain_topology
+from qkd.qkd_des import SimNetwork
+from qkd.qkd_network import NetworkSession
+
+msg = "Hey, are you nervous for the presentation??"
+
+
+def test_link_figures():
+    graph = chain_topology(1)
+    channel = FiberChannel(graph, lengths={('Trusted1', 'Sender'): 50})
+    assert channel.length('Sender', 'Trusted1') == 50
+    # Neighbours of chain_topology are 0.01 degree of longitude apart
+    assert channel.length('Trusted1', 'Receiver') == pytest.approx(1.112, abs=1e-3)
+    figures = channel.figures('Sender', 'Trusted1')
+    assert figures['transmittance'] == pytest.approx(0.01)
+    assert figures['delay'] == pytest.approx(50 * 4.897e-6, rel=1e-3)
+    assert figures['sifted_rate'] == pytest.approx(1e6 * (1 - 0.99 * (1 - 1e-6)) / 2)
+    assert len(channel.summary()) == 2
+
+
+def test_transmit_statistics():
+    size = 200000
+    link = FiberLink(10, detector_efficiency=1, dark_count=0.01, misalignment=0.05)
+    bits = np.random.randint(2, size=size).astype(np.uint8)
+    received, basis, clicks = link.transmit(bits, np.zeros(size, dtype=np.uint8))
+    assert abs(clicks.mean() - link.click_probability) < 0.005
+    assert abs((received != bits)[clicks].mean() - link.qber) < 0.005
+
+
+def test_exchange_keeps_detected_qubits():
+    link = FiberLink(25)
+    sender_key, key, error_rate = bb84_exchange(100000, link=link)
+    # Half of the detected qubits are sifted and a quarter of those revealed
+    assert abs(len(key) / (100000 * link.click_probability * 0.5 * 0.75) - 1) < 0.1
+    assert error_rate < 4
+
+
+def test_runtimes_through_fibers():
+    graph = chain_topology(2)
+    channel = FiberChannel(graph, lengths={('Sender', 'Trusted1'): 100}, detector_efficiency=1, dark_count=0,
+                           misalignment=0)
+    network = SimNetwork(graph, channel=channel)
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert network.run(network.run_path(list(graph), msg, 100000)).message == msg
+    # The qubits leave the source at 1 MHz, and go through 100 km of fiber on the first link
+    assert network.sim_time > 0.1 + 100 * 4.897e-6
+
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out), NetworkSession(graph, channel) as session:
+        session.run_path(list(graph), msg, 100000, 'numpy')
+    assert "Receiver decrypts the message: " + msg + "\n" in out.getvalue()
@@ -0,0 +1,77 @@
+########################################################################################################################
+# Copyright (c) Xiufan Li. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Author: Xiufan Li
+# Supervisor: Patrick Rebentrost
+# Institution: Centre for Quantum Technologies, National University of Singapore
+# For feedback, please contact Xiufan at: shenlongtianwu8@gmail.com.
+########################################################################################################################
+
+# !/usr/bin/env python3
+
+"""
+    Test of the cipher modes of the cryptographic module.
+"""
+
+import io
+import pytest
+
+from qkd.qkd_key import Key
+from qkd.qkd_crypto import OneTimePad, encrypt_msg, decrypt_msg, iter_chunks, encode_msg, decode_msg
+
+message = "Hey, are you nervous for the presentation?? ü"
+
+
+def test_xor_mode_uses_first_key_byte():
+    key = Key([0, 1, 1, 0, 0, 0, 0, 1, 1, 0, 1])
+    encrypted_msg = encrypt_msg(key, message)
+    assert encrypted_msg == ''.join(chr(0x61 ^ ord(c)) for c in message)
+    assert decrypt_msg(key, encrypted_msg) == message
+    # The bytes after the first one are not used
+    long_key = key[:8] + Key.random(100)
+    assert encrypt_msg(long_key, message) == encrypted_msg
+    assert decrypt_msg(long_key, encrypted_msg) == message
+
+
+def test_xor_mode_needs_key_byte():
+    with pytest.raises(ValueError, match='shorter than the byte'):
+        encrypt_msg(Key([0, 1, 1, 0, 0, 0, 0]), message)
+    with pytest.raises(ValueError, match='shorter than the byte'):
+        decrypt_msg(Key([]), message)
+
+
+
+def test_dropped_message_frame():
+    assert decode_msg(encode_msg(message)) == message
+    assert decode_msg(encode_msg(None)) is None
+    assert decode_msg(encode_msg('')) == ''
+
+
+def test_otp_mode_consumes_key():
+    pad = OneTimePad(Key.random(8 * 100))
+    encrypt_msg(pad, message, mode='otp')
+    size = len(message.encode())
+    assert pad.used == size and pad.remaining == 100 - size
+    with pytest.raises(ValueError):
+        encrypt_msg(pad, message * 2, mode='otp')
+
+
+def test_otp_stream():
+    key = Key.random(8 * 3000)
+    data = bytes(range(256)) * 10
+    encrypted = b''.join(OneTimePad(key).encrypt_stream(iter_chunks(io.BytesIO(data), 100)))
+    assert encrypted != data
+    assert b''.join(OneTimePad(key).decrypt_stream([encrypted[:7], encrypted[7:]])) == data
+    with pytest.raises(ValueError):
+        next(OneTimePad(key).encrypt_stream([data], size=4000))
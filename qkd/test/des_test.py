@@ -0,0 +1,69 @@
+########################################################################################################################
+# Copyright (c) Xiufan Li. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Author: Xiufan Li
+# Supervisor: Patrick Rebentrost
+# Institution: Centre for Quantum Technologies, National University of Singapore
+# For feedback, please contact Xiufan at: shenlongtianwu8@gmail.com.
+########################################################################################################################
+
+# !/usr/bin/env python3
+
+"""
+    Test of the discrete-event simulation on the virtual clock.
+"""
+
+import pytest
+
+from qkd.qkd_bench import chain_topology
+from qkd.qkd_des import SimNetwork, LinkLatency, DeadlockError
+
+msg = "Hey, are you nervous for the presentation??"
+
+
+def test_simulated_time_not_waited():
+    graph = chain_topology(3)
+    network = SimNetwork(graph, LinkLatency(delay=4))
+    assert network.run(network.run_path(list(graph), msg, 2000)).message == msg
+    # The message alone takes 4 hops of 4 s after the keys, and none of it is waited on the wall clock
+    assert network.sim_time > 16
+    assert network.wall_time < 2
+    first = network.clock
+    assert network.run(network.run_path(list(graph), msg, 2000)).message == msg
+    assert network.clock == pytest.approx(first + network.sim_time)
+
+
+def test_latency_of_link():
+    latency = LinkLatency(delay=1e-3, bandwidth=8e6, qubit_rate=1e6)
+    assert latency('a', 'b', 'classical', 1000) == pytest.approx(2e-3)
+    assert latency('a', 'b', 'quantum', 1000) == pytest.approx(2e-3)
+
+
+def test_lost_qubits_time_out():
+    graph = chain_topology(1)
+    network = SimNetwork(graph, loss=1.0)
+    with pytest.raises(TimeoutError):
+        network.run(network.run_path(list(graph), msg, 200))
+    # The protocol waits 10 s for the qubits, in simulated time
+    assert network.sim_time == pytest.approx(10)
+    assert network.lost > 0 and network.wall_time < 2
+
+
+def test_deadlock_detected():
+    network = SimNetwork(chain_topology(1))
+
+    async def wait_forever():
+        return await network.hosts['Receiver'].get_next_classical('Sender')
+    with pytest.raises(DeadlockError):
+        network.run(wait_forever())
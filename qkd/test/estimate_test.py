@@ -0,0 +1,62 @@
+########################################################################################################################
+# Copyright (c) Xiufan Li. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Author: Xiufan Li
+# Supervisor: Patrick Rebentrost
+# Institution: Centre for Quantum Technologies, National University of Singapore
+# For feedback, please contact Xiufan at: shenlongtianwu8@gmail.com.
+########################################################################################################################
+
+# !/usr/bin/env python3
+
+"""
+    Test of the sampled parameter estimation.
+"""
+
+import numpy as np
+
+from qkd.qkd_key import Key
+from qkd.qkd_estimate import sample_mask, sample_size, qber_bound, estimate
+from qkd.qkd_BB84 import bb84_exchange, sniff_probability
+from qkd.qkd_wire import encode_sample, decode_sample
+
+
+def test_sample_mask_shared_by_seed():
+    mask = sample_mask(1000, seed=7)
+    assert mask.sum() == sample_size(1000) == 250
+    assert np.array_equal(mask, sample_mask(1000, seed=7))
+    assert sample_size(1) == 1 and sample_size(0) == 0
+
+
+def test_estimate_keeps_unrevealed_bits():
+    key = Key.random(4000)
+    send_key, recv_key, error_rate, bound = estimate(key, key, seed=1)
+    assert len(send_key) == 3000 and send_key == recv_key
+    assert error_rate == 0 and 0 < bound < 10
+
+
+def test_qber_bound():
+    assert qber_bound(10, 0) == 100
+    assert qber_bound(10, 10 ** 6) < qber_bound(10, 10 ** 3)
+
+
+def test_exchange_estimates_qber():
+    send_key, recv_key, error_rate = bb84_exchange(200000, sniffers=1)
+    assert abs(len(send_key) - 75000) < 1500
+    assert abs(error_rate - sniff_probability() / 2 * 100) < 1.5
+
+
+def test_sample_frame():
+    sample = Key.random(77)
+    assert decode_sample(encode_sample(2 ** 61 + 5, sample)) == (2 ** 61 + 5, sample)
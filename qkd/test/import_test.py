@@ -0,0 +1,63 @@
+########################################################################################################################
+# Copyright (c) Xiufan Li. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Author: Xiufan Li
+# Supervisor: Patrick Rebentrost
+# Institution: Centre for Quantum Technologies, National University of Singapore
+# For feedback, please contact Xiufan at: shenlongtianwu8@gmail.com.
+########################################################################################################################
+
+# !/usr/bin/env python3
+
+"""
+    Test of the import-time budget: the package and the vectorized engines load no heavy dependency.
+"""
+
+import subprocess
+import sys
+
+import pytest
+
+# Seconds allowed for 'import qkd' and the vectorized engines in a fresh interpreter
+IMPORT_BUDGET = 0.5
+HEAVY = ['qunetsim', 'networkx', 'matplotlib']
+
+SCRIPT = '''
+import sys, time
+t = time.perf_counter()
+import qkd
+import qkd.qkd_BB84, qkd.qkd_B92, qkd.qkd_pool, qkd.qkd_sweep, qkd.qkd_protocol
+t = time.perf_counter() - t
+print(t)
+print(' '.join(m for m in %r if m in sys.modules))
+'''
+
+
+def run(script):
+    out = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True).stdout
+    return out.split('\n')
+
+
+def test_no_heavy_imports():
+    elapsed, loaded = run(SCRIPT % (HEAVY,))[:2]
+    assert loaded == ''
+    assert float(elapsed) < IMPORT_BUDGET
+
+
+def test_lazy_exports():
+    out = run('import qkd, sys; qkd.Key; print("qunetsim" in sys.modules); qkd.QKD; print(qkd.QKD.__module__)')
+    assert out[:2] == ['False', 'qkd.qkd_protocol']
+    with pytest.raises(AttributeError):
+        import qkd
+        qkd.missing
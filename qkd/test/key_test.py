@@ -0,0 +1,58 @@
+########################################################################################################################
+# Copyright (c) Xiufan Li. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Author: Xiufan Li
+# Supervisor: Patrick Rebentrost
+# Institution: Centre for Quantum Technologies, National University of Singapore
+# For feedback, please contact Xiufan at: shenlongtianwu8@gmail.com.
+########################################################################################################################
+
+# !/usr/bin/env python3
+
+"""
+    Test of the bit-packed key.
+"""
+
+import numpy as np
+import pytest
+
+from qkd.qkd_key import Key
+
+
+def test_slicing_and_sifting():
+    bits = np.random.randint(2, size=1003)
+    key = Key(bits)
+    assert len(key) == 1003 and key.tolist() == bits.tolist()
+    assert key[8:803].tolist() == bits[8:803].tolist()
+    assert key[3:500:3].tolist() == bits[3:500:3].tolist()
+    assert key[-1] == bits[-1]
+    mask = np.random.randint(2, size=1003)
+    assert key.sift(mask).tolist() == bits[mask.astype(bool)].tolist()
+    assert (key[:13] + key[13:]) == key
+
+
+def test_xor_and_hamming():
+    a, b = Key.random(999), Key.random(999)
+    assert (a ^ b).tolist() == (a.bits() ^ b.bits()).tolist()
+    assert a.hamming(b) == np.count_nonzero(a.bits() != b.bits())
+    assert a.hamming(a) == 0
+    with pytest.raises(ValueError):
+        a ^ b[:10]
+
+
+def test_bytes():
+    key = Key([0, 1, 0, 0, 0, 0, 0, 1, 1])
+    assert key.to_bytes() == b'A\x80'
+    assert Key.from_bytes(key.to_bytes(), 9) == key
+    assert Key.from_bytes(b'\xff', 3).to_bytes() == b'\xe0'
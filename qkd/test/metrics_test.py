@@ -0,0 +1,51 @@
+########################################################################################################################
+# Copyright (c) Xiufan Li. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Author: Xiufan Li
+# Supervisor: Patrick Rebentrost
+# Institution: Centre for Quantum Technologies, National University of Singapore
+# For feedback, please contact Xiufan at: shenlongtianwu8@gmail.com.
+########################################################################################################################
+
+# !/usr/bin/env python3
+
+"""
+    Test of the spans and counters of qkd_metrics.
+"""
+
+import json
+
+from qkd import qkd_metrics
+from qkd.qkd_metrics import span, count, count_message, recording, snapshot, to_json, to_prometheus
+
+
+def test_disabled_records_nothing():
+    qkd_metrics.reset()
+    with span('bb84.sift', 'Alice', 'Bob'):
+        count('qubits_sent', 10, 'Alice', 'Bob')
+    assert snapshot() == {'spans': [], 'counters': []}
+
+
+def test_recording():
+    with recording():
+        for _ in range(2):
+            with span('bb84.sift', 'Alice', 'Bob'):
+                count_message('Alice', 'Bob', b'1234')
+        data = json.loads(to_json())
+        text = to_prometheus()
+    assert not qkd_metrics.ENABLED
+    assert data['spans'][0]['phase'] == 'bb84.sift' and data['spans'][0]['count'] == 2
+    assert {(c['name'], c['value']) for c in data['counters']} == {('classical_messages', 2), ('classical_bytes', 8)}
+    assert 'qkd_phase_count_total{phase="bb84.sift",host="Alice",peer="Bob"} 2' in text
+    assert 'qkd_classical_bytes_total{host="Alice",peer="Bob"} 8' in text
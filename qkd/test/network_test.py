@@ -0,0 +1,83 @@
+########################################################################################################################
+# Copyright (c) Xiufan Li. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Author: Xiufan Li
+# Supervisor: Patrick Rebentrost
+# Institution: Centre for Quantum Technologies, National University of Singapore
+# For feedback, please contact Xiufan at: shenlongtianwu8@gmail.com.
+########################################################################################################################
+
+# !/usr/bin/env python3
+
+"""
+    Test of the network session reused by several paths.
+"""
+
+import contextlib
+import io
+
+from qkd.qkd_network import NetworkSession, get_opt_path
+from qkd.qkd_protocol import QKD
+from qkd.qkd_topology import TOPOLOGIES
+from qkd.qkd_BB84 import MIN_SECRET_BITS
+
+# Two paths of two links from the sender to the receiver
+GRAPH = {'Sender': [['sender'], [103.68, 1.34], ['Upper', 'Lower']],
+         'Upper': [['truster'], [103.78, 1.36], ['Sender', 'Receiver']],
+         'Lower': [['truster'], [103.78, 1.28], ['Sender', 'Receiver']],
+         'Receiver': [['receiver'], [103.96, 1.34], ['Upper', 'Lower']]}
+
+
+def test_paths_on_one_session():
+    msg = "Hey, are you nervous for the presentation??"
+    first, second = get_opt_path(GRAPH)[1]
+    with NetworkSession(GRAPH) as session, contextlib.redirect_stdout(io.StringIO()):
+        assert session.run_path(first, msg, 500).message == msg
+        assert session.run_path(second, msg, 2000, 'numpy').message == msg
+        assert session.runs == 2
+        # Every run leaves the storages of the hosts empty for the next one
+        for host in session.host_name_dic.values():
+            assert host.classical == []
+            assert host.qubit_storage.amount_qubits_stored == 0
+
+
+def test_reset():
+    with NetworkSession(GRAPH) as session:
+        sender, upper = session.host_name_dic['Sender'], session.host_name_dic['Upper']
+        sender.send_classical('Upper', "stale", await_ack=True)
+        assert [m.content for m in upper.classical] == ["stale"]
+        session.reset()
+        assert upper.classical == [] and session.runs == 0
+
+
+# The key size of the demo in BB84_main/main.py distills a secret key on every link, the path through the spier is
+# detected
+def test_demo_key_size():
+    msg = "Hey, are you nervous for the presentation??"
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = QKD(TOPOLOGIES['nqsn'], msg, 500, 'numpy')
+    spied, safe = sorted(results, key=lambda result: 'Darren' not in result.path)
+    assert spied.eves
+    assert not safe.eves and safe.message == msg
+    assert all(link.secret_bits >= MIN_SECRET_BITS for link in safe.links)
+
+
+# Links without a byte of secret key keep no key and drop the message instead of hanging the relay
+def test_short_key_drops_message():
+    first = get_opt_path(GRAPH)[1][0]
+    with NetworkSession(GRAPH) as session, contextlib.redirect_stdout(io.StringIO()):
+        result = session.run_path(first, "Hey", 60, 'numpy')
+    assert result.message is None
+    for link in result.links:
+        assert link.eves == 1 and len(link.key) == 0 and link.secret_bits == 0
@@ -0,0 +1,45 @@
+########################################################################################################################
+# Copyright (c) Xiufan Li. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Author: Xiufan Li
+# Supervisor: Patrick Rebentrost
+# Institution: Centre for Quantum Technologies, National University of Singapore
+# For feedback, please contact Xiufan at: shenlongtianwu8@gmail.com.
+########################################################################################################################
+
+# !/usr/bin/env python3
+
+"""
+    Test of the headless topology rendering.
+"""
+
+import os
+
+from qkd.qkd_network import get_opt_path
+from qkd.qkd_plot import draw_topology
+
+GRAPH = {'Ani': [['sender'], [103.68, 1.34], ['Arya']],
+         'Arya': [['truster'], [103.77, 1.30], ['Xiufan']],
+         'Xiufan': [['receiver'], [103.84, 1.37], []]}
+
+
+def test_headless_path():
+    PATH, OPT_PATH = get_opt_path(GRAPH)
+    assert OPT_PATH == [['Ani', 'Arya', 'Xiufan']]
+
+
+def test_save_topology(tmp_path):
+    filename = str(tmp_path / 'topology.png')
+    draw_topology(GRAPH, filename=filename, background=True).join()
+    assert os.path.getsize(filename) > 0
@@ -0,0 +1,73 @@
+########################################################################################################################
+# Copyright (c) Xiufan Li. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Author: Xiufan Li
+# Supervisor: Patrick Rebentrost
+# Institution: Centre for Quantum Technologies, National University of Singapore
+# For feedback, please contact Xiufan at: shenlongtianwu8@gmail.com.
+########################################################################################################################
+
+# !/usr/bin/env python3
+
+"""
+    Test of the per-link key pool.
+"""
+
+import time
+
+import pytest
+
+from qkd.qkd_key import Key
+from qkd.qkd_pool import KeyBuffer, KeyPool, path_links
+
+graph = {'Ani': [['sender'], [0, 0], ['Arya']],
+         'Arya': [['truster'], [0, 0], ['Ani', 'Darren']],
+         'Darren': [['spier'], [0, 0], ['Xiufan']],
+         'Xiufan': [['receiver'], [0, 0], ['Darren']]}
+
+
+def test_path_links():
+    assert path_links(graph, ['Ani', 'Arya', 'Darren', 'Xiufan']) == [('Ani', 'Arya', 0), ('Arya', 'Xiufan', 1)]
+
+
+def test_both_ends_draw_the_same_key():
+    buffer = KeyBuffer('Ani', 'Arya', low=10, high=100)
+    key = Key.random(60)
+    buffer.put(key, key)
+    assert buffer.draw('Ani', 13) == key[:13]
+    assert buffer.draw('Ani', 13) == key[13:26]
+    assert buffer.draw('Arya', 13) == key[:13]
+    assert buffer.level == 34
+    with pytest.raises(TimeoutError):
+        buffer.draw('Arya', 50, timeout=0.01)
+
+
+def test_pool_refills_to_high_watermark():
+    with KeyPool(graph, ['Ani', 'Arya'], low=1000, high=5000, batch_size=1000) as pool:
+        assert pool.draw('Arya', 'Ani', 4000, timeout=5) == pool.draw('Ani', 'Arya', 4000, timeout=5)
+        metrics = pool.metrics()[('Ani', 'Arya')]
+        assert metrics['generated'] >= 4000 and metrics['refill_rate'] > 0
+
+
+def test_draw_above_level_refills():
+    with KeyPool(graph, ['Ani', 'Arya'], low=100, high=5000, batch_size=2000) as pool:
+        buffer = pool.buffer('Ani', 'Arya')
+        assert buffer.draw('Ani', 4000, timeout=5) == buffer.draw('Arya', 4000, timeout=5)
+        # Once the buffer is full again, the next draw leaves it above the low watermark but short of the draw after
+        for _ in range(500):
+            if buffer.level >= buffer.high:
+                break
+            time.sleep(0.01)
+        for _ in range(2):
+            assert buffer.draw('Ani', 4000, timeout=5) == buffer.draw('Arya', 4000, timeout=5)
@@ -0,0 +1,63 @@
+########################################################################################################################
+# Copyright (c) Xiufan Li. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Author: Xiufan Li
+# Supervisor: Patrick Rebentrost
+# Institution: Centre for Quantum Technologies, National University of Singapore
+# For feedback, please contact Xiufan at: shenlongtianwu8@gmail.com.
+########################################################################################################################
+
+# !/usr/bin/env python3
+
+"""
+    Test of the Toeplitz privacy amplification.
+"""
+
+import numpy as np
+
+import qkd.qkd_privacy as privacy
+from qkd.qkd_key import Key
+from qkd.qkd_privacy import toeplitz_hash, toeplitz_bits, secret_length, amplify, entropy
+from qkd.qkd_wire import encode_seed, decode_seed
+
+
+# O(n m) product with the explicit matrix
+def toeplitz_product(key, seed, length):
+    x = key.bits().astype(np.int64)
+    n = len(x)
+    t = toeplitz_bits(seed, length, n).astype(np.int64)
+    return Key((t[np.arange(length)[:, None] - np.arange(n)[None, :] + n - 1] @ x) & 1)
+
+
+def test_fft_hash_matches_matrix_product(monkeypatch):
+    for n, length in [(1, 1), (10, 3), (3, 10), (777, 500)]:
+        key = Key.random(n)
+        assert toeplitz_hash(key, 5, length) == toeplitz_product(key, 5, length)
+    monkeypatch.setattr(privacy, 'BLOCK', 64)
+    key = Key.random(777)
+    assert toeplitz_hash(key, 5, 500) == toeplitz_product(key, 5, 500)
+
+
+def test_secret_length():
+    assert secret_length(1000, 0, 0) == 1000 - 20
+    assert secret_length(1000, 0.05, 100) == int(1000 * (1 - entropy(0.05)) - 100 - 2 * np.log2(1000))
+    assert secret_length(1000, 0.5, 0) == 0 and secret_length(10, 0, 20) == 0
+
+
+def test_amplify_matching_keys():
+    key = Key.random(100000)
+    sender_key, receiver_key = amplify(key, key, 0.02, 5000)
+    assert sender_key == receiver_key and len(sender_key) == secret_length(100000, 0.02, 5000)
+    assert abs(sender_key.popcount() / len(sender_key) - 0.5) < 0.01
+    assert decode_seed(encode_seed(2 ** 62, 12345)) == (2 ** 62, 12345)
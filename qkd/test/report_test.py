@@ -0,0 +1,77 @@
+########################################################################################################################
+# Copyright (c) Xiufan Li. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Author: Xiufan Li
+# Supervisor: Patrick Rebentrost
+# Institution: Centre for Quantum Technologies, National University of Singapore
+# For feedback, please contact Xiufan at: shenlongtianwu8@gmail.com.
+########################################################################################################################
+
+# !/usr/bin/env python3
+
+"""
+    Test of the link and path results and of their summary over repeated runs.
+"""
+
+import asyncio
+import contextlib
+import io
+
+import pytest
+
+from qkd.qkd_async import AsyncNetwork
+from qkd.qkd_bench import chain_topology
+from qkd.qkd_report import LinkResult, PathResult, summarize, format_summary
+
+
+def test_path_rate_is_bottleneck():
+    fast = LinkResult('A', 'B', 'bb84', None, 1000, 500, 1.0, 200, 0.5)
+    slow = LinkResult('B', 'C', 'bb84', None, 1000, 480, 3.0, 150, 1.5)
+    result = PathResult(['A', 'B', 'C'], [fast, slow], 'Hi', 2.0)
+    assert fast.sifted_rate == 1000 and fast.secret_rate == 400
+    assert result.secret_rate == 100 and result.bottleneck is slow
+    assert result.qber == 3.0 and result.secret_bits == 150
+
+
+def test_link_unpacks_to_key_and_eves():
+    key, eves = LinkResult('A', 'B', 'bb84', '0110', 100, 50, 12.0, 0, 1.0, eves=1)
+    assert key == '0110' and eves == 1
+
+
+def test_summarize_links():
+    runs = [LinkResult('A', 'B', 'b92', None, 100, 20, 0.0, 10, 1.0),
+            LinkResult('A', 'B', 'b92', None, 100, 30, 20.0, 0, 1.0, eves=1)]
+    row, = summarize(runs)
+    assert row['link'] == ('A', 'B') and row['runs'] == 2 and row['detected'] == 1
+    assert row['sifted_bits'] == 25 and row['sifted_bits_std'] == 5
+    assert row['qber'] == 10 and row['qber_std'] == 10
+    assert 'A - B' in format_summary([row])
+
+
+def test_async_run_path():
+    graph = chain_topology(2)
+    path = list(graph)
+    network = AsyncNetwork(graph)
+
+    async def main():
+        return [await network.run_path(path, "Hello", 500) for _ in range(2)]
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = asyncio.run(main())
+    for result in results:
+        assert result.message == "Hello"
+        assert [(link.peer, link.host) for link in result.links] == list(zip(path, path[1:]))
+        assert all(link.qubits == 500 and link.secret_bits > 0 for link in result.links)
+        assert result.secret_rate == pytest.approx(min(link.secret_rate for link in result.links))
+    row, = summarize(results)
+    assert row['path'] == tuple(path) and row['runs'] == 2 and row['secret_rate'] > 0
@@ -0,0 +1,77 @@
+########################################################################################################################
+# Copyright (c) Xiufan Li. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Author: Xiufan Li
+# Supervisor: Patrick Rebentrost
+# Institution: Centre for Quantum Technologies, National University of Singapore
+# For feedback, please contact Xiufan at: shenlongtianwu8@gmail.com.
+########################################################################################################################
+
+# !/usr/bin/env python3
+
+"""
+    Test of the k-shortest paths routing.
+"""
+
+import random
+
+import networkx as nx
+
+from qkd.qkd_routing import k_shortest_paths, shortest_paths, haversine
+
+
+def random_graph(n, p, seed):
+    rng = random.Random(seed)
+    graph = {i: [['truster'], [103.6 + rng.random() / 2, 1.2 + rng.random() / 4], []] for i in range(n)}
+    graph[0][0] = ['sender']
+    graph[n - 1][0] = ['receiver']
+    for u in range(n):
+        for v in range(u + 1, n):
+            if rng.random() < p:
+                graph[u][2].append(v)
+    return graph
+
+
+def test_paths_match_networkx():
+    for seed in range(5):
+        graph = random_graph(12, 0.3, seed)
+        G = nx.Graph([(u, v) for u in graph for v in graph[u][2]])
+        G.add_nodes_from(graph)
+        expected = sorted(len(p) for p in nx.all_simple_paths(G, 0, 11))
+        paths = list(k_shortest_paths(graph, 0, 11))
+        assert [len(p) for p in paths] == expected
+        assert len({tuple(p) for p in paths}) == len(paths)
+
+
+def test_distance_weight():
+    graph = random_graph(12, 0.3, 1)
+    paths = shortest_paths(graph, 0, 11, k=4, weight='distance')
+    costs = [sum(haversine(graph[p[i]][1], graph[p[i + 1]][1]) for i in range(len(p) - 1)) for p in paths]
+    assert costs == sorted(costs)
+
+
+def test_qber_weight_avoids_spied_link():
+    graph = {'Ani': [['sender'], [0, 0], ['Arya']],
+             'Arya': [['truster'], [0, 0], ['Ani', 'Darren', 'Nayan']],
+             'Darren': [['spier'], [0, 0], ['Xiufan']],
+             'Nayan': [['truster'], [0, 0], ['Arya', 'Xiufan']],
+             'Xiufan': [['receiver'], [0, 0], ['Nayan']]}
+    assert shortest_paths(graph, 'Ani', 'Xiufan', k=1)[0] == ['Ani', 'Arya', 'Darren', 'Xiufan']
+    qber = {('Darren', 'Xiufan'): 40.0}
+    assert shortest_paths(graph, 'Ani', 'Xiufan', k=1, weight='qber', qber=qber)[0] == ['Ani', 'Arya', 'Nayan', 'Xiufan']
+
+
+def test_large_topology():
+    graph = random_graph(200, 0.03, 7)
+    assert len(shortest_paths(graph, 0, 199, k=10)) == 10
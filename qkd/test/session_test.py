@@ -0,0 +1,86 @@
+########################################################################################################################
+# Copyright (c) Xiufan Li. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Author: Xiufan Li
+# Supervisor: Patrick Rebentrost
+# Institution: Centre for Quantum Technologies, National University of Singapore
+# For feedback, please contact Xiufan at: shenlongtianwu8@gmail.com.
+########################################################################################################################
+
+# !/usr/bin/env python3
+
+"""
+    Test of the long-lived session relaying a stream of messages over trusted nodes.
+"""
+
+import queue
+
+import pytest
+
+from qkd.qkd_bench import chain_topology
+from qkd.qkd_session import QKDSession
+
+
+def test_relay_stream():
+    messages = ["telemetry " + str(i) + ": é" for i in range(50)] + [b'\x00\xff' * 3000, b'', '']
+    with QKDSession(chain_topology(2), high=1 << 14, batch_size=1 << 12) as session:
+        assert list(session.relay(iter(messages))) == messages
+        assert session.send("one more") == "one more"
+
+        inbox = queue.Queue()
+        for message in ["a", "b", None]:
+            inbox.put(message)
+        assert list(session.relay(inbox)) == ["a", "b"]
+
+        metrics = session.metrics()
+        assert metrics['submitted'] == metrics['delivered'] == len(messages) + 3
+        # Both ends of a link drew the same key, and the pads keep it until it is used up
+        assert all(a.drawn == b.drawn for a, b in session._pads)
+        assert all(drawn < 8 * 7000 + 3 * 4096 for drawn in metrics['drawn'].values())
+    assert not session.is_open
+
+
+def test_relay_window():
+    window = 2
+    in_flight = []
+    with QKDSession(chain_topology(1), high=1 << 14, batch_size=1 << 12) as session:
+        before = [session.submit("before " + str(i)) for i in range(5)]
+
+        # Messages of the relay on the way when the next one is read, the messages submitted before never
+        # open the window
+        def messages():
+            for i in range(20):
+                in_flight.append(i - max(0, session.delivered - len(before)))
+                yield "message " + str(i)
+        out = list(session.relay(messages(), window))
+    assert out == ["before " + str(i) for i in range(5)] + ["message " + str(i) for i in range(20)]
+    assert max(in_flight) <= window
+
+
+def test_relay_stopped_early():
+    with QKDSession(chain_topology(2), high=1 << 14, batch_size=1 << 12) as session:
+        stream = session.relay(("first " + str(i) for i in range(50)), window=4)
+        assert [next(stream) for _ in range(3)] == ["first 0", "first 1", "first 2"]
+        stream.close()
+        # The next relays drop the messages still on the way and stop at their own mark
+        assert session.send("second") == "second"
+        assert list(session.relay(["third", "fourth"])) == ["third", "fourth"]
+        # The dropped messages are not delivered
+        assert session.delivered == 6 < session.submitted
+
+
+def test_closed_session():
+    session = QKDSession(chain_topology(1))
+    with pytest.raises(RuntimeError):
+        session.submit("hello")
@@ -0,0 +1,82 @@
+########################################################################################################################
+# Copyright (c) Xiufan Li. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Author: Xiufan Li
+# Supervisor: Patrick Rebentrost
+# Institution: Centre for Quantum Technologies, National University of Singapore
+# For feedback, please contact Xiufan at: shenlongtianwu8@gmail.com.
+########################################################################################################################
+
+# !/usr/bin/env python3
+
+"""
+    Test of the Monte Carlo sweep runner on a process pool.
+"""
+
+import contextlib
+import csv
+import io
+import random
+
+import numpy as np
+
+from qkd.qkd_BB84 import bb84_exchange
+from qkd.qkd_cascade import TAG_BITS
+from qkd.qkd_sweep import COLUMNS, METRICS, expand_grid, sweep, main, run_scenario
+
+
+def test_expand_grid():
+    scenarios = expand_grid({'protocol': ['bb84', 'b92'], 'key_size': [500, 1000]})
+    assert len(scenarios) == 4
+    assert {(s['protocol'], s['key_size']) for s in scenarios} == {('bb84', 500), ('bb84', 1000),
+                                                                    ('b92', 500), ('b92', 1000)}
+    assert all(s['topology'] == 'nqsn' and s['attack'] == 'bit_flip' for s in scenarios)
+
+
+def test_sweep_on_pool():
+    grid = {'protocol': ['bb84', 'b92'], 'topology': ['direct'], 'attack': ['bit_flip', 'intercept_resend'],
+            'eavesdropper_number': [0]}
+    table = sweep(grid, repeats=3, workers=2)
+    assert len(table) == 4
+    for row in table:
+        assert set(row) == set(COLUMNS + ['runs'] + METRICS)
+        assert row['runs'] == 3 and row['final_key_length'] > 0
+        # The direct link has no spier, so the attacks never run
+        assert row['qber'] == 0 and row['detection_rate'] == 0
+    # The same seed gives the same table on any number of workers
+    assert [r['qber'] for r in table] == [r['qber'] for r in sweep(grid, repeats=3, workers=1)]
+
+
+# The final key is what is left after the error correction and the privacy amplification of the sampled key
+def test_final_key_is_secret():
+    params = expand_grid({'topology': ['direct']})[0]
+    np.random.seed(7)
+    random.seed(7)
+    sampled = len(bb84_exchange(params['key_size'], attacks=[])[0])
+    assert 0 < run_scenario(params, 7)['final_key_length'] < sampled - TAG_BITS
+    # Links at or above the error rate threshold are aborted
+    aborted = run_scenario(dict(params, error_rate=0), 7)
+    assert aborted['detected'] and aborted['final_key_length'] == 0
+
+
+def test_cli(tmp_path):
+    out = tmp_path / 'table.csv'
+    with contextlib.redirect_stdout(io.StringIO()) as stdout:
+        table = main(['--topology', 'spied', '--eavesdropper-number', '4', '--repeats', '2', '--workers', '2',
+                      '--out', str(out)])
+    assert 'detection_rate' in stdout.getvalue()
+    rows = list(csv.DictReader(out.open()))
+    assert len(rows) == len(table) == 1
+    # The spier flips with probability 0.5 at eavesdropper number 4, far above the error rate
+    assert float(rows[0]['qber']) > 10 and float(rows[0]['detection_rate']) == 1
@@ -0,0 +1,66 @@
+########################################################################################################################
+# Copyright (c) Xiufan Li. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Author: Xiufan Li
+# Supervisor: Patrick Rebentrost
+# Institution: Centre for Quantum Technologies, National University of Singapore
+# For feedback, please contact Xiufan at: shenlongtianwu8@gmail.com.
+########################################################################################################################
+
+# !/usr/bin/env python3
+
+"""
+    Test of the bulk file transfer over a QKD session.
+"""
+
+import os
+
+import pytest
+
+from qkd.qkd_bench import chain_topology
+from qkd.qkd_session import QKDSession
+from qkd.qkd_transfer import StreamPad, send_file, transfer_file, file_chunks
+
+
+def test_send_file(tmp_path):
+    source = tmp_path / 'source.bin'
+    target = tmp_path / 'target.bin'
+    data = os.urandom(3 * (1 << 16) + 1234)
+    source.write_bytes(data)
+    stats = send_file(chain_topology(2), str(source), str(target), chunk_size=1 << 16, window=2,
+                      high=1 << 14, batch_size=1 << 12)
+    assert target.read_bytes() == data
+    assert stats['bytes'] == len(data) and stats['chunks'] == 4 and stats['verified']
+
+
+def test_transfer_in_session(tmp_path):
+    empty = tmp_path / 'empty.bin'
+    empty.write_bytes(b'')
+    source = tmp_path / 'source.bin'
+    source.write_bytes(b'chunk:' * 1000)
+    with QKDSession(chain_topology(1), pad=StreamPad, high=1 << 14, batch_size=1 << 12) as session:
+        assert transfer_file(session, str(empty), str(tmp_path / 'out.bin'))['chunks'] == 0
+        stats = transfer_file(session, str(source), str(tmp_path / 'out.bin'), chunk_size=1000, window=1)
+        assert (tmp_path / 'out.bin').read_bytes() == b'chunk:' * 1000 and stats['chunks'] == 6
+        # A chunk of any size takes the same key, both ends of a link drew the same
+        assert all(a.drawn == b.drawn for a, b in session._pads)
+        with pytest.raises(ValueError):
+            transfer_file(session, str(source), str(tmp_path / 'out.bin'), chunk_size=0)
+
+
+def test_file_chunks(tmp_path):
+    source = tmp_path / 'source.bin'
+    source.write_bytes(bytes(range(256)) * 40)
+    assert b''.join(file_chunks(str(source), 4096)) == bytes(range(256)) * 40
+    assert [len(chunk) for chunk in file_chunks(str(source), 4096)] == [4096, 4096, 2048]
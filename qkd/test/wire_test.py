@@ -0,0 +1,64 @@
+########################################################################################################################
+# Copyright (c) Xiufan Li. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Author: Xiufan Li
+# Supervisor: Patrick Rebentrost
+# Institution: Centre for Quantum Technologies, National University of Singapore
+# For feedback, please contact Xiufan at: shenlongtianwu8@gmail.com.
+########################################################################################################################
+
+# !/usr/bin/env python3
+
+"""
+    Test of the binary wire format of the classical messages.
+"""
+
+import numpy as np
+import pytest
+
+from qkd.qkd_wire import BASIS_FRAME, SIFT_FRAME, HEADER
+from qkd.qkd_wire import encode_bits, decode_bits, encode_states, decode_states
+from qkd.qkd_wire import encode_rate, decode_rate, encode_text, decode_text
+from qkd.qkd_wire import encode_data, decode_data, DATA_TEXT, encode_slots, decode_slots
+from qkd.qkd_wire import encode_confirm, decode_confirm
+from qkd.qkd_key import Key
+
+
+def test_round_trip():
+    bits = np.random.randint(2, size=1001)
+    basis = np.random.randint(2, size=1001)
+    frame = encode_bits(BASIS_FRAME, basis)
+    assert len(frame) == HEADER.size + 126
+    assert np.array_equal(decode_bits(BASIS_FRAME, frame), basis)
+    states = decode_states(encode_states(bits, basis))
+    assert np.array_equal(states[0], bits) and np.array_equal(states[1], basis)
+    assert decode_rate(encode_rate(12.5)) == 12.5
+    assert decode_text(encode_text("a:b:c é")) == "a:b:c é"
+    assert decode_data(encode_data(7, DATA_TEXT, b'a:b')) == (7, DATA_TEXT, b'a:b')
+    clicks = np.random.randint(2, size=1001)
+    slots = decode_slots(encode_slots(bits, basis, clicks))
+    assert all(np.array_equal(a, b) for a, b in zip(slots, (bits, basis, clicks)))
+    assert decode_confirm(encode_confirm(5, Key([1, 0, 1]))) == (5, Key([1, 0, 1]))
+
+
+def test_malformed_frames_rejected():
+    frame = encode_bits(BASIS_FRAME, [1, 0, 1])
+    with pytest.raises(ValueError):
+        decode_bits(SIFT_FRAME, frame)
+    with pytest.raises(ValueError):
+        decode_bits(BASIS_FRAME, frame[:-1])
+    with pytest.raises(ValueError):
+        decode_bits(BASIS_FRAME, b'XX' + frame[2:])
+    with pytest.raises(ValueError):
+        decode_bits(BASIS_FRAME, str([1, 0, 1]))